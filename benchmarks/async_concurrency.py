@@ -0,0 +1,139 @@
+"""
+Prueba de carga: compara cómo escala la concurrencia en modo sync vs async (DB_ASYNC).
+
+Levanta `src.main:app` con uvicorn una vez por modo (misma base de datos de src/.env)
+y dispara peticiones concurrentes contra un endpoint, reportando throughput y latencias.
+
+Uso:
+    python benchmarks/async_concurrency.py --api-key dev-secret-key-local-123
+    python benchmarks/async_concurrency.py --path /catalogs/accident-types --concurrency 1,16,64,256
+    python benchmarks/async_concurrency.py --url http://localhost:8000   # servidor ya levantado
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _run_level(url: str, path: str, api_key: str, concurrency: int, total: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, headers={"X-API-Key": api_key}, limits=limits, timeout=60) as client:
+        async def worker() -> None:
+            nonlocal errors
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99),
+    }
+
+
+def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/openapi.json", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió en {url}")
+
+
+def _spawn_server(db_async: bool, port: int) -> subprocess.Popen:
+    env = dict(os.environ, DB_ASYNC="1" if db_async else "0")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT_DIR,
+        env=env,
+    )
+
+
+def _print_table(mode: str, results: list[dict]) -> None:
+    print(f"\n== modo {mode}")
+    print(f"{'conc':>6} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    for r in results:
+        print(
+            f"{r['concurrency']:>6} {r['rps']:>10.1f} {r['p50_ms']:>9.2f} "
+            f"{r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['errors']:>8}"
+        )
+
+
+async def _run_levels(url: str, args: argparse.Namespace) -> list[dict]:
+    results = []
+    for level in args.concurrency:
+        total = max(args.requests, level * 4)
+        results.append(await _run_level(url, args.path, args.api_key, level, total))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="URL de un servidor ya levantado (no compara modos)")
+    parser.add_argument("--path", default="/emergencies?limit=50")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", ""))
+    parser.add_argument("--concurrency", default="1,8,32,128,256",
+                        type=lambda v: [int(x) for x in v.split(",")])
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones por nivel de concurrencia")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.url:
+        _print_table("externo", asyncio.run(_run_levels(args.url, args)))
+        return
+
+    url = f"http://127.0.0.1:{args.port}"
+    for mode, db_async in (("sync", False), ("async", True)):
+        server = _spawn_server(db_async, args.port)
+        try:
+            _wait_ready(url)
+            _print_table(mode, asyncio.run(_run_levels(url, args)))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Prueba de carga del hash de contraseñas (scrypt) usado en /users/login.
+
+Lanza verificaciones concurrentes contra el executor acotado de
+src/features/users/passwords.py (en proceso, sin servidor ni DB) y mide:
+- throughput de logins y latencias p50/p99,
+- cuántas peticiones se rechazarían con 503 (PASSWORD_HASH_MAX_PENDING),
+- el retraso del event loop mientras tanto: debe mantenerse cerca de 0 aunque
+  la CPU esté ocupada con hashes, porque scrypt corre fuera del loop.
+
+Uso:
+    python benchmarks/login_throughput.py
+    python benchmarks/login_throughput.py --concurrency 1,16,64,256 --requests 400
+    PASSWORD_HASH_WORKERS=4 python benchmarks/login_throughput.py
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.features.users import passwords  # noqa: E402
+
+LAG_INTERVAL = 0.005
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _measure_lag(samples: list[float], stop: asyncio.Event) -> None:
+    # Cuánto tarda el loop en despertar respecto a lo pedido
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(max(0.0, (time.perf_counter() - start - LAG_INTERVAL) * 1000))
+
+
+async def _run_level(stored: str, password: str, concurrency: int, total: int) -> dict:
+    latencies: list[float] = []
+    busy = 0
+    remaining = total
+
+    async def worker() -> None:
+        nonlocal busy, remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                assert await passwords.verify_password_async(password, stored)
+            except passwords.PasswordHashingBusy:
+                busy += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    lag: list[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_measure_lag(lag, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+
+    return {
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "busy": busy,
+        "logins_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "p99_ms": _percentile(latencies, 99),
+        "lag_p99_ms": _percentile(lag, 99),
+        "lag_max_ms": max(lag) if lag else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32,128",
+                        type=lambda v: [int(x) for x in v.split(",")])
+    parser.add_argument("--requests", type=int, default=200, help="Logins por nivel de concurrencia")
+    args = parser.parse_args()
+
+    password = "benchmark-password"
+    stored = passwords.hash_password(password)
+    print(
+        f"scrypt n={passwords.SCRYPT_N} r={passwords.SCRYPT_R} p={passwords.SCRYPT_P} "
+        f"workers={passwords.HASH_WORKERS} max_pending={passwords.HASH_MAX_PENDING}"
+    )
+    print(f"{'conc':>6} {'login/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'503':>6} {'lag p99':>9} {'lag max':>9}")
+    for level in args.concurrency:
+        r = asyncio.run(_run_level(stored, password, level, max(args.requests, level)))
+        print(
+            f"{r['concurrency']:>6} {r['logins_s']:>9.1f} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+            f"{r['busy']:>6} {r['lag_p99_ms']:>9.2f} {r['lag_max_ms']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
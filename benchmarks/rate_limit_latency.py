@@ -0,0 +1,111 @@
+"""
+Latencia añadida por el rate limiting: slowapi estricto vs limitador híbrido.
+
+Para cada petición simulada mide lo que tarda la decisión de rate limiting:
+- estricto: lo que hace slowapi, un FixedWindowRateLimiter.hit contra Redis por
+  cada límite de RATE_LIMITS (síncrono, en cada petición);
+- híbrido: src/auth/hybrid_limiter.py, contadores locales sincronizados en lote.
+
+Usa REDIS_URL (sin ella ambos van contra memoria y la comparación no es
+representativa). Las claves simuladas se reparten entre --keys clientes.
+
+Uso:
+    REDIS_URL=redis://localhost:6379/0 python benchmarks/rate_limit_latency.py
+    python benchmarks/rate_limit_latency.py --requests 20000 --keys 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from limits import parse_many  # noqa: E402
+from limits.storage import storage_from_string  # noqa: E402
+from limits.strategies import FixedWindowRateLimiter  # noqa: E402
+
+from src.auth.hybrid_limiter import HybridRateLimiter  # noqa: E402
+from src.auth.rate_limiter import DEFAULT_LIMITS  # noqa: E402
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summary(name: str, latencies: list[float], elapsed: float) -> dict:
+    return {
+        "mode": name,
+        "decisions_s": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_us": statistics.fmean(latencies) if latencies else 0.0,
+        "p50_us": statistics.median(latencies) if latencies else 0.0,
+        "p99_us": _percentile(latencies, 99),
+    }
+
+
+def run_strict(storage_uri: str, keys: list[str], total: int) -> dict:
+    limiter = FixedWindowRateLimiter(storage_from_string(storage_uri))
+    items = parse_many(DEFAULT_LIMITS)
+    latencies: list[float] = []
+    started = time.perf_counter()
+    for i in range(total):
+        key = keys[i % len(keys)]
+        start = time.perf_counter()
+        for item in items:
+            limiter.hit(item, "bench-strict", key)
+        latencies.append((time.perf_counter() - start) * 1_000_000)
+    return _summary("estricto", latencies, time.perf_counter() - started)
+
+
+async def run_hybrid(keys: list[str], total: int) -> dict:
+    limiter = HybridRateLimiter(parse_many(DEFAULT_LIMITS))
+    await limiter.start()
+    latencies: list[float] = []
+    try:
+        started = time.perf_counter()
+        for i in range(total):
+            key = keys[i % len(keys)]
+            start = time.perf_counter()
+            await limiter.hit(f"bench-hybrid/{key}")
+            latencies.append((time.perf_counter() - start) * 1_000_000)
+            if i % 100 == 0:
+                # Deja correr la sincronización en segundo plano como lo haría el servidor
+                await asyncio.sleep(0)
+        elapsed = time.perf_counter() - started
+    finally:
+        await limiter.stop()
+    result = _summary("híbrido", latencies, elapsed)
+    result["strict_checks"] = limiter.strict_checks
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--keys", type=int, default=20, help="Clientes (API key + IP) distintos")
+    args = parser.parse_args()
+
+    storage_uri = os.getenv("REDIS_URL") or "memory://"
+    run_id = uuid.uuid4().hex[:8]
+    keys = [f"{run_id}-{i}" for i in range(args.keys)]
+    print(f"límites={DEFAULT_LIMITS} storage={storage_uri} peticiones={args.requests} claves={args.keys}")
+    if storage_uri == "memory://":
+        print("(sin REDIS_URL: ambos modos van contra memoria)")
+
+    results = [run_strict(storage_uri, keys, args.requests), asyncio.run(run_hybrid(keys, args.requests))]
+    print(f"{'modo':<10} {'decis/s':>10} {'media µs':>10} {'p50 µs':>9} {'p99 µs':>9}")
+    for r in results:
+        print(f"{r['mode']:<10} {r['decisions_s']:>10.0f} {r['mean_us']:>10.1f} {r['p50_us']:>9.1f} {r['p99_us']:>9.1f}")
+    print(f"comprobaciones estrictas del híbrido: {results[1]['strict_checks']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Coste de serializar los listados: doble validación (ruta anterior) vs una sola.
+
+Construye objetos ORM en memoria (sin base de datos) para los listados de
+emergencias (con accident_type, assigned_unit_rel y user), usuarios (con contactos
+y condiciones) y unidades, y compara por tamaño de página:
+- anterior: `[XOut.model_validate(obj)]` devuelto al router, que con response_model
+  vuelve a validar, pasa por jsonable_encoder y serializa con json (lo que hacía
+  FastAPI con cada respuesta);
+- actual: src/common/responses.dump_list, una validación con TypeAdapter cacheado
+  y bytes JSON directos.
+
+Uso:
+    python benchmarks/serialization.py
+    python benchmarks/serialization.py --sizes 100,1000 --repeat 20
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, List
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from src.common.responses import dump_list  # noqa: E402
+from src.entities import (  # noqa: E402
+    AccidentTypes,
+    Emergencies,
+    EmergencyContacts,
+    EmergencyUnit,
+    MedicalConditions,
+    Users,
+)
+from src.features.emergencies.model import EmergencyOut  # noqa: E402
+from src.features.emergency_units.model import EmergencyUnitOut  # noqa: E402
+from src.features.users.model import UserOut  # noqa: E402
+
+
+def _units(n: int) -> List[EmergencyUnit]:
+    return [
+        EmergencyUnit(emergency_unit_id=i, name=f"Unidad {i}", latitud=14.6 + i / 1000, longitud=-90.5 - i / 1000)
+        for i in range(1, n + 1)
+    ]
+
+
+def _users(n: int) -> List[Users]:
+    conditions = [MedicalConditions(medical_condition_id=i, description=f"Condición {i}") for i in range(1, 4)]
+    users = []
+    for i in range(1, n + 1):
+        user = Users(
+            user_id=i, name=f"Usuario {i}", phone=f"5550{i:04d}", birthday=date(1990, 1, 1),
+            password="x", created_at=datetime(2024, 1, 1) + timedelta(minutes=i),
+        )
+        user.emergency_contacts = [
+            EmergencyContacts(contact_id=i * 10 + j, contact_phone=f"5551{j:04d}", kin=1, contact_name=f"Contacto {j}")
+            for j in range(2)
+        ]
+        user.conditions = conditions[: i % 4]
+        users.append(user)
+    return users
+
+
+def _emergencies(n: int) -> List[Emergencies]:
+    accident = AccidentTypes(accident_type_id=1, description="Incendio")
+    units = _units(10)
+    users = _users(10)
+    emergencies = []
+    for i in range(1, n + 1):
+        unit, user = units[i % 10], users[i % 10]
+        emergency = Emergencies(
+            emergency_id=i, timestamp=datetime(2024, 1, 1) + timedelta(seconds=i),
+            tipo_accidente=1, assigned_unit=unit.emergency_unit_id, latitud=14.6, longitud=-90.5,
+            user_id=user.user_id, status=1 + i % 3,
+        )
+        emergency.accident_type = accident
+        emergency.assigned_unit_rel = unit
+        emergency.user = user
+        emergencies.append(emergency)
+    return emergencies
+
+
+def _double_validation(model: Any) -> Callable[[list], bytes]:
+    field = create_model_field("Response", List[model], mode="serialization")
+
+    def run(objs: list) -> bytes:
+        content = [model.model_validate(obj) for obj in objs]
+        payload = asyncio.run(serialize_response(field=field, response_content=content))
+        return JSONResponse(payload).body
+
+    return run
+
+
+def _single_validation(model: Any) -> Callable[[list], bytes]:
+    return lambda objs: dump_list(model, objs)
+
+
+def _time(fn: Callable[[list], bytes], objs: list, repeat: int) -> float:
+    fn(objs)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(objs)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000", type=lambda v: [int(x) for x in v.split(",")])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    cases = (
+        ("GET /emergencies", EmergencyOut, _emergencies),
+        ("GET /users", UserOut, _users),
+        ("GET /emergency-units", EmergencyUnitOut, _units),
+    )
+    print(f"{'endpoint':<22} {'filas':>6} {'anterior ms':>12} {'actual ms':>10} {'mejora':>7}")
+    for name, model, build in cases:
+        for size in args.sizes:
+            objs = build(size)
+            before = _time(_double_validation(model), objs, args.repeat)
+            after = _time(_single_validation(model), objs, args.repeat)
+            print(f"{name:<22} {size:>6} {before:>12.2f} {after:>10.2f} {before / after:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
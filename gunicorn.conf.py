@@ -0,0 +1,22 @@
+# Configuración de gunicorn (Dockerfile: gunicorn -c gunicorn.conf.py ...)
+#
+# Métricas Prometheus en modo multiproceso: con PROMETHEUS_MULTIPROC_DIR cada worker
+# escribe sus métricas en ese directorio y /metrics devuelve la suma de todos.
+import os
+import shutil
+
+
+def on_starting(server):
+    # Vaciar las métricas de una ejecución anterior antes de arrancar los workers
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Los gauges de un worker muerto dejan de sumar
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
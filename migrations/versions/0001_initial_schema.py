@@ -0,0 +1,113 @@
+"""Esquema inicial
+
+Tablas tal como existían antes de usar migraciones. Las bases de datos creadas
+antes de tener migraciones ya las tienen: solo se crean las que faltan.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+"""
+from typing import Any, Sequence, Set, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_table(existing: Set[str], name: str, *columns: Any) -> None:
+    if name not in existing:
+        op.create_table(name, *columns)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = set() if context.is_offline_mode() else set(sa.inspect(op.get_bind()).get_table_names())
+    _create_table(
+        existing,
+        "accident_types",
+        sa.Column("accident_type_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("description", sa.String(255), nullable=True),
+    )
+    _create_table(
+        existing,
+        "emergency_unit",
+        sa.Column("emergency_unit_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("latitud", sa.Numeric(8, 6), nullable=False),
+        sa.Column("longitud", sa.Numeric(9, 6), nullable=False),
+    )
+    _create_table(
+        existing,
+        "kin_catalog",
+        sa.Column("kin_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("kin_name", sa.String(255), nullable=True),
+    )
+    _create_table(
+        existing,
+        "medical_conditions",
+        sa.Column("medical_condition_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("description", sa.String(255), nullable=True),
+    )
+    _create_table(
+        existing,
+        "users",
+        sa.Column("user_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("phone", sa.String(20), nullable=False),
+        sa.Column("birthday", sa.Date(), nullable=True),
+        sa.Column("password", sa.String(255), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    )
+    _create_table(
+        existing,
+        "user_conditions",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), primary_key=True),
+        sa.Column(
+            "medical_condition_id",
+            sa.Integer(),
+            sa.ForeignKey("medical_conditions.medical_condition_id"),
+            primary_key=True,
+        ),
+    )
+    _create_table(
+        existing,
+        "emergency_contacts",
+        sa.Column("contact_id", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+        sa.Column("contact_phone", sa.String(20), nullable=True),
+        sa.Column("kin", sa.Integer(), sa.ForeignKey("kin_catalog.kin_id"), nullable=True),
+        sa.Column("contact_name", sa.String(255), nullable=True),
+        sa.UniqueConstraint("user_id", "contact_phone", name="pk_emergency_contacts"),
+    )
+    _create_table(
+        existing,
+        "emergencies",
+        sa.Column("emergency_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("timestamp", sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+        sa.Column("tipo_accidente", sa.Integer(), sa.ForeignKey("accident_types.accident_type_id"), nullable=True),
+        sa.Column("assigned_unit", sa.Integer(), sa.ForeignKey("emergency_unit.emergency_unit_id"), nullable=True),
+        sa.Column("latitud", sa.Numeric(8, 6), nullable=False),
+        sa.Column("longitud", sa.Numeric(9, 6), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=True),
+        sa.Column("status", sa.Integer(), server_default="1", nullable=False),
+        sa.CheckConstraint("status IN (1, 2, 3)", name="chk_emergencies_status"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("emergencies")
+    op.drop_table("emergency_contacts")
+    op.drop_table("user_conditions")
+    op.drop_table("users")
+    op.drop_table("medical_conditions")
+    op.drop_table("kin_catalog")
+    op.drop_table("emergency_unit")
+    op.drop_table("accident_types")
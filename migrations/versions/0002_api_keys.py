@@ -0,0 +1,40 @@
+"""Tabla api_keys
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:05:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # scripts/api_keys.py pudo haberla creado antes de existir esta migración
+    if not context.is_offline_mode() and sa.inspect(op.get_bind()).has_table("api_keys"):
+        return
+    op.create_table(
+        "api_keys",
+        sa.Column("api_key_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("key_hash", sa.String(64), nullable=False, unique=True),
+        sa.Column("key_prefix", sa.String(12), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+        sa.Column("expires_at", sa.TIMESTAMP(), nullable=True),
+        sa.Column("revoked_at", sa.TIMESTAMP(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("api_keys")
@@ -0,0 +1,61 @@
+"""Índices de las consultas frecuentes
+
+- users.phone (único): login y get_user_by_phone.
+- emergencies (timestamp, emergency_id), (status, ...), (assigned_unit, ...):
+  listados paginados por keyset, con y sin filtro.
+- emergencies (user_id, timestamp): emergencias de un usuario.
+- emergencies (assigned_unit, status): carga activa por unidad (despacho y
+  estadísticas), resuelta solo con el índice.
+
+En PostgreSQL se crean con CONCURRENTLY para no bloquear escrituras. Si ya hay
+teléfonos duplicados el índice único falla: hay que depurarlos antes.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("ix_users_phone", "users", ["phone"], True),
+    ("ix_emergencies_timestamp_id", "emergencies", ["timestamp", "emergency_id"], False),
+    ("ix_emergencies_status_timestamp_id", "emergencies", ["status", "timestamp", "emergency_id"], False),
+    ("ix_emergencies_unit_timestamp_id", "emergencies", ["assigned_unit", "timestamp", "emergency_id"], False),
+    ("ix_emergencies_user_timestamp", "emergencies", ["user_id", "timestamp"], False),
+    ("ix_emergencies_unit_status", "emergencies", ["assigned_unit", "status"], False),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = set()
+    if not context.is_offline_mode():
+        # Bases creadas con create_all a partir de las entidades ya pueden tenerlos
+        inspector = sa.inspect(op.get_bind())
+        for table in {table for _, table, _, _ in INDEXES}:
+            existing.update(index["name"] for index in inspector.get_indexes(table))
+
+    # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            if name in existing:
+                continue
+            op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
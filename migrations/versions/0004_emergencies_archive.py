@@ -0,0 +1,71 @@
+"""Tablas emergencies_archive y emergencies_archive_unit_totals
+
+Emergencias cerradas antiguas que el job de archivado saca de la tabla activa
+(src/features/emergencies/archive.py). Mismas columnas que emergencies más
+archived_at, con los índices de los listados históricos, y el total archivado
+por unidad para las estadísticas de la flota.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("ix_emergencies_archive_timestamp_id", ["timestamp", "emergency_id"]),
+    ("ix_emergencies_archive_unit_timestamp_id", ["assigned_unit", "timestamp", "emergency_id"]),
+    ("ix_emergencies_archive_user_timestamp", ["user_id", "timestamp"]),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Bases creadas con create_all a partir de las entidades ya pueden tenerlas
+    existing = set() if context.is_offline_mode() else set(sa.inspect(op.get_bind()).get_table_names())
+    if "emergencies_archive_unit_totals" not in existing:
+        op.create_table(
+            "emergencies_archive_unit_totals",
+            sa.Column(
+                "emergency_unit_id", sa.Integer(),
+                sa.ForeignKey("emergency_unit.emergency_unit_id", ondelete="CASCADE"), primary_key=True,
+            ),
+            sa.Column("total", sa.Integer(), server_default="0", nullable=False),
+        )
+    if "emergencies_archive" in existing:
+        return
+    op.create_table(
+        "emergencies_archive",
+        sa.Column("emergency_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("timestamp", sa.TIMESTAMP(), nullable=False),
+        sa.Column("tipo_accidente", sa.Integer(), sa.ForeignKey("accident_types.accident_type_id"), nullable=True),
+        sa.Column(
+            "assigned_unit", sa.Integer(),
+            sa.ForeignKey("emergency_unit.emergency_unit_id", ondelete="SET NULL"), nullable=True,
+        ),
+        sa.Column("latitud", sa.Numeric(8, 6), nullable=False),
+        sa.Column("longitud", sa.Numeric(9, 6), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id", ondelete="SET NULL"), nullable=True),
+        sa.Column("status", sa.Integer(), nullable=False),
+        sa.Column("archived_at", sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+    )
+    for name, columns in INDEXES:
+        op.create_index(name, "emergencies_archive", columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name="emergencies_archive")
+    op.drop_table("emergencies_archive")
+    op.drop_table("emergencies_archive_unit_totals")
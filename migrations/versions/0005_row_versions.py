@@ -0,0 +1,45 @@
+"""Columna version en emergencies, emergencies_archive, users y emergency_unit
+
+Los servicios la incrementan (version = version + 1, en el mismo UPDATE) cada vez
+que cambian la fila. Los GET de detalle construyen el ETag con las versiones de las
+filas que forman la respuesta y responden 304 sin cargar ni serializar el recurso.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("emergencies", "emergencies_archive", "users", "emergency_unit")
+
+
+def _has_version(table: str) -> bool:
+    # Bases creadas con create_all a partir de las entidades ya pueden tenerla
+    if context.is_offline_mode():
+        return False
+    return any(column["name"] == "version" for column in sa.inspect(op.get_bind()).get_columns(table))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        if not _has_version(table):
+            op.add_column(table, sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("version")
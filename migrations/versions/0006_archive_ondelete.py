@@ -0,0 +1,79 @@
+"""ON DELETE en las claves foráneas de emergencies_archive y emergencies_archive_unit_totals
+
+Las emergencias archivadas no tienen relación ORM que las actualice al borrar un
+usuario o una unidad (los servicios solo limpian la tabla activa): sin regla ON
+DELETE el borrado fallaba en PostgreSQL en cuanto había algo archivado. Las
+emergencias archivadas quedan con user_id / assigned_unit a NULL y el total
+archivado de la unidad se borra con ella.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 16:00:00
+
+"""
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# tabla -> [(columna, tabla referida, columna referida, ON DELETE)]
+FOREIGN_KEYS: Dict[str, List[Tuple[str, str, str, str]]] = {
+    "emergencies_archive": [
+        ("assigned_unit", "emergency_unit", "emergency_unit_id", "SET NULL"),
+        ("user_id", "users", "user_id", "SET NULL"),
+    ],
+    "emergencies_archive_unit_totals": [
+        ("emergency_unit_id", "emergency_unit", "emergency_unit_id", "CASCADE"),
+    ],
+}
+
+# SQLite no guarda el nombre de las FK: en batch se les da uno para poder borrarlas
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+
+def _current(table: str, column: str, referred: str) -> Tuple[str, Optional[str]]:
+    """Nombre y ON DELETE actuales de la FK de `column`."""
+    default = f"{table}_{column}_fkey"  # nombre por defecto de PostgreSQL
+    if context.is_offline_mode():
+        return default, None
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        if fk["constrained_columns"] == [column]:
+            name = fk["name"] or NAMING_CONVENTION["fk"] % {
+                "table_name": table, "column_0_name": column, "referred_table_name": referred,
+            }
+            return name, fk.get("options", {}).get("ondelete")
+    return default, None
+
+
+def _replace(to_ondelete: bool) -> None:
+    for table, foreign_keys in FOREIGN_KEYS.items():
+        # Bases creadas con create_all (o con 0004 ya corregida) pueden tenerlas bien
+        pending = []
+        for column, referred, referred_column, ondelete in foreign_keys:
+            wanted = ondelete if to_ondelete else None
+            name, current = _current(table, column, referred)
+            if (current or "").upper() != (wanted or ""):
+                pending.append((name, column, referred, referred_column, wanted))
+        if not pending:
+            continue
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch:
+            for name, column, referred, referred_column, wanted in pending:
+                batch.drop_constraint(name, type_="foreignkey")
+                batch.create_foreign_key(name, referred, [column], [referred_column], ondelete=wanted)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _replace(to_ondelete=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _replace(to_ondelete=False)
@@ -0,0 +1,87 @@
+"""
+Gestión de API keys (tabla api_keys).
+
+La clave en claro solo se muestra al crearla; en la base de datos queda su SHA-256.
+Los workers en marcha ven los cambios en menos de API_KEYS_REFRESH segundos.
+
+Uso:
+    python scripts/api_keys.py create --name gateway-norte [--expires 2026-12-31]
+    python scripts/api_keys.py list
+    python scripts/api_keys.py revoke 3
+
+Rotación: crear la clave nueva, desplegarla en el cliente y revocar la anterior.
+"""
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from sqlalchemy import select  # noqa: E402
+
+from src.auth.api_keys import generate_api_key, hash_api_key  # noqa: E402
+from src.database.db import SessionLocal, engine  # noqa: E402
+from src.entities.ApiKeysEntity import ApiKeys  # noqa: E402
+
+
+def create(name: str, expires: str | None) -> None:
+    api_key = generate_api_key()
+    row = ApiKeys(
+        name=name,
+        key_hash=hash_api_key(api_key),
+        key_prefix=api_key[:8],
+        expires_at=datetime.fromisoformat(expires) if expires else None,
+    )
+    with SessionLocal() as db:
+        db.add(row)
+        db.commit()
+        print(f"id={row.api_key_id} name={row.name}")
+    print(api_key)
+
+
+def list_keys() -> None:
+    with SessionLocal() as db:
+        rows = db.execute(select(ApiKeys).order_by(ApiKeys.api_key_id)).scalars().all()
+    print(f"{'id':>4}  {'prefijo':<10} {'nombre':<24} {'creada':<20} {'caduca':<20} revocada")
+    for row in rows:
+        print(
+            f"{row.api_key_id:>4}  {row.key_prefix:<10} {row.name:<24} "
+            f"{str(row.created_at or ''):<20} {str(row.expires_at or ''):<20} {row.revoked_at or ''}"
+        )
+
+
+def revoke(api_key_id: int) -> None:
+    with SessionLocal() as db:
+        row = db.get(ApiKeys, api_key_id)
+        if row is None:
+            sys.exit(f"No existe la API key {api_key_id}")
+        if row.revoked_at is None:
+            row.revoked_at = datetime.now()
+            db.commit()
+    print(f"API key {api_key_id} revocada")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    create_cmd = commands.add_parser("create")
+    create_cmd.add_argument("--name", required=True)
+    create_cmd.add_argument("--expires", help="Fecha ISO de caducidad (opcional)")
+    commands.add_parser("list")
+    revoke_cmd = commands.add_parser("revoke")
+    revoke_cmd.add_argument("api_key_id", type=int)
+    args = parser.parse_args()
+
+    ApiKeys.__table__.create(engine, checkfirst=True)
+    if args.command == "create":
+        create(args.name, args.expires)
+    elif args.command == "list":
+        list_keys()
+    else:
+        revoke(args.api_key_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Archiva las emergencias cerradas antiguas (tabla emergencies -> emergencies_archive).
+
+Pensado para cron cuando ARCHIVE_INTERVAL=0 (job en la API desactivado). Se puede
+ejecutar a la vez que la API: cada lote es una transacción corta y las filas que
+otra petición tiene bloqueadas se saltan hasta la siguiente ejecución.
+
+Uso:
+    python scripts/archive_emergencies.py                 # cerradas hace más de ARCHIVE_AFTER_DAYS días
+    python scripts/archive_emergencies.py --days 30 --batch-size 5000
+
+Ejemplo de cron (cada noche a las 03:15):
+    15 3 * * * cd /app && python scripts/archive_emergencies.py
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.database.db import SessionLocal  # noqa: E402
+from src.features.emergencies.archive import (  # noqa: E402
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_BATCH_SIZE,
+    archive_closed_emergencies,
+    archive_cutoff,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="Archivar las cerradas con más de estos días")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE,
+                        help="Emergencias por transacción")
+    args = parser.parse_args()
+    if args.days < 0 or args.batch_size < 1:
+        parser.error("--days debe ser >= 0 y --batch-size >= 1")
+
+    cutoff = archive_cutoff(args.days)
+    with SessionLocal() as db:
+        moved = archive_closed_emergencies(db, cutoff, args.batch_size)
+    print(f"{moved} emergencias archivadas (cerradas antes de {cutoff:%Y-%m-%d %H:%M})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Registro de API keys.
+
+Cada gateway o dashboard tiene su propia clave en la tabla api_keys (solo se guarda
+su SHA-256), con nombre, caducidad opcional y revocación. La clave de API_KEY en el
+entorno se sigue aceptando como una más (nombre "env").
+
+Las claves activas se mantienen en memoria por worker y se recargan en segundo plano
+cada API_KEYS_REFRESH segundos, así verificar una petición no consulta la DB y una
+clave nueva o revocada se aplica sin reiniciar. La comparación final es en tiempo
+constante (hmac.compare_digest).
+
+Alta, listado y revocación: scripts/api_keys.py.
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+from src.database.db import SessionLocal
+from src.entities.ApiKeysEntity import ApiKeys
+
+logger = logging.getLogger(__name__)
+
+API_KEYS_REFRESH = float(os.getenv("API_KEYS_REFRESH", "30"))
+KEY_PREFIX = "ll_"
+
+
+@dataclass(frozen=True)
+class ApiKeyInfo:
+    api_key_id: Optional[int]
+    name: str
+    key_hash: str
+    key_prefix: str
+    expires_at: Optional[datetime] = None
+
+    def is_expired(self, now: datetime) -> bool:
+        return self.expires_at is not None and self.expires_at <= now
+
+
+def hash_api_key(api_key: str) -> str:
+    # Las claves son aleatorias de 256 bits: basta un hash rápido, no hace falta scrypt
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def generate_api_key() -> str:
+    return KEY_PREFIX + secrets.token_urlsafe(32)
+
+
+class ApiKeyRegistry:
+    def __init__(self, refresh_interval: float = API_KEYS_REFRESH) -> None:
+        self.refresh_interval = refresh_interval
+        self._keys: Dict[str, ApiKeyInfo] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def refresh(self) -> None:
+        """Recarga las claves activas (entorno + tabla). Si la DB falla se conservan las anteriores."""
+        keys: Dict[str, ApiKeyInfo] = {}
+        env_key = os.getenv("API_KEY")
+        if env_key:
+            env_hash = hash_api_key(env_key)
+            keys[env_hash] = ApiKeyInfo(None, "env", env_hash, env_key[:8])
+
+        try:
+            with SessionLocal() as db:
+                rows = db.execute(select(ApiKeys).where(ApiKeys.revoked_at.is_(None))).scalars().all()
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not load API keys from database, keeping previous set: {e}")
+            if self._loaded:
+                return
+            rows = []
+
+        for row in rows:
+            keys[row.key_hash] = ApiKeyInfo(row.api_key_id, row.name, row.key_hash, row.key_prefix, row.expires_at)
+
+        with self._lock:
+            # Se reemplaza el dict completo: las lecturas no necesitan lock
+            self._keys = keys
+            self._loaded = True
+
+    def lookup(self, api_key: Optional[str]) -> Optional[ApiKeyInfo]:
+        if not api_key:
+            return None
+        candidate = hash_api_key(api_key)
+        # La búsqueda es por el hash, no por la clave: su tiempo no revela nada de la clave
+        info = self._keys.get(candidate)
+        if info is None or not hmac.compare_digest(info.key_hash, candidate):
+            return None
+        if info.is_expired(datetime.now()):
+            return None
+        return info
+
+    async def ensure_loaded(self) -> None:
+        if not self._loaded:
+            await run_in_threadpool(self.refresh)
+
+    async def start(self) -> None:
+        await run_in_threadpool(self.refresh)
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await run_in_threadpool(self.refresh)
+            except Exception as e:
+                logger.warning(f"API key refresh failed: {e}")
+
+
+api_key_registry = ApiKeyRegistry()
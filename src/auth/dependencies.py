@@ -1,8 +1,12 @@
 import os
-from fastapi import HTTPException, status, Depends
+from typing import Optional
+
+from fastapi import HTTPException, Request, status, Depends
 from fastapi.security.api_key import APIKeyHeader
 from dotenv import load_dotenv
 
+from .api_keys import ApiKeyInfo, api_key_registry
+
 load_dotenv()
 
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
@@ -13,18 +17,24 @@ def get_api_key() -> str:
         raise ValueError("API_KEY environment variable is not set")
     return api_key
 
-async def verify_api_key(api_key: str = Depends(api_key_header)):
+def is_valid_api_key(api_key: Optional[str]) -> bool:
+    return api_key_registry.lookup(api_key) is not None
+
+async def verify_api_key(request: Request, api_key: str = Depends(api_key_header)) -> ApiKeyInfo:
     if not api_key:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="API Key required"
         )
 
-    valid_api_key = get_api_key()
-    if api_key != valid_api_key:
+    # Normalmente ya cargado en el arranque (lifespan); solo la primera petición sin él espera
+    await api_key_registry.ensure_loaded()
+    key_info = api_key_registry.lookup(api_key)
+    if key_info is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API Key"
         )
 
-    return api_key
\ No newline at end of file
+    request.state.api_key = key_info
+    return key_info
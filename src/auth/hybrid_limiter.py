@@ -0,0 +1,276 @@
+"""
+Rate limiting híbrido: contadores locales por worker delante de Redis.
+
+Aplica RATE_LIMITS (por defecto "500/minute;5000/hour", ventana fija como slowapi)
+a todas las peticiones HTTP, con la misma clave que slowapi (API key + IP). Antes de
+este middleware los default_limits de slowapi estaban configurados pero no se
+aplicaban (no había SlowAPIMiddleware): solo /scalar tenía límite.
+
+Los gateways LoRa reenvían por una sola API key + IP los reportes de muchos
+usuarios, así que POST /emergencies y /emergencies/batch (GATEWAY_ROUTES) tienen
+sus propios contadores con RATE_LIMITS_GATEWAY (vacío = sin límite) y no gastan el
+cupo general.
+
+- Cada worker cuenta en memoria las peticiones de cada clave y ventana y envía los
+  incrementos a Redis en lote (un pipeline INCRBY/EXPIRE) cada
+  RATE_LIMIT_SYNC_INTERVAL segundos; la respuesta trae el total global, que se usa
+  como estimación hasta la siguiente sincronización. La mayoría de peticiones se
+  deciden sin tocar Redis.
+- Solo cuando la estimación supera RATE_LIMIT_STRICT_RATIO del límite la petición
+  lee de Redis el total exacto de esas ventanas y, si todas la admiten, les envía
+  el incremento (dos idas a Redis).
+- Con varios límites (minuto y hora) primero se comprueban todas las ventanas y
+  solo después se cuenta la petición en todas: una petición rechazada por una
+  ventana no gasta cupo de las demás.
+- Sin Redis (o si falla) los contadores son solo locales, como el memory:// de slowapi.
+
+El exceso posible entre workers está acotado por lo que reciben entre dos
+sincronizaciones mientras la clave aún está lejos del límite.
+Todo corre en el event loop (middleware y tarea de sincronización), sin locks.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from limits import RateLimitItem, parse_many
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.common.metrics import RATE_LIMIT_REJECTIONS, RATE_LIMIT_STRICT_CHECKS
+
+from .rate_limiter import DEFAULT_LIMITS, get_rate_limit_key
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_SYNC_INTERVAL = float(os.getenv("RATE_LIMIT_SYNC_INTERVAL", "0.5"))
+RATE_LIMIT_STRICT_RATIO = float(os.getenv("RATE_LIMIT_STRICT_RATIO", "0.9"))
+RATE_LIMIT_EXEMPT_PATHS = ("/scalar", "/openapi.json")
+# Rutas por las que llegan los reportes de los gateways LoRa (muchos usuarios por API key + IP)
+RATE_LIMITS_GATEWAY = os.getenv("RATE_LIMITS_GATEWAY", "6000/minute;100000/hour")
+GATEWAY_ROUTES = (("POST", "/emergencies"), ("POST", "/emergencies/batch"))
+
+
+@dataclass
+class _Window:
+    redis_key: str
+    amount: int
+    expires_at: float
+    limit: str
+    # Último total global conocido (Redis) y peticiones locales aún no enviadas
+    count: int = 0
+    pending: int = 0
+
+    @property
+    def estimate(self) -> int:
+        return self.count + self.pending
+
+
+class HybridRateLimiter:
+    def __init__(
+        self,
+        limits: List[RateLimitItem],
+        sync_interval: float = RATE_LIMIT_SYNC_INTERVAL,
+        strict_ratio: float = RATE_LIMIT_STRICT_RATIO,
+        name: str = "default",
+    ) -> None:
+        self.limits = limits
+        self.name = name
+        self.sync_interval = sync_interval
+        self.strict_ratio = strict_ratio
+        self._windows: Dict[str, _Window] = {}
+        self._redis = None
+        self._task: Optional[asyncio.Task] = None
+        self.strict_checks = 0
+        self.rejected = 0
+
+    async def start(self) -> None:
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            try:
+                import redis.asyncio as aioredis
+
+                self._redis = aioredis.from_url(redis_url)
+                await self._redis.ping()
+            except Exception as e:
+                logger.warning(f"Redis not available for rate limiting, using local counters: {e}")
+                self._redis = None
+        # También sin Redis: la tarea descarta las ventanas ya cerradas
+        self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            await self._sync()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def _window(self, key: str, item: RateLimitItem, now: float) -> _Window:
+        expiry = item.get_expiry()
+        window_start = int(now // expiry) * expiry
+        redis_key = f"LIMITER/hybrid/{self.name}/{key}/{item.amount}/{expiry}/{window_start}"
+        window = self._windows.get(redis_key)
+        if window is None:
+            window = _Window(redis_key, item.amount, window_start + expiry, str(item))
+            self._windows[redis_key] = window
+        return window
+
+    async def hit(self, key: str) -> Tuple[bool, Optional[_Window]]:
+        """Registra una petición. Devuelve (permitida, ventana que la rechazó)."""
+        now = time.time()
+        windows = [self._window(key, item, now) for item in self.limits]
+
+        # Primero se comprueban todas las ventanas; nada se cuenta si alguna rechaza
+        for window in windows:
+            if window.estimate >= window.amount:
+                return self._reject(window)
+        strict = []
+        if self._redis is not None:
+            strict = [w for w in windows if w.estimate >= w.amount * self.strict_ratio]
+        if strict:
+            rejected = await self._strict_check(strict)
+            if rejected is not None:
+                return self._reject(rejected)
+
+        for window in windows:
+            window.pending += 1
+        if strict:
+            await self._strict_commit(strict)
+        return True, None
+
+    def _reject(self, window: _Window) -> Tuple[bool, _Window]:
+        self.rejected += 1
+        RATE_LIMIT_REJECTIONS.labels(window.limit).inc()
+        return False, window
+
+    async def _strict_check(self, windows: List[_Window]) -> Optional[_Window]:
+        """Lee de Redis el total de las ventanas cerca del límite. Devuelve la que rechaza o None."""
+        self.strict_checks += 1
+        RATE_LIMIT_STRICT_CHECKS.inc()
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for window in windows:
+                pipe.get(window.redis_key)
+            totals = await pipe.execute()
+        except Exception as e:
+            # Las estimaciones locales ya se comprobaron en hit()
+            logger.debug(f"Strict rate limit check failed, deciding locally: {e}")
+            return None
+        for window, total in zip(windows, totals):
+            window.count = max(window.count, int(total or 0))
+            if window.estimate >= window.amount:
+                return window
+        return None
+
+    async def _strict_commit(self, windows: List[_Window]) -> None:
+        """Envía ya a Redis lo pendiente de esas ventanas para que los demás workers lo vean."""
+        increments = [window.pending for window in windows]
+        for window in windows:
+            window.pending = 0
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for window, increment in zip(windows, increments):
+                pipe.incrby(window.redis_key, increment)
+                pipe.expireat(window.redis_key, math.ceil(window.expires_at))
+            results = await pipe.execute()
+        except Exception as e:
+            logger.debug(f"Strict rate limit commit failed, left for the next sync: {e}")
+            for window, increment in zip(windows, increments):
+                window.pending += increment
+            return
+        for window, total in zip(windows, results[::2]):
+            window.count = max(window.count, int(total))
+
+    async def _sync(self) -> None:
+        now = time.time()
+        local_only = self._redis is None
+        for redis_key in [
+            k for k, w in self._windows.items() if w.expires_at <= now and (local_only or not w.pending)
+        ]:
+            del self._windows[redis_key]
+        if local_only:
+            return
+
+        batch = [w for w in self._windows.values() if w.pending]
+        if not batch:
+            return
+        increments = [w.pending for w in batch]
+        for window in batch:
+            window.pending = 0
+
+        pipe = self._redis.pipeline(transaction=False)
+        for window, increment in zip(batch, increments):
+            pipe.incrby(window.redis_key, increment)
+            pipe.expireat(window.redis_key, math.ceil(window.expires_at))
+        try:
+            results = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not sync rate limit counters to Redis: {e}")
+            for window, increment in zip(batch, increments):
+                window.pending += increment
+            return
+        for window, total in zip(batch, results[::2]):
+            window.count = max(window.count, int(total))
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self._sync()
+            except Exception as e:
+                logger.warning(f"Rate limit sync failed: {e}")
+
+
+hybrid_limiter = HybridRateLimiter(parse_many(DEFAULT_LIMITS))
+gateway_limiter: Optional[HybridRateLimiter] = (
+    HybridRateLimiter(parse_many(RATE_LIMITS_GATEWAY), name="gateway") if RATE_LIMITS_GATEWAY else None
+)
+
+
+class HybridRateLimitMiddleware:
+    """
+    Middleware ASGI que aplica `hybrid_limiter` antes de llegar a los routers, o
+    `gateway_limiter` en GATEWAY_ROUTES (sin límite si RATE_LIMITS_GATEWAY está vacío).
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: HybridRateLimiter = hybrid_limiter,
+        gateway: Optional[HybridRateLimiter] = gateway_limiter,
+    ) -> None:
+        self.app = app
+        self.limiter = limiter
+        self.gateway = gateway
+
+    def _limiter_for(self, scope: Scope) -> Optional[HybridRateLimiter]:
+        if scope["method"] == "OPTIONS" or scope["path"] in RATE_LIMIT_EXEMPT_PATHS:
+            return None
+        if (scope["method"], scope["path"]) in GATEWAY_ROUTES:
+            return self.gateway
+        return self.limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limiter = self._limiter_for(scope) if scope["type"] == "http" else None
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        allowed, window = await limiter.hit(get_rate_limit_key(Request(scope)))
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = max(1, math.ceil(window.expires_at - time.time()))
+        response = Response(
+            content=f"Rate limit exceeded: {window.limit}",
+            status_code=429,
+            headers={"Content-Type": "text/plain", "Retry-After": str(retry_after)},
+        )
+        await response(scope, receive, send)
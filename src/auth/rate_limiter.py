@@ -7,6 +7,11 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Límites globales; los aplica src/auth/hybrid_limiter.py a todas las peticiones (salvo
+# las rutas de gateways, con RATE_LIMITS_GATEWAY). Los default_limits de slowapi no se
+# aplican solos: slowapi solo limita las rutas con @limiter.limit
+DEFAULT_LIMITS = os.getenv("RATE_LIMITS", "500/minute;5000/hour")
+
 def get_rate_limit_key(request: Request):
     client_ip = get_remote_address(request)
     api_key = request.headers.get("X-API-Key")
@@ -32,7 +37,7 @@ def create_limiter():
 
     return Limiter(
         key_func=get_rate_limit_key,
-        default_limits=["500/minute", "5000/hour"],  # Higher limits since it's per API key + IP combo
+        default_limits=DEFAULT_LIMITS.split(";"),  # Higher limits since it's per API key + IP combo
         storage_uri=storage_uri
     )
 
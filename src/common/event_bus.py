@@ -0,0 +1,132 @@
+"""
+Bus de eventos para notificaciones en tiempo real.
+
+Con REDIS_URL los eventos se publican en un canal pub/sub de Redis y cada worker de
+gunicorn los recibe y reparte a sus suscriptores locales (WebSocket/SSE), así que un
+evento generado en un worker llega a los clientes conectados a cualquier otro.
+Sin Redis el reparto es solo dentro del proceso.
+
+`publish` es thread-safe y no bloquea: los servicios sync lo llaman desde el threadpool
+(o desde run_sync en modo async) y el envío a Redis lo hace un hilo dedicado.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "loralink:events")
+SUBSCRIBER_QUEUE_SIZE = 256
+
+Event = Tuple[dict, str]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class EventBus:
+    def __init__(self, channel: str = EVENTS_CHANNEL) -> None:
+        self.channel = channel
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._outbox: Optional[queue.Queue] = None
+        self._publisher: Optional[threading.Thread] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._redis = None
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        redis_url = os.getenv("REDIS_URL")
+        if not redis_url:
+            return
+        try:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.from_url(redis_url)
+            await self._redis.ping()
+        except Exception as e:
+            logger.warning(f"Redis not available for events, using in-process delivery: {e}")
+            self._redis = None
+            return
+
+        self._outbox = queue.Queue()
+        self._publisher = threading.Thread(target=self._publish_loop, args=(redis_url,), daemon=True)
+        self._publisher.start()
+        self._listener = asyncio.create_task(self._listen())
+        logger.info("Using Redis pub/sub for events")
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._outbox is not None:
+            self._outbox.put(None)
+            self._outbox = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+        self._loop = None
+
+    def publish(self, event_type: str, data: dict) -> None:
+        payload = json.dumps({"type": event_type, "data": data}, default=_json_default, separators=(",", ":"))
+        if self._outbox is not None:
+            self._outbox.put_nowait(payload)
+        elif self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._deliver, payload)
+
+    def subscribe(self) -> asyncio.Queue:
+        subscription: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: asyncio.Queue) -> None:
+        self._subscribers.discard(subscription)
+
+    def _deliver(self, payload: Any) -> None:
+        if isinstance(payload, bytes):
+            payload = payload.decode()
+        event: Event = (json.loads(payload), payload)
+        for subscription in list(self._subscribers):
+            # Un cliente lento pierde los eventos más viejos en lugar de frenar al resto
+            if subscription.full():
+                subscription.get_nowait()
+            subscription.put_nowait(event)
+
+    def _publish_loop(self, redis_url: str) -> None:
+        import redis
+
+        client = redis.from_url(redis_url)
+        outbox = self._outbox
+        while True:
+            payload = outbox.get()
+            if payload is None:
+                return
+            try:
+                client.publish(self.channel, payload)
+            except Exception as e:
+                logger.warning(f"Could not publish event to Redis: {e}")
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._deliver(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis event subscription lost, retrying: {e}")
+                await asyncio.sleep(1)
+
+
+event_bus = EventBus()
@@ -0,0 +1,107 @@
+"""
+Sparse fieldsets (`fields=`) y expansión de relaciones (`expand=`) en listados.
+
+- `fields=emergency_id,latitud,longitud,status` limita las columnas de la respuesta;
+  si no incluye relaciones, la consulta es un SELECT solo de esas columnas.
+- `expand=user,accident_type` indica qué relaciones cargar (selectinload) e incluir.
+  Una relación nombrada en `fields` también se expande.
+- Sin ninguno de los dos parámetros la respuesta es la completa de siempre.
+
+La respuesta se serializa con un submodelo del modelo de salida (cacheado por
+combinación de campos), así los campos no pedidos no aparecen en el JSON.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Iterable, List, Mapping, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy import Select, select
+from sqlalchemy.orm import load_only, selectinload
+
+FIELDS_DESCRIPTION = "Campos a devolver, separados por comas (por defecto todos)"
+EXPAND_DESCRIPTION = "Relaciones a incluir, separadas por comas (por defecto todas si no se indica fields)"
+
+
+@dataclass(frozen=True)
+class Fieldset:
+    columns: Tuple[str, ...]
+    relations: Tuple[str, ...]
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return self.columns + self.relations
+
+
+def _split(value: str) -> List[str]:
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def parse_fieldset(
+    model: Type[BaseModel],
+    relations: Sequence[str],
+    fields: Optional[str],
+    expand: Optional[str],
+) -> Optional[Fieldset]:
+    """Devuelve None si no se pidió ningún recorte (respuesta completa)."""
+    if fields is None and expand is None:
+        return None
+
+    scalars = [name for name in model.model_fields if name not in relations]
+    requested = _split(fields) if fields is not None else scalars
+    expanded = _split(expand) if expand is not None else []
+
+    unknown = [name for name in requested if name not in model.model_fields]
+    unknown += [name for name in expanded if name not in relations]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown field(s): {', '.join(unknown)}"
+        )
+
+    return Fieldset(
+        columns=tuple(name for name in scalars if name in requested),
+        relations=tuple(name for name in relations if name in requested or name in expanded),
+    )
+
+
+@lru_cache(maxsize=256)
+def partial_model(model: Type[BaseModel], names: Tuple[str, ...]) -> Type[BaseModel]:
+    """Submodelo de `model` con solo `names`, en el orden original de los campos."""
+    definitions = {
+        name: (info.annotation, info)
+        for name, info in model.model_fields.items()
+        if name in names
+    }
+    return create_model(
+        f"{model.__name__}Partial",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions,
+    )
+
+
+def sparse_select(
+    entity: Any,
+    fieldset: Fieldset,
+    always: Iterable[str] = (),
+    relation_keys: Optional[Mapping[str, Sequence[str]]] = None,
+) -> Tuple[Select, bool]:
+    """
+    Construye el SELECT para un fieldset. `always` son columnas que el servicio
+    necesita aunque no se devuelvan (p. ej. las del cursor keyset).
+
+    Devuelve (stmt, es_entidad): sin relaciones es un SELECT de columnas y las
+    filas son Row; con relaciones se carga la entidad con load_only + selectinload
+    solo de las relaciones pedidas (y las FKs que estas necesitan).
+    """
+    columns = list(dict.fromkeys([*always, *fieldset.columns]))
+    if not fieldset.relations:
+        return select(*[getattr(entity, name) for name in columns]), False
+
+    for relation in fieldset.relations:
+        columns.extend(key for key in (relation_keys or {}).get(relation, ()) if key not in columns)
+    stmt = select(entity).options(
+        load_only(*[getattr(entity, name) for name in columns]),
+        *[selectinload(getattr(entity, relation)) for relation in fieldset.relations],
+    )
+    return stmt, True
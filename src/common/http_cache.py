@@ -0,0 +1,68 @@
+"""
+Respuestas condicionales (ETag / If-None-Match) y cabeceras Cache-Control.
+
+El ETag es fuerte. En los catálogos es un hash del cuerpo JSON exacto que se envía;
+en los recursos de detalle, un hash de las versiones (columna `version`) de las filas
+de las que sale el cuerpo, así la revalidación se decide con una consulta de una fila
+antes de cargar y serializar el recurso. Si el cliente manda un If-None-Match que
+coincide se responde 304 sin cuerpo.
+"""
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response, status
+
+# Catálogos: datos no sensibles que cambian muy poco; nginx puede cachearlos
+CACHE_CONTROL_CATALOG = "public, max-age=60"
+# Recursos de detalle: mutables y con datos personales; el cliente siempre revalida
+CACHE_CONTROL_REVALIDATE = "private, no-cache"
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def version_etag(*parts: Any) -> str:
+    """ETag a partir del tipo, el ID y las versiones de las filas que forman la respuesta."""
+    return make_etag(":".join(map(str, parts)).encode())
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110): ignora el prefijo W/."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(
+    request: Request, etag: str, cache_control: str = CACHE_CONTROL_REVALIDATE
+) -> Optional[Response]:
+    """304 si el If-None-Match de la petición coincide con `etag`; None si hay que enviar el cuerpo."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag, "Cache-Control": cache_control},
+        )
+    return None
+
+
+def conditional_json_response(
+    request: Request,
+    body: bytes,
+    etag: Optional[str] = None,
+    cache_control: str = CACHE_CONTROL_REVALIDATE,
+) -> Response:
+    """Devuelve 304 si el cliente ya tiene esta versión, o el JSON con su ETag."""
+    etag = etag or make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,350 @@
+"""
+Cabecera Idempotency-Key para los POST que crean recursos.
+
+Los gateways reintentan POST /emergencies o POST /users cuando pierden la
+respuesta; sin esto cada reintento crea otra fila. Con `Idempotency-Key`:
+
+- la primera petición con una clave se ejecuta y su respuesta (solo 2xx) se
+  guarda IDEMPOTENCY_TTL segundos;
+- un reintento con la misma clave recibe la respuesta guardada, con la cabecera
+  Idempotent-Replayed, sin pasar por el router ni por la base de datos;
+- un duplicado concurrente (la primera aún en curso) espera hasta
+  IDEMPOTENCY_WAIT segundos a que termine y recibe su respuesta; si no termina a
+  tiempo responde 409;
+- reutilizar la clave con otro cuerpo responde 422;
+- si la primera falla (no 2xx) la clave se libera y el siguiente intento se ejecuta.
+
+La clave se separa por API key, método y ruta. Con REDIS_URL el estado se comparte
+entre workers (SET NX como reserva). Si Redis no responde al reservar se responde
+503 en lugar de seguir solo con la memoria del worker, que no vería la reserva de
+otro worker; si falla al guardar la respuesta la reserva se borra para no dejar
+la clave en 409 hasta que caduque. Sin REDIS_URL el estado es por worker, con
+como mucho IDEMPOTENCY_MAX_ENTRIES claves.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.common.metrics import IDEMPOTENCY_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "10"))
+# Reserva de una petición en curso; caduca sola si el worker muere a mitad
+IDEMPOTENCY_LOCK_TTL = int(os.getenv("IDEMPOTENCY_LOCK_TTL", "60"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+POLL_INTERVAL = 0.05
+REDIS_PREFIX = "idempotency:"
+
+CLAIMED, PENDING, DONE = "claimed", "pending", "done"
+
+
+class IdempotencyUnavailable(Exception):
+    """Redis no respondió al reservar la clave."""
+
+
+@dataclass
+class StoredResponse:
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+    def to_json(self) -> dict:
+        return {
+            "status": self.status,
+            "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in self.headers],
+            "body": base64.b64encode(self.body).decode(),
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "StoredResponse":
+        return cls(
+            status=data["status"],
+            headers=[(name.encode("latin-1"), value.encode("latin-1")) for name, value in data["headers"]],
+            body=base64.b64decode(data["body"]),
+        )
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    expires_at: float
+    response: Optional[StoredResponse] = None
+    done: Optional[asyncio.Event] = None
+
+
+class IdempotencyStore:
+    """Estado de las claves: en Redis si está disponible, si no en memoria del worker."""
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, _Entry] = {}
+        self._redis = None
+        self._swept_at = time.monotonic()
+
+    async def start(self) -> None:
+        redis_url = os.getenv("REDIS_URL")
+        if not redis_url:
+            return
+        try:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.from_url(redis_url)
+            await self._redis.ping()
+        except Exception as e:
+            logger.warning(f"Redis not available for idempotency keys, using in-process store: {e}")
+            self._redis = None
+
+    async def stop(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def claim(self, key: str, fingerprint: str) -> Tuple[str, str, Optional[StoredResponse]]:
+        """Reserva la clave. Devuelve (CLAIMED | PENDING | DONE, huella registrada, respuesta guardada)."""
+        if self._redis is not None:
+            try:
+                return await self._redis_claim(key, fingerprint)
+            except Exception as e:
+                # Con la memoria del worker otro worker podría ejecutar la misma petición
+                logger.warning(f"Idempotency store unavailable in Redis: {e}")
+                raise IdempotencyUnavailable() from e
+        return self._memory_claim(key, fingerprint)
+
+    async def wait(self, key: str) -> Tuple[str, Optional[StoredResponse]]:
+        """Espera a que termine la petición en curso: (DONE, respuesta), (CLAIMED, None) si se liberó o (PENDING, None)."""
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.done is not None:
+                try:
+                    await asyncio.wait_for(entry.done.wait(), IDEMPOTENCY_WAIT)
+                except asyncio.TimeoutError:
+                    return PENDING, None
+            return (DONE, entry.response) if entry.response is not None else (CLAIMED, None)
+
+        while self._redis is not None and time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                raw = await self._redis.get(REDIS_PREFIX + key)
+            except Exception:
+                return CLAIMED, None
+            if raw is None:
+                return CLAIMED, None
+            data = json.loads(raw)
+            if data.get("response") is not None:
+                return DONE, StoredResponse.from_json(data["response"])
+        return PENDING, None
+
+    async def save(self, key: str, fingerprint: str, response: StoredResponse) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.response = response
+            entry.expires_at = time.monotonic() + IDEMPOTENCY_TTL
+            self._finish(entry)
+            return
+        if self._redis is None:
+            return
+        try:
+            value = json.dumps({"fingerprint": fingerprint, "response": response.to_json()})
+            await self._redis.set(REDIS_PREFIX + key, value, ex=IDEMPOTENCY_TTL)
+        except Exception as e:
+            # Sin borrar la reserva los reintentos recibirían 409 hasta IDEMPOTENCY_LOCK_TTL
+            logger.warning(f"Could not store idempotent response, releasing the key: {e}")
+            await self.release(key)
+
+    async def release(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._finish(entry)
+            return
+        if self._redis is None:
+            return
+        try:
+            await self._redis.delete(REDIS_PREFIX + key)
+        except Exception as e:
+            logger.debug(f"Could not release idempotency key: {e}")
+
+    async def _redis_claim(self, key: str, fingerprint: str) -> Tuple[str, str, Optional[StoredResponse]]:
+        redis_key = REDIS_PREFIX + key
+        pending = json.dumps({"fingerprint": fingerprint, "response": None})
+        while True:
+            if await self._redis.set(redis_key, pending, nx=True, ex=IDEMPOTENCY_LOCK_TTL):
+                return CLAIMED, fingerprint, None
+            raw = await self._redis.get(redis_key)
+            # Caducó o se liberó entre el SET y el GET: se vuelve a intentar la reserva
+            if raw is None:
+                continue
+            data = json.loads(raw)
+            if data.get("response") is None:
+                return PENDING, data["fingerprint"], None
+            return DONE, data["fingerprint"], StoredResponse.from_json(data["response"])
+
+    def _memory_claim(self, key: str, fingerprint: str) -> Tuple[str, str, Optional[StoredResponse]]:
+        now = time.monotonic()
+        if now - self._swept_at >= IDEMPOTENCY_LOCK_TTL:
+            self._sweep(now)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > now:
+            if entry.response is not None:
+                return DONE, entry.fingerprint, entry.response
+            return PENDING, entry.fingerprint, None
+        if len(self._entries) >= IDEMPOTENCY_MAX_ENTRIES:
+            self._sweep(now)
+        if len(self._entries) >= IDEMPOTENCY_MAX_ENTRIES:
+            self._evict()
+        self._entries[key] = _Entry(fingerprint, now + IDEMPOTENCY_LOCK_TTL, done=asyncio.Event())
+        return CLAIMED, fingerprint, None
+
+    @staticmethod
+    def _finish(entry: _Entry) -> None:
+        if entry.done is not None:
+            entry.done.set()
+            entry.done = None
+
+    def _evict(self) -> None:
+        # Lleno de entradas vigentes: se descarta la respuesta guardada más antigua (las
+        # claves se insertan en orden); solo si todas están en curso, la reserva más antigua
+        oldest = next(iter(self._entries))
+        key = next((key for key, entry in self._entries.items() if entry.response is not None), oldest)
+        self._finish(self._entries.pop(key))
+
+    def _sweep(self, now: float) -> None:
+        for key in [key for key, entry in self._entries.items() if entry.expires_at <= now]:
+            self._finish(self._entries.pop(key))
+        self._swept_at = now
+
+
+idempotency_store = IdempotencyStore()
+
+
+def _error(status_code: int, detail: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"detail": detail}, headers=headers)
+
+
+class IdempotencyMiddleware:
+    """Middleware ASGI que aplica Idempotency-Key a las rutas (método, path) indicadas."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        routes: Iterable[Tuple[str, str]] = (),
+        store: IdempotencyStore = idempotency_store,
+    ) -> None:
+        self.app = app
+        self.routes: Set[Tuple[str, str]] = set(routes)
+        self.store = store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (scope["method"], scope["path"].rstrip("/") or "/") not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(IDEMPOTENCY_HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            await _error(400, f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        scope_key = "\0".join((headers.get("x-api-key", ""), scope["method"], scope["path"], idempotency_key))
+        key = hashlib.sha256(scope_key.encode()).hexdigest()
+        fingerprint = hashlib.sha256(scope.get("query_string", b"") + b"\0" + body).hexdigest()
+
+        while True:
+            try:
+                state, stored_fingerprint, stored = await self.store.claim(key, fingerprint)
+            except IdempotencyUnavailable:
+                IDEMPOTENCY_REQUESTS.labels("unavailable").inc()
+                await _error(503, "Idempotency store unavailable, retry later", {"Retry-After": "1"})(
+                    scope, receive, send
+                )
+                return
+            if state == CLAIMED:
+                break
+            if stored_fingerprint != fingerprint:
+                IDEMPOTENCY_REQUESTS.labels("mismatch").inc()
+                await _error(422, "Idempotency-Key reused with a different request body")(scope, receive, send)
+                return
+            if state == PENDING:
+                state, stored = await self.store.wait(key)
+                if state == CLAIMED:
+                    continue
+                if state == PENDING:
+                    IDEMPOTENCY_REQUESTS.labels("conflict").inc()
+                    await _error(409, "A request with this Idempotency-Key is still in progress")(
+                        scope, receive, send
+                    )
+                    return
+            IDEMPOTENCY_REQUESTS.labels("replayed").inc()
+            await self._replay(stored, send)
+            return
+
+        await self._execute(scope, body, receive, send, key, fingerprint)
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def _execute(
+        self, scope: Scope, body: bytes, receive: Receive, send: Send, key: str, fingerprint: str
+    ) -> None:
+        body_sent = False
+
+        async def replay_receive() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def capture_send(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await self.store.release(key)
+            raise
+        if start is not None and 200 <= start["status"] < 300:
+            IDEMPOTENCY_REQUESTS.labels("stored").inc()
+            response = StoredResponse(start["status"], list(start.get("headers", [])), b"".join(chunks))
+            await self.store.save(key, fingerprint, response)
+        else:
+            await self.store.release(key)
+
+    @staticmethod
+    async def _replay(stored: StoredResponse, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": stored.status,
+            "headers": [*stored.headers, (b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": stored.body})
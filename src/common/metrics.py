@@ -0,0 +1,136 @@
+"""
+Métricas Prometheus: latencia y códigos por ruta, SQL por petición, pool y rate limiting.
+
+- El middleware mide cada petición HTTP con la plantilla de la ruta como etiqueta
+  (/emergencies/{emergency_id}, no el path real) para acotar la cardinalidad.
+- Los eventos de SQLAlchemy (src/database/db.py) suman sentencias y tiempo de SQL
+  en un acumulador por petición (ContextVar); el contexto se copia al threadpool y
+  a run_sync, así que las consultas de los servicios sync también cuentan.
+- GET /metrics expone todo en formato texto de Prometheus.
+
+Con varios workers de gunicorn, PROMETHEUS_MULTIPROC_DIR activa el modo
+multiproceso de prometheus_client: cada worker escribe sus valores en ese
+directorio y cualquier worker responde /metrics con la suma de todos
+(ver gunicorn.conf.py). Sin la variable cada worker expone solo los suyos.
+
+METRICS_ENABLED=0 desactiva el middleware y la recogida de SQL.
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+UNMATCHED_ROUTE = "unmatched"
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Peticiones HTTP por ruta y código", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP", ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "Sentencias SQL por petición", ["method", "route"],
+    buckets=STATEMENT_BUCKETS,
+)
+DB_TIME = Histogram(
+    "http_request_db_seconds", "Tiempo de SQL por petición", ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Espera para obtener una conexión del pool", ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts que agotaron DB_POOL_TIMEOUT", ["pool"]
+)
+POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Conexiones del pool en uso", ["pool"], multiprocess_mode="livesum"
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total", "Peticiones rechazadas con 429", ["limit"]
+)
+RATE_LIMIT_STRICT_CHECKS = Counter(
+    "rate_limit_strict_checks_total", "Comprobaciones del rate limiter contra Redis"
+)
+IDEMPOTENCY_REQUESTS = Counter(
+    "idempotency_requests_total",
+    "Peticiones con Idempotency-Key (stored = ejecutada y guardada, replayed = respondida sin ejecutar, "
+    "unavailable = 503 por Redis caído)",
+    ["result"],
+)
+EMERGENCY_DEDUP = Counter(
+    "emergency_dedup_total",
+    "Reportes de emergencia revisados por la deduplicación (memory/database = duplicado suprimido)",
+    ["result"],
+)
+EMERGENCIES_ARCHIVED = Counter(
+    "emergencies_archived_total", "Emergencias cerradas movidas a emergencies_archive"
+)
+
+# [sentencias, segundos] de la petición en curso
+_sql_usage: ContextVar[Optional[List[float]]] = ContextVar("sql_usage", default=None)
+
+
+def record_sql(elapsed: float) -> None:
+    usage = _sql_usage.get()
+    if usage is not None:
+        usage[0] += 1
+        usage[1] += elapsed
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Texto de Prometheus; en modo multiproceso agrega los valores de todos los workers."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    from prometheus_client import REGISTRY
+
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que registra latencia, código y uso de SQL por plantilla de ruta."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        usage = [0, 0.0]
+        token = _sql_usage.set(usage)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _sql_usage.reset(token)
+            # El router de FastAPI deja la ruta encontrada en el scope
+            route = scope.get("route")
+            route_path = getattr(route, "path", UNMATCHED_ROUTE)
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, route_path, str(status_code)).inc()
+            HTTP_LATENCY.labels(method, route_path).observe(elapsed)
+            DB_STATEMENTS.labels(method, route_path).observe(usage[0])
+            DB_TIME.labels(method, route_path).observe(usage[1])
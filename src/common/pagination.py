@@ -0,0 +1,36 @@
+"""
+Cursores opacos para paginación keyset.
+
+El cursor codifica los valores de la clave de orden del último elemento devuelto;
+la página siguiente busca directamente "después" de esos valores (WHERE (a, b) < (x, y))
+en lugar de saltar filas con OFFSET, así que cualquier página cuesta lo mismo.
+"""
+import base64
+import json
+from typing import Any, List, Optional
+
+from fastapi import HTTPException, Response, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: List[Any]) -> str:
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decodifica un cursor con `size` valores; 400 si no es válido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]) -> None:
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
@@ -0,0 +1,56 @@
+"""
+Respuestas JSON con una sola validación.
+
+Si un endpoint devuelve un modelo (o una lista de modelos), FastAPI lo vuelve a
+validar contra `response_model` y luego lo serializa con jsonable_encoder + json.
+Estas funciones validan los objetos ORM una vez, con un TypeAdapter cacheado por
+modelo, y escriben los bytes JSON directamente con el serializador de pydantic-core.
+Al devolver un Response, FastAPI no repite el trabajo; `response_model` se mantiene
+en el decorador solo para la documentación OpenAPI.
+"""
+from functools import lru_cache
+from typing import Any, Iterable, List, Mapping, Optional, Type
+
+from fastapi import Response, status
+from pydantic import BaseModel, TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def dump_model(model: Type[BaseModel], obj: Any) -> bytes:
+    """Valida `obj` (ORM, dict o instancia del modelo) y lo serializa a JSON."""
+    instance = obj if isinstance(obj, model) else model.model_validate(obj)
+    return model.__pydantic_serializer__.to_json(instance)
+
+
+def dump_list(model: Type[BaseModel], objs: Iterable[Any]) -> bytes:
+    adapter = _list_adapter(model)
+    return adapter.dump_json(adapter.validate_python(list(objs), from_attributes=True))
+
+
+def json_response(
+    body: bytes,
+    status_code: int = status.HTTP_200_OK,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def model_response(
+    model: Type[BaseModel],
+    obj: Any,
+    status_code: int = status.HTTP_200_OK,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    return json_response(dump_model(model, obj), status_code, headers)
+
+
+def list_response(
+    model: Type[BaseModel],
+    objs: Iterable[Any],
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    return json_response(dump_list(model, objs), headers=headers)
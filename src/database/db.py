@@ -1,11 +1,26 @@
 ﻿import os
+import time
 from pathlib import Path
-from typing import Generator, Annotated
+from typing import Any, AsyncGenerator, Callable, Generator, Annotated, TypeVar
 
 from dotenv import load_dotenv
 from fastapi import Depends
-from sqlalchemy import create_engine
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from src.common.metrics import METRICS_ENABLED, POOL_IN_USE, record_sql
+
+from .pool import (
+    InstrumentedAsyncQueuePool,
+    InstrumentedNullPool,
+    InstrumentedQueuePool,
+    pool_status,
+)
+
+T = TypeVar("T")
 
 
 def _build_database_url() -> str:
@@ -52,6 +67,76 @@ def _build_database_url() -> str:
     return f"{dialect_driver}://{auth}{netloc}/{name}"
 
 
+# Drivers async equivalentes por dialecto
+_ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def _build_async_database_url(sync_url: str) -> str:
+    """
+    Obtiene la URL para el engine async:
+    - Usa ASYNC_DATABASE_URL si está definida.
+    - Si no, reemplaza el driver de la URL sync por su equivalente async
+      (psycopg2 -> asyncpg, pysqlite -> aiosqlite).
+    """
+    direct = os.getenv("ASYNC_DATABASE_URL")
+    if direct:
+        return direct.strip().strip('"').strip("'")
+
+    url = make_url(sync_url)
+    backend = url.get_backend_name()
+    driver = _ASYNC_DRIVERS.get(backend)
+    if not driver:
+        raise ValueError(f"No hay driver async configurado para el dialecto '{backend}'")
+    return url.set(drivername=f"{backend}+{driver}").render_as_string(hide_password=False)
+
+
+def _env_int(name: str, default: int) -> int:
+    value = (os.getenv(name) or "").strip()
+    return int(value) if value else default
+
+
+def _env_flag(name: str, default: str = "0") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def _pool_options(url: str, is_async: bool) -> dict:
+    """
+    Opciones de pool para create_engine / create_async_engine desde variables de entorno:
+    - DB_POOL_MODE: "queue" (por defecto) o "null" (sin pool propio, para PgBouncer
+      en modo transaction: cada checkout abre y cierra la conexión contra PgBouncer).
+    - DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (s), DB_POOL_RECYCLE (s).
+    - DB_POOL_PRE_PING: valida la conexión en cada checkout.
+    SQLite en memoria conserva el pool por defecto de SQLAlchemy.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}
+
+    options: dict = {"pool_pre_ping": _env_flag("DB_POOL_PRE_PING", "1")}
+    mode = (os.getenv("DB_POOL_MODE") or "queue").strip().lower()
+
+    if mode == "null":
+        options["poolclass"] = InstrumentedNullPool
+        if is_async and parsed.get_backend_name() == "postgresql":
+            # PgBouncer en modo transaction no soporta prepared statements persistentes
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+    if mode != "queue":
+        raise ValueError(f"DB_POOL_MODE inválido: '{mode}' (usar 'queue' o 'null')")
+
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=_env_int("DB_POOL_SIZE", 5),
+        max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+        pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+        pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+    )
+    return options
+
+
 # Cargar .env ubicado en la raíz de src
 SRC_DIR = Path(__file__).resolve().parents[1]
 load_dotenv(dotenv_path=SRC_DIR / ".env", override=False)
@@ -59,12 +144,34 @@ load_dotenv(dotenv_path=SRC_DIR / ".env", override=False)
 # Crear engine, SessionLocal y dependencia de DB
 DATABASE_URL = _build_database_url()
 
+# Modo async: los endpoints usan AsyncSession sobre un driver async
+DB_ASYNC = _env_flag("DB_ASYNC")
+
 engine = create_engine(
     DATABASE_URL,
-    pool_pre_ping=True,
-    echo=os.getenv("SQL_ECHO", "0").lower() in ("1", "true", "yes"),
+    echo=_env_flag("SQL_ECHO"),
+    **_pool_options(DATABASE_URL, is_async=False),
 )
 
+def _instrument_engine(target: Engine, pool_label: str) -> None:
+    """Eventos para las métricas: sentencias y tiempo de SQL por petición, conexiones en uso."""
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_sql(time.perf_counter() - context._query_started)
+
+    in_use = POOL_IN_USE.labels(pool_label)
+    event.listen(target, "checkout", lambda *args: in_use.inc())
+    event.listen(target, "checkin", lambda *args: in_use.dec())
+
+
+if METRICS_ENABLED:
+    _instrument_engine(engine, "sync")
+
 SessionLocal = sessionmaker(
     bind=engine,
     autoflush=False,
@@ -87,3 +194,114 @@ def get_db() -> Generator[Session, None, None]:
 
 # Alias de tipo para inyectar la sesión en endpoints de FastAPI
 DbSession = Annotated[Session, Depends(get_db)]
+
+
+# Engine async: solo se crea en modo async para no exigir asyncpg/aiosqlite en modo sync
+async_engine = None
+AsyncSessionLocal = None
+
+if DB_ASYNC:
+    ASYNC_DATABASE_URL = _build_async_database_url(DATABASE_URL)
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        echo=_env_flag("SQL_ECHO"),
+        **_pool_options(ASYNC_DATABASE_URL, is_async=True),
+    )
+    if METRICS_ENABLED:
+        _instrument_engine(async_engine.sync_engine, "async")
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependencia async para FastAPI: abre una AsyncSession y la cierra al finalizar.
+    Uso:
+        async def endpoint(db: AsyncDbSession): ...
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("El engine async no está habilitado (DB_ASYNC=false)")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+AsyncDbSession = Annotated[AsyncSession, Depends(get_async_db)]
+
+# Sesión usada por los controllers: async o sync según DB_ASYNC
+AppDbSession = AsyncDbSession if DB_ASYNC else DbSession
+
+
+async def run_db(db: Session | AsyncSession, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Ejecuta una función de servicio sync (`fn(session, ...)`) sin bloquear el event loop:
+    - AsyncSession: la ejecuta con run_sync sobre el driver async (sin hilos).
+    - Session: la ejecuta en el threadpool de Starlette, igual que un endpoint `def`.
+    Así los servicios se escriben una sola vez y sirven para ambos modos.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+async def run_in_session(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Como run_db, pero abre la sesión solo para esta llamada. Para endpoints que casi
+    siempre responden sin base de datos (cachés): la dependencia AppDbSession abriría
+    una sesión (y en modo sync pasaría por el threadpool) en cada petición.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(fn, *args, **kwargs)
+
+    def call() -> T:
+        with SessionLocal() as db:
+            return fn(db, *args, **kwargs)
+
+    return await run_in_threadpool(call)
+
+
+def _prewarm_count() -> int:
+    # Nunca abrir más conexiones que el tamaño base del pool
+    return min(_env_int("DB_POOL_PREWARM", 0), _env_int("DB_POOL_SIZE", 5))
+
+
+def prewarm_pool() -> int:
+    """
+    Abre DB_POOL_PREWARM conexiones del engine sync y las devuelve al pool,
+    para que las primeras peticiones no paguen el handshake con la base de datos.
+    """
+    count = _prewarm_count()
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+async def prewarm_async_pool() -> int:
+    """Equivalente de prewarm_pool para el engine async."""
+    if async_engine is None:
+        return 0
+    count = _prewarm_count()
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(await async_engine.connect())
+    finally:
+        for connection in connections:
+            await connection.close()
+    return len(connections)
+
+
+def get_pool_stats() -> dict:
+    """Estado y contadores de checkout de los pools de este worker."""
+    stats = {"sync": pool_status(engine.pool)}
+    if async_engine is not None:
+        stats["async"] = pool_status(async_engine.sync_engine.pool)
+    return stats
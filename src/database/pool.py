@@ -0,0 +1,106 @@
+"""
+Pools de conexión instrumentados.
+
+Las subclases miden cuánto tarda cada checkout (espera en cola + conexión nueva)
+y cuentan timeouts, para distinguir un pool agotado de una query lenta.
+"""
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from src.common.metrics import METRICS_ENABLED, POOL_CHECKOUT_TIMEOUTS, POOL_CHECKOUT_WAIT
+
+
+class PoolStats:
+    """Contadores acumulados de checkout de un pool (thread-safe)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+
+    def record_checkout(self, wait_ms: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total_ms += wait_ms
+            if wait_ms > self.wait_max_ms:
+                self.wait_max_ms = wait_ms
+
+    def record_timeout(self, wait_ms: float) -> None:
+        with self._lock:
+            self.timeouts += 1
+            self.wait_total_ms += wait_ms
+            if wait_ms > self.wait_max_ms:
+                self.wait_max_ms = wait_ms
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_total_ms": round(self.wait_total_ms, 3),
+                "wait_avg_ms": round(self.wait_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max_ms, 3),
+            }
+
+
+class _InstrumentedPoolMixin:
+    """Mide el tiempo de `connect()` de cualquier pool de SQLAlchemy."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    @property
+    def metrics_label(self) -> str:
+        return "async" if getattr(self._dialect, "is_async", False) else "sync"
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            wait = time.perf_counter() - start
+            self.stats.record_timeout(wait * 1000)
+            if METRICS_ENABLED:
+                POOL_CHECKOUT_TIMEOUTS.labels(self.metrics_label).inc()
+                POOL_CHECKOUT_WAIT.labels(self.metrics_label).observe(wait)
+            raise
+        wait = time.perf_counter() - start
+        self.stats.record_checkout(wait * 1000)
+        if METRICS_ENABLED:
+            POOL_CHECKOUT_WAIT.labels(self.metrics_label).observe(wait)
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(_InstrumentedPoolMixin, NullPool):
+    pass
+
+
+def pool_status(pool: Any) -> dict:
+    """Estado actual del pool más los contadores acumulados."""
+    data: dict = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        data.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+        )
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        data.update(stats.snapshot())
+    return data
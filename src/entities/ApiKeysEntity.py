@@ -0,0 +1,15 @@
+﻿# src/entities/api_keys.py
+from sqlalchemy import Column, Integer, String, TIMESTAMP, func
+from .BaseEntity import Base
+
+class ApiKeys(Base):
+    __tablename__ = "api_keys"
+
+    api_key_id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(255), nullable=False)
+    # Solo se guarda el SHA-256 de la clave; el prefijo sirve para identificarla en logs
+    key_hash = Column(String(64), nullable=False, unique=True)
+    key_prefix = Column(String(12), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    expires_at = Column(TIMESTAMP, nullable=True)
+    revoked_at = Column(TIMESTAMP, nullable=True)
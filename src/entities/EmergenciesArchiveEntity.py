@@ -0,0 +1,36 @@
+﻿# src/entities/emergencies_archive.py
+from sqlalchemy import Column, Integer, TIMESTAMP, ForeignKey, Numeric, Index, func
+from sqlalchemy.orm import relationship
+from .BaseEntity import Base
+
+class EmergenciesArchive(Base):
+    """
+    Emergencias cerradas (status = 3) movidas fuera de `emergencies` por el job de
+    archivado (src/features/emergencies/archive.py). Mismas columnas y mismo
+    emergency_id, así los servicios leen ambas tablas con el mismo código.
+    """
+    __tablename__ = "emergencies_archive"
+    __table_args__ = (
+        Index("ix_emergencies_archive_timestamp_id", "timestamp", "emergency_id"),
+        Index("ix_emergencies_archive_unit_timestamp_id", "assigned_unit", "timestamp", "emergency_id"),
+        Index("ix_emergencies_archive_user_timestamp", "user_id", "timestamp"),
+    )
+
+    emergency_id = Column(Integer, primary_key=True, autoincrement=False)
+    timestamp = Column(TIMESTAMP, nullable=False)
+    tipo_accidente = Column(Integer, ForeignKey("accident_types.accident_type_id"), nullable=True)
+    # Las relaciones son viewonly: al borrar la unidad o el usuario es la base la que deja NULL
+    assigned_unit = Column(
+        Integer, ForeignKey("emergency_unit.emergency_unit_id", ondelete="SET NULL"), nullable=True
+    )
+    latitud = Column(Numeric(8, 6), nullable=False)
+    longitud = Column(Numeric(9, 6), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="SET NULL"), nullable=True)
+    status = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, server_default="1")
+    archived_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+
+    # Solo lectura: las relaciones inversas (p. ej. Users.emergencies) son las de la tabla activa
+    accident_type = relationship("AccidentTypes", viewonly=True)
+    assigned_unit_rel = relationship("EmergencyUnit", viewonly=True)
+    user = relationship("Users", viewonly=True)
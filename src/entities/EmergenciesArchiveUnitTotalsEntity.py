@@ -0,0 +1,16 @@
+﻿# src/entities/emergencies_archive_unit_totals.py
+from sqlalchemy import Column, Integer, ForeignKey
+from .BaseEntity import Base
+
+class EmergenciesArchiveUnitTotals(Base):
+    """
+    Emergencias archivadas por unidad. El job de archivado la actualiza en la misma
+    transacción en que mueve las filas, así las estadísticas de la flota suman el
+    histórico sin recorrer emergencies_archive.
+    """
+    __tablename__ = "emergencies_archive_unit_totals"
+
+    emergency_unit_id = Column(
+        Integer, ForeignKey("emergency_unit.emergency_unit_id", ondelete="CASCADE"), primary_key=True
+    )
+    total = Column(Integer, nullable=False, server_default="0")
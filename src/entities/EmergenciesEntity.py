@@ -1,5 +1,5 @@
 ﻿# src/entities/emergencies.py
-from sqlalchemy import Column, Integer, TIMESTAMP, ForeignKey, Numeric, CheckConstraint, func
+from sqlalchemy import Column, Integer, TIMESTAMP, ForeignKey, Numeric, CheckConstraint, Index, func
 from sqlalchemy.orm import relationship
 from .BaseEntity import Base
 
@@ -7,6 +7,15 @@ class Emergencies(Base):
     __tablename__ = "emergencies"
     __table_args__ = (
         CheckConstraint("status IN (1, 2, 3)", name="chk_emergencies_status"),
+        # Paginación keyset: ORDER BY timestamp DESC, emergency_id DESC
+        Index("ix_emergencies_timestamp_id", "timestamp", "emergency_id"),
+        # Listados filtrados por estado o por unidad, en el mismo orden
+        Index("ix_emergencies_status_timestamp_id", "status", "timestamp", "emergency_id"),
+        Index("ix_emergencies_unit_timestamp_id", "assigned_unit", "timestamp", "emergency_id"),
+        # Emergencias de un usuario, de la más reciente a la más antigua
+        Index("ix_emergencies_user_timestamp", "user_id", "timestamp"),
+        # Carga activa por unidad (despacho y estadísticas) resuelta solo con el índice
+        Index("ix_emergencies_unit_status", "assigned_unit", "status"),
     )
 
     emergency_id = Column(Integer, primary_key=True, autoincrement=True)
@@ -17,6 +26,8 @@ class Emergencies(Base):
     longitud = Column(Numeric(9, 6), nullable=False)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=True)
     status = Column(Integer, nullable=False, server_default="1")
+    # Versión de la fila: los servicios la incrementan en cada UPDATE (ETag sin cargar la fila)
+    version = Column(Integer, nullable=False, server_default="1")
 
     accident_type = relationship("AccidentTypes", back_populates="emergencies")
     assigned_unit_rel = relationship("EmergencyUnit", back_populates="emergencies")
@@ -10,5 +10,7 @@ class EmergencyUnit(Base):
     name = Column(String(255), nullable=False)
     latitud = Column(Numeric(8, 6), nullable=False)
     longitud = Column(Numeric(9, 6), nullable=False)
+    # Versión de la fila: los servicios la incrementan en cada UPDATE (ETag sin cargar la fila)
+    version = Column(Integer, nullable=False, server_default="1")
 
     emergencies = relationship("Emergencies", back_populates="assigned_unit_rel")
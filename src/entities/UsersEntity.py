@@ -1,5 +1,5 @@
 ﻿# src/entities/users.py
-from sqlalchemy import Column, Integer, String, Date, TIMESTAMP, func
+from sqlalchemy import Column, Integer, String, Date, TIMESTAMP, Index, func
 from sqlalchemy.orm import relationship
 from .BaseEntity import Base
 from .UserConditionsEntity import UserConditions
@@ -7,6 +7,10 @@ from .MedicalConditionsEntity import MedicalConditions  # Ensure class is regist
 
 class Users(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Login y get_user_by_phone: un teléfono identifica a un usuario
+        Index("ix_users_phone", "phone", unique=True),
+    )
 
     user_id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), nullable=False)
@@ -14,6 +18,8 @@ class Users(Base):
     birthday = Column(Date, nullable=True)
     password = Column(String(255), nullable=False)
     created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    # Versión de la fila: los servicios la incrementan en cada UPDATE (ETag sin cargar la fila)
+    version = Column(Integer, nullable=False, server_default="1")
 
     # Relaciones
     conditions = relationship(
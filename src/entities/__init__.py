@@ -8,6 +8,9 @@ from .EmergencyContactsEntity import EmergencyContacts  # noqa: F401
 from .AccidentTypesEntity import AccidentTypes  # noqa: F401
 from .EmergencyUnitEntity import EmergencyUnit  # noqa: F401
 from .EmergenciesEntity import Emergencies  # noqa: F401
+from .EmergenciesArchiveEntity import EmergenciesArchive  # noqa: F401
+from .EmergenciesArchiveUnitTotalsEntity import EmergenciesArchiveUnitTotals  # noqa: F401
+from .ApiKeysEntity import ApiKeys  # noqa: F401
 
 __all__ = [
     "Base",
@@ -19,6 +22,9 @@ __all__ = [
     "AccidentTypes",
     "EmergencyUnit",
     "Emergencies",
+    "EmergenciesArchive",
+    "EmergenciesArchiveUnitTotals",
+    "ApiKeys",
 ]
 # Import side-effects to register all ORM mappings on app startup
 from .BaseEntity import Base  # noqa: F401
@@ -30,6 +36,9 @@ from .EmergencyContactsEntity import EmergencyContacts  # noqa: F401
 from .AccidentTypesEntity import AccidentTypes  # noqa: F401
 from .EmergencyUnitEntity import EmergencyUnit  # noqa: F401
 from .EmergenciesEntity import Emergencies  # noqa: F401
+from .EmergenciesArchiveEntity import EmergenciesArchive  # noqa: F401
+from .EmergenciesArchiveUnitTotalsEntity import EmergenciesArchiveUnitTotals  # noqa: F401
+from .ApiKeysEntity import ApiKeys  # noqa: F401
 
 __all__ = [
     "Base",
@@ -41,4 +50,7 @@ __all__ = [
     "AccidentTypes",
     "EmergencyUnit",
     "Emergencies",
+    "EmergenciesArchive",
+    "EmergenciesArchiveUnitTotals",
+    "ApiKeys",
 ]
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+Caché en memoria de catálogos.
+
+Cada catálogo se guarda ya serializado (lista completa y cada elemento por ID)
+junto con su ETag, así una petición cacheada no toca la base de datos ni vuelve
+a validar/serializar.
+La caché es por worker: las escrituras locales la invalidan al momento y el TTL
+acota cuánto puede tardar un worker en ver cambios hechos por otro.
+En un fallo de caché solo una petición por catálogo consulta la base de datos; las
+concurrentes esperan su resultado.
+"""
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, TypeAdapter
+
+from src.common.http_cache import make_etag
+
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+
+
+@dataclass
+class CachedCatalog:
+    items: List[BaseModel]
+    list_json: bytes
+    item_json: Dict[int, bytes]
+    list_etag: str = ""
+    item_etag: Dict[int, str] = field(default_factory=dict)
+    expires_at: float = field(default=0.0)
+
+
+class CatalogCache:
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._entries: Dict[str, CachedCatalog] = {}
+        # Se incrementan en cada invalidación para descartar cargas que la cruzaron:
+        # una global (invalidate() sin nombre) y una por catálogo
+        self._generation = 0
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Carga en curso por catálogo (single-flight)
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    def get(self, name: str) -> Optional[CachedCatalog]:
+        entry = self._entries.get(name)
+        if entry is None or entry.expires_at <= time.monotonic():
+            return None
+        return entry
+
+    def generation(self, name: str) -> Tuple[int, int]:
+        return self._generation, self._generations.get(name, 0)
+
+    async def get_or_load(self, name: str, load: Callable[[], Awaitable[CachedCatalog]]) -> CachedCatalog:
+        """Devuelve el catálogo cacheado o lo carga con `load`, una sola carga a la vez por catálogo."""
+        entry = self.get(name)
+        if entry is not None:
+            return entry
+        pending = self._loading.get(name)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = asyncio.get_running_loop().create_future()
+        self._loading[name] = pending
+        try:
+            entry = await load()
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # Evita el aviso "exception was never retrieved" si nadie esperaba
+            pending.exception()
+            raise
+        else:
+            pending.set_result(entry)
+            return entry
+        finally:
+            self._loading.pop(name, None)
+
+    def store(self, name: str, items: List[BaseModel], id_field: str, generation: Tuple[int, int]) -> CachedCatalog:
+        """
+        Serializa la lista y cada elemento una sola vez y guarda el resultado.
+        Si ese catálogo se invalidó desde que empezó la carga (`generation` cambió),
+        el resultado se devuelve pero no se guarda.
+        """
+        model = type(items[0]) if items else BaseModel
+        list_json = TypeAdapter(List[model]).dump_json(items)
+        item_json = {getattr(item, id_field): item.model_dump_json().encode() for item in items}
+        entry = CachedCatalog(
+            items=items,
+            list_json=list_json,
+            item_json=item_json,
+            list_etag=make_etag(list_json),
+            item_etag={item_id: make_etag(body) for item_id, body in item_json.items()},
+            expires_at=time.monotonic() + self.ttl,
+        )
+        with self._lock:
+            if self.generation(name) == generation:
+                self._entries[name] = entry
+        return entry
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                self._generation += 1
+                self._entries.clear()
+            else:
+                self._generations[name] = self._generations.get(name, 0) + 1
+                self._entries.pop(name, None)
+
+
+catalog_cache = CatalogCache()
@@ -1,22 +1,44 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException, status
-from src.database.db import DbSession
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from src.common.http_cache import CACHE_CONTROL_CATALOG, conditional_json_response
+from src.database.db import run_in_session
 
+from .cache import CachedCatalog, catalog_cache
 from .model import MedicalConditionOut, KinCatalogOut, AccidentTypeOut, EmergencyUnitOut
 from . import service
 
 router = APIRouter(prefix="/catalogs", tags=["catalogs"])
 
 
+async def _get_catalog(name: str) -> CachedCatalog:
+    # Sin dependencia de sesión: solo se abre una (y una conexión) si el catálogo no está en caché
+    return await catalog_cache.get_or_load(name, lambda: run_in_session(service.load_catalog, name))
+
+
+async def _catalog_list(request: Request, name: str) -> Response:
+    catalog = await _get_catalog(name)
+    return conditional_json_response(request, catalog.list_json, catalog.list_etag, CACHE_CONTROL_CATALOG)
+
+
+async def _catalog_item(request: Request, name: str, item_id: int, not_found: str) -> Response:
+    catalog = await _get_catalog(name)
+    body = catalog.item_json.get(item_id)
+    if body is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=not_found
+        )
+    return conditional_json_response(request, body, catalog.item_etag[item_id], CACHE_CONTROL_CATALOG)
+
+
 @router.get(
     "/medical-conditions",
     response_model=List[MedicalConditionOut],
     summary="Get all medical conditions"
 )
-def get_medical_conditions(db: DbSession) -> List[MedicalConditionOut]:
-    conditions = service.get_all_medical_conditions(db)
-    return [MedicalConditionOut.model_validate(condition) for condition in conditions]
+async def get_medical_conditions(request: Request) -> Response:
+    return await _catalog_list(request, "medical_conditions")
 
 
 @router.get(
@@ -24,14 +46,8 @@ def get_medical_conditions(db: DbSession) -> List[MedicalConditionOut]:
     response_model=MedicalConditionOut,
     summary="Get medical condition by ID"
 )
-def get_medical_condition(condition_id: int, db: DbSession) -> MedicalConditionOut:
-    condition = service.get_medical_condition(db, condition_id)
-    if not condition:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, 
-            detail="Medical condition not found"
-        )
-    return MedicalConditionOut.model_validate(condition)
+async def get_medical_condition(condition_id: int, request: Request) -> Response:
+    return await _catalog_item(request, "medical_conditions", condition_id, "Medical condition not found")
 
 
 @router.get(
@@ -39,9 +55,8 @@ def get_medical_condition(condition_id: int, db: DbSession) -> MedicalConditionO
     response_model=List[KinCatalogOut],
     summary="Get all kin/relationship types"
 )
-def get_kin_catalog(db: DbSession) -> List[KinCatalogOut]:
-    kin_types = service.get_all_kin_catalog(db)
-    return [KinCatalogOut.model_validate(kin) for kin in kin_types]
+async def get_kin_catalog(request: Request) -> Response:
+    return await _catalog_list(request, "kin_catalog")
 
 
 @router.get(
@@ -49,14 +64,8 @@ def get_kin_catalog(db: DbSession) -> List[KinCatalogOut]:
     response_model=KinCatalogOut,
     summary="Get kin/relationship type by ID"
 )
-def get_kin_catalog_item(kin_id: int, db: DbSession) -> KinCatalogOut:
-    kin = service.get_kin_catalog(db, kin_id)
-    if not kin:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Kin catalog item not found"
-        )
-    return KinCatalogOut.model_validate(kin)
+async def get_kin_catalog_item(kin_id: int, request: Request) -> Response:
+    return await _catalog_item(request, "kin_catalog", kin_id, "Kin catalog item not found")
 
 
 @router.get(
@@ -64,9 +73,8 @@ def get_kin_catalog_item(kin_id: int, db: DbSession) -> KinCatalogOut:
     response_model=List[AccidentTypeOut],
     summary="Get all accident types"
 )
-def get_accident_types(db: DbSession) -> List[AccidentTypeOut]:
-    accident_types = service.get_all_accident_types(db)
-    return [AccidentTypeOut.model_validate(accident) for accident in accident_types]
+async def get_accident_types(request: Request) -> Response:
+    return await _catalog_list(request, "accident_types")
 
 
 @router.get(
@@ -74,14 +82,8 @@ def get_accident_types(db: DbSession) -> List[AccidentTypeOut]:
     response_model=AccidentTypeOut,
     summary="Get accident type by ID"
 )
-def get_accident_type(accident_type_id: int, db: DbSession) -> AccidentTypeOut:
-    accident = service.get_accident_type(db, accident_type_id)
-    if not accident:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Accident type not found"
-        )
-    return AccidentTypeOut.model_validate(accident)
+async def get_accident_type(accident_type_id: int, request: Request) -> Response:
+    return await _catalog_item(request, "accident_types", accident_type_id, "Accident type not found")
 
 
 @router.get(
@@ -89,9 +91,8 @@ def get_accident_type(accident_type_id: int, db: DbSession) -> AccidentTypeOut:
     response_model=List[EmergencyUnitOut],
     summary="Get all emergency units"
 )
-def get_emergency_units(db: DbSession) -> List[EmergencyUnitOut]:
-    units = service.get_all_emergency_units(db)
-    return [EmergencyUnitOut.model_validate(unit) for unit in units]
+async def get_emergency_units(request: Request) -> Response:
+    return await _catalog_list(request, "emergency_units")
 
 
 @router.get(
@@ -99,11 +100,5 @@ def get_emergency_units(db: DbSession) -> List[EmergencyUnitOut]:
     response_model=EmergencyUnitOut,
     summary="Get emergency unit by ID"
 )
-def get_emergency_unit(unit_id: int, db: DbSession) -> EmergencyUnitOut:
-    unit = service.get_emergency_unit(db, unit_id)
-    if not unit:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Emergency unit not found"
-        )
-    return EmergencyUnitOut.model_validate(unit)
\ No newline at end of file
+async def get_emergency_unit(unit_id: int, request: Request) -> Response:
+    return await _catalog_item(request, "emergency_units", unit_id, "Emergency unit not found")
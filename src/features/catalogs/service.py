@@ -6,6 +6,8 @@ from src.entities.MedicalConditionsEntity import MedicalConditions
 from src.entities.KinCatalogModel import KinCatalog
 from src.entities.AccidentTypesEntity import AccidentTypes
 from src.entities.EmergencyUnitEntity import EmergencyUnit
+from .cache import CachedCatalog, catalog_cache
+from .model import MedicalConditionOut, KinCatalogOut, AccidentTypeOut, EmergencyUnitOut
 
 
 def get_all_medical_conditions(db: Session) -> List[MedicalConditions]:
@@ -13,32 +15,33 @@ def get_all_medical_conditions(db: Session) -> List[MedicalConditions]:
     return list(db.execute(stmt).scalars().all())
 
 
-def get_medical_condition(db: Session, condition_id: int) -> MedicalConditions | None:
-    return db.get(MedicalConditions, condition_id)
-
-
 def get_all_kin_catalog(db: Session) -> List[KinCatalog]:
     stmt = select(KinCatalog).order_by(KinCatalog.kin_id)
     return list(db.execute(stmt).scalars().all())
 
 
-def get_kin_catalog(db: Session, kin_id: int) -> KinCatalog | None:
-    return db.get(KinCatalog, kin_id)
-
-
 def get_all_accident_types(db: Session) -> List[AccidentTypes]:
     stmt = select(AccidentTypes).order_by(AccidentTypes.accident_type_id)
     return list(db.execute(stmt).scalars().all())
 
 
-def get_accident_type(db: Session, accident_type_id: int) -> AccidentTypes | None:
-    return db.get(AccidentTypes, accident_type_id)
-
-
 def get_all_emergency_units(db: Session) -> List[EmergencyUnit]:
     stmt = select(EmergencyUnit).order_by(EmergencyUnit.emergency_unit_id)
     return list(db.execute(stmt).scalars().all())
 
 
-def get_emergency_unit(db: Session, unit_id: int) -> EmergencyUnit | None:
-    return db.get(EmergencyUnit, unit_id)
+# Catálogos cacheados: nombre -> (consulta, modelo de salida, campo ID)
+CATALOGS = {
+    "medical_conditions": (get_all_medical_conditions, MedicalConditionOut, "medical_condition_id"),
+    "kin_catalog": (get_all_kin_catalog, KinCatalogOut, "kin_id"),
+    "accident_types": (get_all_accident_types, AccidentTypeOut, "accident_type_id"),
+    "emergency_units": (get_all_emergency_units, EmergencyUnitOut, "emergency_unit_id"),
+}
+
+
+def load_catalog(db: Session, name: str) -> CachedCatalog:
+    """Carga un catálogo completo desde la DB y lo deja serializado en la caché."""
+    loader, out_model, id_field = CATALOGS[name]
+    generation = catalog_cache.generation(name)
+    items = [out_model.model_validate(row) for row in loader(db)]
+    return catalog_cache.store(name, items, id_field, generation)
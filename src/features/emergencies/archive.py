@@ -0,0 +1,176 @@
+"""
+Archivado de emergencias cerradas: tabla activa (caliente) y emergencies_archive (fría).
+
+La tabla `emergencies` la recorren en cada petición el despacho, la carga por unidad,
+la deduplicación y los listados; las emergencias cerradas (status = 3) con más de
+ARCHIVE_AFTER_DAYS días solo hacen crecer sus índices. Este job las mueve por lotes
+de ARCHIVE_BATCH_SIZE a `emergencies_archive`, cada lote en su transacción:
+
+1. SELECT ... FOR UPDATE SKIP LOCKED de los IDs más antiguos (ix_emergencies_status_timestamp_id);
+   una fila que se está actualizando en ese momento queda para la siguiente pasada.
+2. INSERT ... SELECT en el archivo con el mismo emergency_id, DELETE en la tabla activa
+   y suma en emergencies_archive_unit_totals para las estadísticas de la flota.
+
+Los servicios leen el archivo cuando se pide histórico (include_archived, exportación,
+mapa de calor, GET por ID); el despacho solo ve la tabla activa. Las emergencias
+archivadas son de solo lectura.
+
+Con ARCHIVE_INTERVAL > 0 cada worker lanza el job cada ARCHIVE_INTERVAL segundos; en
+PostgreSQL un advisory lock por lote hace que solo uno trabaje a la vez. Con
+ARCHIVE_INTERVAL=0 (por defecto) se ejecuta desde cron con scripts/archive_emergencies.py.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.common.metrics import EMERGENCIES_ARCHIVED
+from src.database.db import SessionLocal
+from src.entities.EmergenciesArchiveEntity import EmergenciesArchive
+from src.entities.EmergenciesArchiveUnitTotalsEntity import EmergenciesArchiveUnitTotals
+from src.entities.EmergenciesEntity import Emergencies
+from src.features.emergency_units.service import invalidate_fleet_stats
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "0"))
+# Primer argumento de pg_try_advisory_xact_lock(int, int), como en dedup.py
+ARCHIVE_LOCK_NAMESPACE = 7302
+CLOSED_STATUS = 3
+
+ARCHIVE_COLUMNS = (
+    "emergency_id",
+    "timestamp",
+    "tipo_accidente",
+    "assigned_unit",
+    "latitud",
+    "longitud",
+    "user_id",
+    "status",
+    "version",
+)
+
+
+def archive_cutoff(days: int = ARCHIVE_AFTER_DAYS) -> datetime:
+    return datetime.now() - timedelta(days=days)
+
+
+def select_archivable(cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE):
+    """IDs y unidad de las emergencias cerradas más antiguas que `cutoff`, bloqueadas para moverlas."""
+    return (
+        select(Emergencies.emergency_id, Emergencies.assigned_unit)
+        .where(Emergencies.status == CLOSED_STATUS, Emergencies.timestamp < cutoff)
+        .order_by(Emergencies.timestamp, Emergencies.emergency_id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def _try_lock(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    return bool(db.scalar(select(func.pg_try_advisory_xact_lock(ARCHIVE_LOCK_NAMESPACE, 0))))
+
+
+def _add_unit_totals(db: Session, moved_by_unit: Dict[int, int]) -> None:
+    # Un solo archivador a la vez (advisory lock): UPDATE y, si la unidad no tenía fila, INSERT
+    for unit_id, moved in sorted(moved_by_unit.items()):
+        result = db.execute(
+            update(EmergenciesArchiveUnitTotals)
+            .where(EmergenciesArchiveUnitTotals.emergency_unit_id == unit_id)
+            .values(total=EmergenciesArchiveUnitTotals.total + moved)
+        )
+        if result.rowcount == 0:
+            db.add(EmergenciesArchiveUnitTotals(emergency_unit_id=unit_id, total=moved))
+    db.flush()
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Mueve un lote y hace commit. Devuelve cuántas emergencias se movieron (0 si no hay o hay otro archivador)."""
+    if not _try_lock(db):
+        db.rollback()
+        return 0
+    rows = db.execute(select_archivable(cutoff, batch_size)).all()
+    if not rows:
+        db.rollback()
+        return 0
+
+    ids: List[int] = [emergency_id for emergency_id, _ in rows]
+    moved_by_unit: Dict[int, int] = {}
+    for _, unit_id in rows:
+        if unit_id is not None:
+            moved_by_unit[unit_id] = moved_by_unit.get(unit_id, 0) + 1
+
+    columns = [getattr(Emergencies, column) for column in ARCHIVE_COLUMNS]
+    db.execute(
+        insert(EmergenciesArchive).from_select(
+            list(ARCHIVE_COLUMNS), select(*columns).where(Emergencies.emergency_id.in_(ids))
+        )
+    )
+    db.execute(
+        delete(Emergencies)
+        .where(Emergencies.emergency_id.in_(ids))
+        .execution_options(synchronize_session=False)
+    )
+    _add_unit_totals(db, moved_by_unit)
+    db.commit()
+    invalidate_fleet_stats()
+    EMERGENCIES_ARCHIVED.inc(len(ids))
+    return len(ids)
+
+
+def archive_closed_emergencies(
+    db: Session,
+    cutoff: Optional[datetime] = None,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> int:
+    """Archiva por lotes todas las emergencias cerradas anteriores a `cutoff`. Devuelve el total movido."""
+    cutoff = cutoff or archive_cutoff()
+    total = 0
+    while True:
+        moved = archive_batch(db, cutoff, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+
+
+class ArchiveJob:
+    """Ejecuta el archivado periódicamente en el threadpool mientras la app está levantada."""
+
+    def __init__(self, interval: float = ARCHIVE_INTERVAL) -> None:
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def run_once(self) -> int:
+        with SessionLocal() as db:
+            return archive_closed_emergencies(db)
+
+    async def start(self) -> None:
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                moved = await run_in_threadpool(self.run_once)
+                if moved:
+                    logger.info(f"Archived {moved} closed emergencies")
+            except SQLAlchemyError as e:
+                logger.warning(f"Emergency archiving failed: {e}")
+
+
+archive_job = ArchiveJob()
@@ -1,13 +1,35 @@
-from typing import List
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException, status, Query
-from src.database.db import DbSession
+from fastapi import APIRouter, Body, HTTPException, Request, Response, status, Query
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from src.common.fieldsets import EXPAND_DESCRIPTION, FIELDS_DESCRIPTION, parse_fieldset, partial_model
+from src.common.http_cache import conditional_json_response, not_modified
+from src.common.pagination import decode_cursor, encode_cursor, set_next_cursor
+from src.common.responses import dump_model, list_response, model_response
+from src.database.db import AppDbSession, DB_ASYNC, run_db, run_in_session
 
-from .model import EmergencyCreate, EmergencyUpdate, EmergencyOut
+from .model import (
+    EmergencyCreate,
+    EmergencyUpdate,
+    EmergencyOut,
+    EmergencyBatchItemResult,
+    EmergencyBatchResult,
+    HeatmapOut,
+)
+from .dispatch import AUTO_DISPATCH
+from .export import aiter_export, build_export_query, iter_export
+from .heatmap import build_heatmap_query, get_heatmap, heatmap_cache
 from . import service
 
 router = APIRouter(prefix="/emergencies", tags=["emergencies"])
 
+INCLUDE_ARCHIVED_DESCRIPTION = (
+    "Incluir emergencias cerradas archivadas (emergencies_archive); "
+    "una consulta más por tabla"
+)
+
 
 @router.post(
     "",
@@ -15,10 +37,130 @@ router = APIRouter(prefix="/emergencies", tags=["emergencies"])
     status_code=status.HTTP_201_CREATED,
     summary="Crear una nueva emergencia"
 )
-def create_emergency(emergency: EmergencyCreate, db: DbSession) -> EmergencyOut:
-    """Crea una nueva emergencia con los datos del usuario y la emergencia."""
-    new_emergency = service.create_emergency(db, emergency)
-    return EmergencyOut.model_validate(new_emergency)
+async def create_emergency(
+    emergency: EmergencyCreate,
+    db: AppDbSession,
+    auto_dispatch: Optional[bool] = Query(
+        None, description="Asignar automáticamente la mejor unidad disponible (por defecto AUTO_DISPATCH)"
+    ),
+) -> Response:
+    """
+    Crea una nueva emergencia con los datos del usuario y la emergencia.
+
+    Si es una retransmisión de una emergencia reciente del mismo usuario (ver dedup.py)
+    no se crea otra: se responde 200 con la existente y la cabecera X-Duplicate-Of.
+    """
+    dispatch = AUTO_DISPATCH if auto_dispatch is None else auto_dispatch
+    new_emergency, duplicate = await run_db(db, service.create_emergency, emergency, dispatch)
+    if duplicate:
+        return model_response(
+            EmergencyOut, new_emergency, headers={"X-Duplicate-Of": str(new_emergency.emergency_id)}
+        )
+    return model_response(EmergencyOut, new_emergency, status_code=status.HTTP_201_CREATED)
+
+
+BATCH_MAX_ITEMS = 1000
+
+
+@router.post(
+    "/batch",
+    response_model=EmergencyBatchResult,
+    summary="Crear emergencias en lote (gateways LoRa)"
+)
+async def create_emergencies_batch(
+    db: AppDbSession,
+    items: List[Dict[str, Any]] = Body(..., description="Lista de emergencias (mismo formato que POST /emergencies)"),
+    auto_dispatch: Optional[bool] = Query(
+        None, description="Asignar automáticamente la mejor unidad disponible (por defecto AUTO_DISPATCH)"
+    ),
+) -> Response:
+    """Inserta un lote de emergencias en una sola transacción y reporta el resultado de cada elemento."""
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch too large (max {BATCH_MAX_ITEMS} items)"
+        )
+
+    # Cada elemento se valida por separado para que uno inválido no rechace el lote
+    results: List[Optional[EmergencyBatchItemResult]] = [None] * len(items)
+    valid: List[EmergencyCreate] = []
+    valid_positions: List[int] = []
+    for index, raw in enumerate(items):
+        try:
+            valid.append(EmergencyCreate.model_validate(raw))
+            valid_positions.append(index)
+        except ValidationError as exc:
+            results[index] = EmergencyBatchItemResult(index=index, ok=False, error=str(exc.errors()[0]["msg"]))
+
+    if valid:
+        dispatch = AUTO_DISPATCH if auto_dispatch is None else auto_dispatch
+        outcomes = await run_db(db, service.create_emergencies_batch, valid, dispatch)
+        for index, (emergency_id, error, duplicate) in zip(valid_positions, outcomes):
+            results[index] = EmergencyBatchItemResult(
+                index=index, ok=error is None, emergency_id=emergency_id, error=error, duplicate=duplicate
+            )
+
+    inserted = sum(1 for result in results if result.ok and not result.duplicate)
+    duplicates = sum(1 for result in results if result.duplicate)
+    batch_result = EmergencyBatchResult(
+        inserted=inserted,
+        duplicates=duplicates,
+        failed=len(results) - inserted - duplicates,
+        results=results,
+    )
+    return model_response(EmergencyBatchResult, batch_result)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    summary="Exportar emergencias (NDJSON o CSV)"
+)
+async def export_emergencies(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Formato: ndjson o csv"),
+    status_filter: Optional[int] = Query(None, ge=1, le=3, description="Filtrar por estado"),
+    date_from: Optional[datetime] = Query(None, description="Desde esta fecha (inclusive)"),
+    date_to: Optional[datetime] = Query(None, description="Hasta esta fecha (exclusive)"),
+    include_archived: bool = Query(True, description=INCLUDE_ARCHIVED_DESCRIPTION),
+) -> StreamingResponse:
+    """Exporta el histórico de emergencias en streaming, con memoria constante."""
+    stmt = build_export_query(status_filter, date_from, date_to, include_archived)
+    body = aiter_export(stmt, format) if DB_ASYNC else iter_export(stmt, format)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="emergencies.{format}"'},
+    )
+
+
+@router.get(
+    "/heatmap",
+    response_model=HeatmapOut,
+    summary="Mapa de calor de emergencias"
+)
+async def emergency_heatmap(
+    request: Request,
+    date_from: Optional[datetime] = Query(None, description="Desde esta fecha (inclusive; por defecto date_to - 30 días)"),
+    date_to: Optional[datetime] = Query(None, description="Hasta esta fecha (exclusive; por defecto ahora)"),
+    cell_size: float = Query(0.05, ge=0.001, le=10, description="Lado de la celda en grados (0.05 ≈ 5 km)"),
+    accident_type: Optional[int] = Query(None, description="Filtrar por tipo de accidente"),
+    status_filter: Optional[int] = Query(None, ge=1, le=3, description="Filtrar por estado"),
+) -> Response:
+    """
+    Emergencias agregadas por celdas de una cuadrícula en la ventana de tiempo pedida.
+    Solo devuelve las celdas con emergencias, con el centro de la celda y su total.
+    """
+    query = build_heatmap_query(cell_size, date_from, date_to, accident_type, status_filter)
+    if query.date_from >= query.date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from must be earlier than date_to"
+        )
+    # Sin dependencia de sesión: solo se abre una si la consulta no está en caché
+    cached = heatmap_cache.get(query)
+    body, etag = cached if cached is not None else await run_in_session(get_heatmap, query)
+    return conditional_json_response(request, body, etag)
 
 
 @router.get(
@@ -26,15 +168,28 @@ def create_emergency(emergency: EmergencyCreate, db: DbSession) -> EmergencyOut:
     response_model=EmergencyOut,
     summary="Obtener datos de una emergencia"
 )
-def get_emergency(emergency_id: int, db: DbSession) -> EmergencyOut:
+async def get_emergency(emergency_id: int, request: Request, db: AppDbSession) -> Response:
     """Obtiene todos los datos de una emergencia espec�fica."""
-    emergency = service.get_emergency(db, emergency_id)
+    # Las emergencias archivadas se siguen pudiendo consultar por ID
+    if request.headers.get("if-none-match"):
+        # Revalidación: se decide con las versiones de las filas, sin cargar la emergencia
+        etag = await run_db(db, service.get_emergency_etag, emergency_id, include_archived=True)
+        if etag is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Emergency not found"
+            )
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+    emergency = await run_db(db, service.get_emergency, emergency_id, include_archived=True)
     if not emergency:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Emergency not found"
         )
-    return EmergencyOut.model_validate(emergency)
+    body = dump_model(EmergencyOut, emergency)
+    return conditional_json_response(request, body, service.emergency_etag(emergency))
 
 
 @router.get(
@@ -42,19 +197,55 @@ def get_emergency(emergency_id: int, db: DbSession) -> EmergencyOut:
     response_model=List[EmergencyOut],
     summary="Listar emergencias"
 )
-def list_emergencies(
-    db: DbSession,
-    skip: int = Query(0, ge=0, description="N�mero de registros a saltar"),
+async def list_emergencies(
+    db: AppDbSession,
+    skip: int = Query(0, ge=0, description="N�mero de registros a saltar (usar cursor en su lugar)"),
     limit: int = Query(100, ge=1, le=1000, description="N�mero m�ximo de registros"),
-    status_filter: int = Query(None, ge=1, le=3, description="Filtrar por estado")
-) -> List[EmergencyOut]:
-    """Lista todas las emergencias con paginaci�n y filtros opcionales."""
-    if status_filter is not None:
-        emergencies = service.get_emergencies_by_status(db, status_filter)
-    else:
-        emergencies = service.list_emergencies(db, skip=skip, limit=limit)
-    
-    return [EmergencyOut.model_validate(emergency) for emergency in emergencies]
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
+    status_filter: int = Query(None, ge=1, le=3, description="Filtrar por estado"),
+    date_from: Optional[datetime] = Query(None, description="Desde esta fecha (inclusive)"),
+    date_to: Optional[datetime] = Query(None, description="Hasta esta fecha (exclusive)"),
+    unit_id: Optional[int] = Query(None, description="Filtrar por unidad asignada"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    include_archived: bool = Query(False, description=INCLUDE_ARCHIVED_DESCRIPTION),
+) -> Response:
+    """
+    Lista todas las emergencias con paginaci�n y filtros opcionales.
+    Para mapas: `fields=emergency_id,latitud,longitud,status` hace una sola consulta de esas columnas.
+    """
+    fieldset = parse_fieldset(EmergencyOut, tuple(service.EMERGENCY_RELATION_KEYS), fields, expand)
+    after = None
+    if cursor:
+        timestamp, emergency_id = decode_cursor(cursor, 2)
+        try:
+            after = (datetime.fromisoformat(timestamp), int(emergency_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    # Se pide una fila extra para saber si hay página siguiente
+    emergencies = await run_db(
+        db,
+        service.list_emergencies,
+        skip=skip,
+        limit=limit + 1,
+        after=after,
+        status=status_filter,
+        date_from=date_from,
+        date_to=date_to,
+        assigned_unit=unit_id,
+        fieldset=fieldset,
+        include_archived=include_archived,
+    )
+    next_cursor = None
+    if len(emergencies) > limit:
+        emergencies = emergencies[:limit]
+        last = emergencies[-1]
+        next_cursor = encode_cursor([last.timestamp.isoformat(), last.emergency_id])
+
+    out_model = EmergencyOut if fieldset is None else partial_model(EmergencyOut, fieldset.names)
+    response = list_response(out_model, emergencies)
+    set_next_cursor(response, next_cursor)
+    return response
 
 
 @router.put(
@@ -62,19 +253,19 @@ def list_emergencies(
     response_model=EmergencyOut,
     summary="Asignar unidad de emergencia"
 )
-def assign_unit_to_emergency(
+async def assign_unit_to_emergency(
     emergency_id: int,
     unit_id: int,
-    db: DbSession
-) -> EmergencyOut:
+    db: AppDbSession
+) -> Response:
     """Asigna una unidad de emergencia espec�fica a una emergencia."""
-    emergency = service.assign_unit_to_emergency(db, emergency_id, unit_id)
+    emergency = await run_db(db, service.assign_unit_to_emergency, emergency_id, unit_id)
     if not emergency:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Emergency not found"
         )
-    return EmergencyOut.model_validate(emergency)
+    return model_response(EmergencyOut, emergency)
 
 
 @router.put(
@@ -82,19 +273,19 @@ def assign_unit_to_emergency(
     response_model=EmergencyOut,
     summary="Actualizar emergencia"
 )
-def update_emergency(
+async def update_emergency(
     emergency_id: int,
     emergency_update: EmergencyUpdate,
-    db: DbSession
-) -> EmergencyOut:
+    db: AppDbSession
+) -> Response:
     """Actualiza los datos de una emergencia (unidad asignada y/o estado)."""
-    emergency = service.update_emergency(db, emergency_id, emergency_update)
+    emergency = await run_db(db, service.update_emergency, emergency_id, emergency_update)
     if not emergency:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Emergency not found"
         )
-    return EmergencyOut.model_validate(emergency)
+    return model_response(EmergencyOut, emergency)
 
 
 @router.get(
@@ -102,7 +293,11 @@ def update_emergency(
     response_model=List[EmergencyOut],
     summary="Obtener emergencias de un usuario"
 )
-def get_emergencies_by_user(user_id: int, db: DbSession) -> List[EmergencyOut]:
+async def get_emergencies_by_user(
+    user_id: int,
+    db: AppDbSession,
+    include_archived: bool = Query(False, description=INCLUDE_ARCHIVED_DESCRIPTION),
+) -> Response:
     """Obtiene todas las emergencias reportadas por un usuario espec�fico."""
-    emergencies = service.get_emergencies_by_user(db, user_id)
-    return [EmergencyOut.model_validate(emergency) for emergency in emergencies]
\ No newline at end of file
+    emergencies = await run_db(db, service.get_emergencies_by_user, user_id, include_archived)
+    return list_response(EmergencyOut, emergencies)
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""
+Supresión de reportes duplicados por retransmisiones LoRa.
+
+Un dispositivo que no recibe el ACK vuelve a enviar el mismo reporte; cada copia
+se insertaría como una emergencia nueva y pasaría por el despacho. Un reporte se
+considera duplicado de una emergencia del mismo user_id si está a menos de
+DEDUP_RADIUS_M metros y DEDUP_WINDOW_S segundos de ella y esa emergencia no está
+cerrada; en ese caso no se inserta y se devuelve la emergencia existente. Un reporte
+que llega después del cierre es una emergencia nueva.
+
+1. Índice en memoria por worker (user_id -> reportes recientes): resuelve la
+   mayoría de retransmisiones sin buscar en la tabla. Solo se confirma, con una
+   consulta por clave primaria, que la emergencia encontrada sigue abierta.
+2. Si no hay coincidencia en memoria se consulta la tabla (ix_emergencies_user_timestamp)
+   para ver lo insertado por otros workers. En PostgreSQL un advisory lock por
+   user_id, tomado en la misma transacción que el insert, serializa los reportes
+   del mismo usuario entre workers: dos copias simultáneas no crean dos filas.
+
+Al cerrarse una emergencia el worker que la cierra la olvida del índice en memoria.
+Los demás workers no se enteran: su entrada sigue ahí hasta DEDUP_WINDOW_S después de
+registrarse, por eso cada coincidencia en memoria se comprueba contra la tabla y, si
+la emergencia ya está cerrada (o archivada), se olvida y el reporte sigue por el paso 2.
+
+Las fechas se comparan como naive en hora local, la convención de datetime.now() y
+de las columnas DateTime; las que llegan con zona horaria se convierten antes.
+
+Los reportes sin user_id no se deduplican. DEDUP_WINDOW_S=0 desactiva la supresión.
+"""
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from src.common.metrics import EMERGENCY_DEDUP
+from src.entities.EmergenciesEntity import Emergencies
+from src.features.emergency_units.spatial import haversine_km
+
+from .archive import CLOSED_STATUS
+
+DEDUP_WINDOW_S = float(os.getenv("DEDUP_WINDOW_S", "120"))
+DEDUP_RADIUS_M = float(os.getenv("DEDUP_RADIUS_M", "100"))
+DEDUP_MAX_PER_USER = 32
+# Primer argumento de pg_advisory_xact_lock(int, int): separa estos locks de otros usos
+DEDUP_LOCK_NAMESPACE = 7301
+
+DEDUP_ENABLED = DEDUP_WINDOW_S > 0
+
+# (user_id, timestamp, latitud, longitud) de un reporte entrante
+PendingReport = Tuple[Optional[int], datetime, float, float]
+
+
+@dataclass(frozen=True)
+class Report:
+    emergency_id: int
+    at: float
+    latitud: float
+    longitud: float
+
+
+def _local(timestamp: datetime) -> datetime:
+    """Naive en hora local; una fecha con zona horaria se convierte a la local."""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone().replace(tzinfo=None)
+
+
+def _epoch(timestamp: datetime) -> float:
+    return _local(timestamp).timestamp()
+
+
+def _matches(report: Report, at: float, latitud: float, longitud: float) -> bool:
+    return (
+        abs(report.at - at) <= DEDUP_WINDOW_S
+        and haversine_km(report.latitud, report.longitud, latitud, longitud) * 1000 <= DEDUP_RADIUS_M
+    )
+
+
+def _find(reports: Iterable[Report], at: float, latitud: float, longitud: float) -> Optional[int]:
+    for report in reports:
+        if _matches(report, at, latitud, longitud):
+            return report.emergency_id
+    return None
+
+
+class RecentReports:
+    """Reportes recientes por usuario; se olvidan DEDUP_WINDOW_S después de registrarse."""
+
+    def __init__(self, window: float = DEDUP_WINDOW_S) -> None:
+        self.window = window
+        self._reports: Dict[int, Deque[Tuple[float, Report]]] = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+
+    def add(self, user_id: int, report: Report) -> None:
+        now = time.monotonic()
+        with self._lock:
+            reports = self._reports.setdefault(user_id, deque(maxlen=DEDUP_MAX_PER_USER))
+            if all(known.emergency_id != report.emergency_id for _, known in reports):
+                reports.append((now, report))
+            if now - self._swept_at >= self.window:
+                self._sweep(now)
+
+    def forget(self, user_id: int, emergency_id: int) -> None:
+        with self._lock:
+            reports = self._reports.get(user_id)
+            if not reports:
+                return
+            kept = [(added, report) for added, report in reports if report.emergency_id != emergency_id]
+            if len(kept) != len(reports):
+                reports.clear()
+                reports.extend(kept)
+
+    def find(self, user_id: int, at: float, latitud: float, longitud: float) -> Optional[int]:
+        now = time.monotonic()
+        with self._lock:
+            reports = self._reports.get(user_id)
+            if not reports:
+                return None
+            while reports and now - reports[0][0] > self.window:
+                reports.popleft()
+            return _find((report for _, report in reports), at, latitud, longitud)
+
+    def _sweep(self, now: float) -> None:
+        for user_id in list(self._reports):
+            reports = self._reports[user_id]
+            while reports and now - reports[0][0] > self.window:
+                reports.popleft()
+            if not reports:
+                del self._reports[user_id]
+        self._swept_at = now
+
+
+recent_reports = RecentReports()
+
+
+def _lock_users(db: Session, user_ids: Sequence[int]) -> None:
+    # En orden para que dos lotes con usuarios en común no se bloqueen mutuamente
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for user_id in sorted(user_ids):
+        db.execute(select(func.pg_advisory_xact_lock(DEDUP_LOCK_NAMESPACE, user_id)))
+
+
+def recent_from_db(db: Session, user_ids: Sequence[int], start: datetime, end: datetime) -> Dict[int, List[Report]]:
+    stmt = select(
+        Emergencies.emergency_id, Emergencies.user_id, Emergencies.timestamp,
+        Emergencies.latitud, Emergencies.longitud,
+    ).where(
+        Emergencies.user_id.in_(user_ids),
+        Emergencies.timestamp >= start,
+        Emergencies.timestamp <= end,
+        Emergencies.status != CLOSED_STATUS,
+    )
+    found: Dict[int, List[Report]] = {}
+    for emergency_id, user_id, timestamp, latitud, longitud in db.execute(stmt).all():
+        found.setdefault(user_id, []).append(
+            Report(emergency_id, _epoch(timestamp), float(latitud), float(longitud))
+        )
+    return found
+
+
+def _still_open(db: Session, emergency_ids: Iterable[int]) -> Set[int]:
+    stmt = select(Emergencies.emergency_id).where(
+        Emergencies.emergency_id.in_(sorted(set(emergency_ids))),
+        Emergencies.status != CLOSED_STATUS,
+    )
+    return set(db.scalars(stmt).all())
+
+
+def find_duplicates(db: Session, pending: Sequence[PendingReport]) -> List[Optional[int]]:
+    """
+    Para cada reporte, el ID de la emergencia existente que duplica o None.
+    Debe llamarse dentro de la transacción que hará el insert (el lock dura hasta el commit).
+    """
+    matches: List[Optional[int]] = [None] * len(pending)
+    if not DEDUP_ENABLED:
+        return matches
+
+    unresolved: List[int] = []
+    remembered: Dict[int, int] = {}
+    for position, (user_id, timestamp, latitud, longitud) in enumerate(pending):
+        if user_id is None:
+            EMERGENCY_DEDUP.labels("skipped").inc()
+            continue
+        match = recent_reports.find(user_id, _epoch(timestamp), latitud, longitud)
+        if match is not None:
+            remembered[position] = match
+        else:
+            unresolved.append(position)
+    if remembered:
+        # Otro worker puede haberla cerrado sin que este índice lo sepa
+        open_ids = _still_open(db, remembered.values())
+        for position, emergency_id in remembered.items():
+            if emergency_id in open_ids:
+                matches[position] = emergency_id
+                EMERGENCY_DEDUP.labels("memory").inc()
+            else:
+                recent_reports.forget(pending[position][0], emergency_id)
+                unresolved.append(position)
+    if not unresolved:
+        return matches
+
+    user_ids = sorted({pending[position][0] for position in unresolved})
+    _lock_users(db, user_ids)
+    window = timedelta(seconds=DEDUP_WINDOW_S)
+    start = min(_local(pending[position][1]) for position in unresolved) - window
+    end = max(_local(pending[position][1]) for position in unresolved) + window
+    stored = recent_from_db(db, user_ids, start, end)
+    for position in unresolved:
+        user_id, timestamp, latitud, longitud = pending[position]
+        matches[position] = _find(stored.get(user_id, ()), _epoch(timestamp), latitud, longitud)
+        EMERGENCY_DEDUP.labels("database" if matches[position] is not None else "miss").inc()
+    return matches
+
+
+def collapse_batch(pending: Sequence[PendingReport]) -> List[Optional[int]]:
+    """Para cada reporte de un lote, la posición de un reporte anterior del mismo lote que duplica."""
+    earlier: Dict[int, List[Report]] = {}
+    collapsed: List[Optional[int]] = [None] * len(pending)
+    if not DEDUP_ENABLED:
+        return collapsed
+    for position, (user_id, timestamp, latitud, longitud) in enumerate(pending):
+        if user_id is None:
+            continue
+        at = _epoch(timestamp)
+        # Aquí Report.emergency_id guarda la posición dentro del lote
+        collapsed[position] = _find(earlier.get(user_id, ()), at, latitud, longitud)
+        if collapsed[position] is None:
+            earlier.setdefault(user_id, []).append(Report(position, at, latitud, longitud))
+    return collapsed
+
+
+def remember(
+    emergency_id: int,
+    user_id: Optional[int],
+    timestamp: datetime,
+    latitud: float,
+    longitud: float,
+    status: Optional[int] = None,
+) -> None:
+    """Registra una emergencia recién insertada para reconocer sus retransmisiones."""
+    if DEDUP_ENABLED and user_id is not None and status != CLOSED_STATUS:
+        recent_reports.add(user_id, Report(emergency_id, _epoch(timestamp), float(latitud), float(longitud)))
+
+
+def forget(emergency_id: int, user_id: Optional[int]) -> None:
+    """Al cerrarse una emergencia: sus retransmisiones tardías ya no se pliegan en ella."""
+    if DEDUP_ENABLED and user_id is not None:
+        recent_reports.forget(user_id, emergency_id)
@@ -0,0 +1,168 @@
+"""
+Despacho automático: elige la unidad para una emergencia nueva.
+
+Puntuación = distancia (km) + DISPATCH_LOAD_PENALTY_KM * emergencias activas de la unidad.
+
+1. Con el índice espacial y la carga en memoria se preseleccionan las mejores
+   DISPATCH_VERIFY candidatas, sin consultar la DB por cada unidad.
+2. Dentro de la misma transacción que inserta la emergencia se bloquean esas
+   filas de emergency_unit (FOR UPDATE, en orden de ID para evitar deadlocks) y se
+   lee su carga real con una sola consulta agrupada. Otro worker que despache a
+   las mismas unidades espera a que esta transacción confirme, así que ninguno
+   decide con una carga desactualizada.
+
+En un lote (service.create_emergencies_batch) las filas se despachan una a una en la
+transacción del INSERT. La carga de las unidades ya bloqueadas se lleva en un dict
+que suma las emergencias del lote asignadas a cada una: no se vuelven a bloquear ni
+a contar, y dos filas del lote no eligen la misma unidad como si siguiera libre.
+
+Las asignaciones y cambios de estado manuales (service.update_emergency y
+assign_unit_to_emergency) toman el mismo bloqueo con lock_units sobre la unidad
+anterior y la nueva, así que tampoco se cruzan con un despacho en curso.
+"""
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from src.entities.EmergenciesEntity import Emergencies
+from src.entities.EmergencyUnitEntity import EmergencyUnit
+from src.features.emergency_units import service as units_service
+from src.features.emergency_units.spatial import unit_index
+
+AUTO_DISPATCH = os.getenv("AUTO_DISPATCH", "0").lower() in ("1", "true", "yes")
+DISPATCH_LOAD_PENALTY_KM = float(os.getenv("DISPATCH_LOAD_PENALTY_KM", "5"))
+DISPATCH_MAX_RADIUS_KM = float(os.getenv("DISPATCH_MAX_RADIUS_KM", "100"))
+DISPATCH_CANDIDATES = int(os.getenv("DISPATCH_CANDIDATES", "20"))
+DISPATCH_VERIFY = int(os.getenv("DISPATCH_VERIFY", "3"))
+DISPATCH_LOAD_TTL = float(os.getenv("DISPATCH_LOAD_TTL", "30"))
+
+ACTIVE_STATUSES = (1, 2)
+
+
+def is_active(status: Optional[int]) -> bool:
+    return status in ACTIVE_STATUSES
+
+
+class UnitLoadTracker:
+    """Emergencias activas por unidad, en memoria y recargadas cada DISPATCH_LOAD_TTL."""
+
+    def __init__(self, ttl: float = DISPATCH_LOAD_TTL) -> None:
+        self.ttl = ttl
+        self._active: Dict[int, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def load(self, db: Session) -> None:
+        stmt = select(Emergencies.assigned_unit, func.count()).where(
+            Emergencies.assigned_unit.is_not(None),
+            Emergencies.status.in_(ACTIVE_STATUSES),
+        ).group_by(Emergencies.assigned_unit)
+        counts = {unit_id: count for unit_id, count in db.execute(stmt).all()}
+        with self._lock:
+            self._active = counts
+            self._loaded_at = time.monotonic()
+
+    def get(self, unit_id: int) -> int:
+        return self._active.get(unit_id, 0)
+
+    def set(self, unit_id: int, active: int) -> None:
+        with self._lock:
+            self._active[unit_id] = active
+
+    def apply_change(
+        self,
+        old_unit: Optional[int],
+        old_status: Optional[int],
+        new_unit: Optional[int],
+        new_status: Optional[int],
+    ) -> None:
+        """Ajusta los contadores tras crear/reasignar/cambiar el estado de una emergencia."""
+        with self._lock:
+            if old_unit is not None and is_active(old_status):
+                self._active[old_unit] = max(0, self._active.get(old_unit, 0) - 1)
+            if new_unit is not None and is_active(new_status):
+                self._active[new_unit] = self._active.get(new_unit, 0) + 1
+
+
+unit_loads = UnitLoadTracker()
+
+
+def lock_units(db: Session, unit_ids: Iterable[Optional[int]]) -> List[int]:
+    """
+    Bloquea (FOR UPDATE) las filas de emergency_unit hasta el commit de la transacción
+    en curso, en orden de ID para evitar deadlocks. Devuelve los IDs que siguen existiendo.
+    """
+    ids = sorted({unit_id for unit_id in unit_ids if unit_id is not None})
+    if not ids:
+        return []
+    stmt = select(EmergencyUnit.emergency_unit_id).where(
+        EmergencyUnit.emergency_unit_id.in_(ids)
+    ).order_by(EmergencyUnit.emergency_unit_id).with_for_update()
+    return list(db.execute(stmt).scalars().all())
+
+
+def _score(distance_km: float, active: int) -> float:
+    return distance_km + DISPATCH_LOAD_PENALTY_KM * active
+
+
+def rank_candidates(
+    latitude: float, longitude: float, locked_loads: Optional[Dict[int, int]] = None
+) -> List[Tuple[int, float]]:
+    """Unidades cercanas ordenadas por puntuación según el estado en memoria."""
+    locked_loads = locked_loads or {}
+    nearby = unit_index.nearest(latitude, longitude, DISPATCH_CANDIDATES, DISPATCH_MAX_RADIUS_KM)
+    ranked = [(unit.emergency_unit_id, distance) for unit, distance in nearby]
+
+    def load(unit_id: int) -> int:
+        return locked_loads[unit_id] if unit_id in locked_loads else unit_loads.get(unit_id)
+
+    ranked.sort(key=lambda item: (_score(item[1], load(item[0])), item[0]))
+    return ranked
+
+
+def choose_unit(
+    db: Session, latitude: float, longitude: float, locked_loads: Optional[Dict[int, int]] = None
+) -> Optional[int]:
+    """
+    Elige la unidad a asignar y deja bloqueadas sus filas candidatas hasta el commit
+    de la transacción en curso. Devuelve None si no hay unidades en el radio.
+
+    `locked_loads` (unidad -> emergencias activas) guarda la carga de las unidades ya
+    bloqueadas en esta transacción; se completa con las que se bloquean aquí. En un
+    lote quien llama suma 1 a la unidad elegida antes de despachar la fila siguiente.
+    """
+    if locked_loads is None:
+        locked_loads = {}
+    if unit_index.is_stale():
+        units_service.load_unit_index(db)
+    if unit_loads.is_stale():
+        unit_loads.load(db)
+
+    candidates = rank_candidates(latitude, longitude, locked_loads)[:DISPATCH_VERIFY]
+    if not candidates:
+        return None
+    distances = dict(candidates)
+
+    # Las unidades borradas mientras tanto desaparecen aquí
+    locked = lock_units(db, [unit_id for unit_id in distances if unit_id not in locked_loads])
+    if locked:
+        count_stmt = select(Emergencies.assigned_unit, func.count()).where(
+            Emergencies.assigned_unit.in_(locked),
+            Emergencies.status.in_(ACTIVE_STATUSES),
+        ).group_by(Emergencies.assigned_unit)
+        active = {unit_id: count for unit_id, count in db.execute(count_stmt).all()}
+        for unit_id in locked:
+            unit_loads.set(unit_id, active.get(unit_id, 0))
+            locked_loads[unit_id] = active.get(unit_id, 0)
+
+    available = [unit_id for unit_id in distances if unit_id in locked_loads]
+    if not available:
+        return None
+    return min(available, key=lambda unit_id: (_score(distances[unit_id], locked_loads[unit_id]), unit_id))
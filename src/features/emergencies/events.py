@@ -0,0 +1,38 @@
+"""Eventos de emergencias publicados en el bus para el feed en tiempo real."""
+from typing import Optional
+
+from src.common.event_bus import event_bus
+from src.entities.EmergenciesEntity import Emergencies
+
+EMERGENCY_CREATED = "emergency.created"
+EMERGENCY_ASSIGNED = "emergency.assigned"
+EMERGENCY_STATUS_CHANGED = "emergency.status_changed"
+
+EVENT_FIELDS = (
+    "emergency_id",
+    "timestamp",
+    "tipo_accidente",
+    "assigned_unit",
+    "latitud",
+    "longitud",
+    "user_id",
+    "status",
+)
+
+
+def emergency_event_data(emergency: Emergencies) -> dict:
+    data = {field: getattr(emergency, field) for field in EVENT_FIELDS}
+    data["latitud"] = float(data["latitud"])
+    data["longitud"] = float(data["longitud"])
+    return data
+
+
+def publish_emergency_event(event_type: str, emergency: Emergencies, previous_status: Optional[int] = None) -> None:
+    data = emergency_event_data(emergency)
+    if previous_status is not None:
+        data["previous_status"] = previous_status
+    event_bus.publish(event_type, data)
+
+
+def publish_created(data: dict) -> None:
+    event_bus.publish(EMERGENCY_CREATED, data)
@@ -0,0 +1,110 @@
+"""
+Exportación de emergencias en streaming (NDJSON o CSV).
+
+Se seleccionan solo columnas (sin objetos ORM ni relaciones) con un cursor del lado
+del servidor (stream_results + yield_per): las filas se leen y se escriben por bloques,
+así que la memoria del worker no crece con el tamaño del histórico.
+La exportación usa su propia conexión, que vive lo que dure la respuesta.
+Por defecto incluye las emergencias archivadas (UNION ALL con emergencies_archive,
+cada rama por su índice de timestamp).
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterable, Iterator, Optional
+
+from sqlalchemy import Select, select, union_all
+
+from src.database.db import async_engine, engine
+from src.entities.EmergenciesArchiveEntity import EmergenciesArchive
+from src.entities.EmergenciesEntity import Emergencies
+
+from .archive import CLOSED_STATUS
+
+EXPORT_CHUNK_ROWS = 1000
+
+EXPORT_COLUMNS = (
+    "emergency_id",
+    "timestamp",
+    "tipo_accidente",
+    "assigned_unit",
+    "latitud",
+    "longitud",
+    "user_id",
+    "status",
+)
+
+
+def _export_select(
+    model: Any,
+    status: Optional[int],
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+) -> Select:
+    stmt = select(*(getattr(model, column) for column in EXPORT_COLUMNS))
+    if status is not None:
+        stmt = stmt.where(model.status == status)
+    if date_from is not None:
+        stmt = stmt.where(model.timestamp >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(model.timestamp < date_to)
+    return stmt
+
+
+def build_export_query(
+    status: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    include_archived: bool = True,
+) -> Select:
+    stmt = _export_select(Emergencies, status, date_from, date_to)
+    if include_archived and status in (None, CLOSED_STATUS):
+        history = union_all(_export_select(EmergenciesArchive, status, date_from, date_to), stmt).subquery()
+        stmt = select(*history.c).order_by(history.c.timestamp, history.c.emergency_id)
+    else:
+        stmt = stmt.order_by(Emergencies.timestamp, Emergencies.emergency_id)
+    return stmt.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_ROWS)
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is not None and not isinstance(value, (int, str)):
+        return float(value)  # Numeric -> Decimal
+    return value
+
+
+def format_ndjson(rows: Iterable[tuple]) -> bytes:
+    lines = [json.dumps(dict(zip(EXPORT_COLUMNS, map(_plain, row))), separators=(",", ":")) for row in rows]
+    return ("\n".join(lines) + "\n").encode() if lines else b""
+
+
+def format_csv(rows: Iterable[tuple], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows([_plain(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def iter_export(stmt: Select, fmt: str) -> Iterator[bytes]:
+    """Generador sync: Starlette lo consume en el threadpool."""
+    if fmt == "csv":
+        yield format_csv([], header=True)
+    formatter = format_csv if fmt == "csv" else format_ndjson
+    with engine.connect() as connection:
+        for partition in connection.execute(stmt).partitions(EXPORT_CHUNK_ROWS):
+            yield formatter(partition)
+
+
+async def aiter_export(stmt: Select, fmt: str) -> AsyncIterator[bytes]:
+    """Equivalente async sobre el engine async (DB_ASYNC)."""
+    if fmt == "csv":
+        yield format_csv([], header=True)
+    formatter = format_csv if fmt == "csv" else format_ndjson
+    async with async_engine.connect() as connection:
+        result = await connection.stream(stmt)
+        async for partition in result.partitions(EXPORT_CHUNK_ROWS):
+            yield formatter(partition)
@@ -0,0 +1,87 @@
+"""
+Feed en tiempo real de emergencias: WebSocket y, como alternativa, Server-Sent Events.
+
+Los navegadores no pueden mandar cabeceras en WebSocket/EventSource, así que la API key
+se acepta también como query param `api_key`. Estas rutas se registran fuera del router
+principal de emergencias (que exige la cabecera X-API-Key).
+"""
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from src.auth.dependencies import is_valid_api_key
+from src.common.event_bus import event_bus
+
+router = APIRouter(prefix="/emergencies/feed", tags=["emergencies"])
+
+HEARTBEAT_SECONDS = 20
+
+
+def _matches(event: dict, status_filter: Optional[int]) -> bool:
+    return status_filter is None or event["data"].get("status") == status_filter
+
+
+@router.websocket("/ws")
+async def emergency_feed_ws(
+    websocket: WebSocket,
+    api_key: Optional[str] = Query(None),
+    status_filter: Optional[int] = Query(None, ge=1, le=3),
+):
+    """Envía cada evento de emergencia (creada, asignada, cambio de estado) como JSON."""
+    if not is_valid_api_key(websocket.headers.get("x-api-key") or api_key):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = event_bus.subscribe()
+    try:
+        while True:
+            try:
+                event, payload = await asyncio.wait_for(subscription.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Heartbeat: detecta clientes desconectados aunque no haya eventos
+                await websocket.send_text('{"type":"ping"}')
+                continue
+            if _matches(event, status_filter):
+                await websocket.send_text(payload)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        event_bus.unsubscribe(subscription)
+
+
+@router.get(
+    "",
+    response_class=StreamingResponse,
+    summary="Feed de emergencias (Server-Sent Events)"
+)
+async def emergency_feed_sse(
+    request: Request,
+    api_key: Optional[str] = Query(None),
+    status_filter: Optional[int] = Query(None, ge=1, le=3),
+) -> StreamingResponse:
+    """Alternativa SSE al WebSocket para clientes que no pueden abrir uno."""
+    if not is_valid_api_key(request.headers.get("x-api-key") or api_key):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API Key")
+
+    async def stream():
+        subscription = event_bus.subscribe()
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event, payload = await asyncio.wait_for(subscription.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if _matches(event, status_filter):
+                    yield f"event: {event['type']}\ndata: {payload}\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,149 @@
+"""
+Mapa de calor de emergencias agregado en una cuadrícula.
+
+La base agrupa las emergencias en celdas cuadradas de `cell_size` grados
+(GROUP BY floor(latitud / cell_size), floor(longitud / cell_size)) y solo viaja un
+conteo por celda: un año de datos son unos pocos KB en lugar de un par de
+coordenadas por emergencia. El rango de fechas usa ix_emergencies_timestamp_id (o
+ix_emergencies_status_timestamp_id con filtro de estado). Salvo que se filtre por un
+estado activo también se cuentan las emergencias archivadas (UNION ALL con
+emergencies_archive por ix_emergencies_archive_timestamp_id); si la ventana es
+reciente esa rama no devuelve filas.
+
+Cada combinación de parámetros se guarda ya serializada, con su ETag, durante
+HEATMAP_CACHE_TTL segundos (por worker). Sin date_to la ventana termina en el
+instante actual redondeado hacia arriba a HEATMAP_CACHE_TTL, así las peticiones de
+"los últimos N días" comparten la misma entrada.
+"""
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import Select, func, select, union_all
+from sqlalchemy.orm import Session
+
+from src.common.http_cache import make_etag
+from src.common.responses import dump_model
+from src.entities.EmergenciesArchiveEntity import EmergenciesArchive
+from src.entities.EmergenciesEntity import Emergencies
+
+from .archive import CLOSED_STATUS
+from .model import HeatmapOut
+
+HEATMAP_CACHE_TTL = float(os.getenv("HEATMAP_CACHE_TTL", "60"))
+HEATMAP_DEFAULT_DAYS = int(os.getenv("HEATMAP_DEFAULT_DAYS", "30"))
+HEATMAP_CACHE_MAX_ENTRIES = 256
+
+
+@dataclass(frozen=True)
+class HeatmapQuery:
+    date_from: datetime
+    date_to: datetime
+    cell_size: float
+    tipo_accidente: Optional[int] = None
+    status: Optional[int] = None
+
+
+def build_heatmap_query(
+    cell_size: float,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    tipo_accidente: Optional[int] = None,
+    status: Optional[int] = None,
+) -> HeatmapQuery:
+    """Completa la ventana por defecto (últimos HEATMAP_DEFAULT_DAYS días)."""
+    if date_to is None:
+        now = time.time()
+        if HEATMAP_CACHE_TTL > 0:
+            # Redondeo hacia arriba: la ventana incluye todo lo insertado hasta ahora
+            now = math.ceil(now / HEATMAP_CACHE_TTL) * HEATMAP_CACHE_TTL
+        date_to = datetime.fromtimestamp(now)
+    if date_from is None:
+        date_from = date_to - timedelta(days=HEATMAP_DEFAULT_DAYS)
+    return HeatmapQuery(date_from, date_to, cell_size, tipo_accidente, status)
+
+
+def _points(model: Any, query: HeatmapQuery) -> Select:
+    stmt = select(model.latitud, model.longitud).where(
+        model.timestamp >= query.date_from,
+        model.timestamp < query.date_to,
+    )
+    if query.status is not None:
+        stmt = stmt.where(model.status == query.status)
+    if query.tipo_accidente is not None:
+        stmt = stmt.where(model.tipo_accidente == query.tipo_accidente)
+    return stmt
+
+
+def compute_heatmap(db: Session, query: HeatmapQuery) -> HeatmapOut:
+    """Una consulta agrupada; devuelve el centro y el total de cada celda no vacía."""
+    points = _points(Emergencies, query)
+    if query.status in (None, CLOSED_STATUS):
+        points = union_all(points, _points(EmergenciesArchive, query))
+    points = points.subquery()
+    lat_cell = func.floor(points.c.latitud / query.cell_size).label("lat_cell")
+    lon_cell = func.floor(points.c.longitud / query.cell_size).label("lon_cell")
+    stmt = select(lat_cell, lon_cell, func.count().label("total")).group_by(lat_cell, lon_cell).order_by(
+        lat_cell, lon_cell
+    )
+
+    bins = [
+        (
+            round((int(lat) + 0.5) * query.cell_size, 6),
+            round((int(lon) + 0.5) * query.cell_size, 6),
+            total,
+        )
+        for lat, lon, total in db.execute(stmt).all()
+    ]
+    return HeatmapOut(
+        date_from=query.date_from,
+        date_to=query.date_to,
+        cell_size=query.cell_size,
+        total=sum(total for _, _, total in bins),
+        bins=bins,
+    )
+
+
+class HeatmapCache:
+    """Mapas ya serializados por consulta, con TTL."""
+
+    def __init__(self, ttl: float = HEATMAP_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._entries: Dict[HeatmapQuery, Tuple[float, bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, query: HeatmapQuery) -> Optional[Tuple[bytes, str]]:
+        entry = self._entries.get(query)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1], entry[2]
+
+    def store(self, query: HeatmapQuery, body: bytes, etag: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= HEATMAP_CACHE_MAX_ENTRIES:
+                for key in [key for key, entry in self._entries.items() if entry[0] <= now]:
+                    del self._entries[key]
+            if len(self._entries) >= HEATMAP_CACHE_MAX_ENTRIES:
+                # Sigue lleno de entradas vigentes: se descarta la que caduca antes
+                del self._entries[min(self._entries, key=lambda key: self._entries[key][0])]
+            self._entries[query] = (now + self.ttl, body, etag)
+
+
+heatmap_cache = HeatmapCache()
+
+
+def get_heatmap(db: Session, query: HeatmapQuery) -> Tuple[bytes, str]:
+    """JSON del mapa de calor y su ETag, desde la caché si la consulta está caliente."""
+    cached = heatmap_cache.get(query)
+    if cached is not None:
+        return cached
+    body = dump_model(HeatmapOut, compute_heatmap(db, query))
+    etag = make_etag(body)
+    if heatmap_cache.ttl > 0:
+        heatmap_cache.store(query, body, etag)
+    return body, etag
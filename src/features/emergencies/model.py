@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional, Tuple
 from pydantic import BaseModel, Field, ConfigDict
 
 
@@ -57,4 +57,29 @@ class EmergencyOut(BaseModel):
     # Relaciones opcionales con modelos específicos
     accident_type: Optional[AccidentTypeOut] = None
     assigned_unit_rel: Optional[EmergencyUnitOut] = None
-    user: Optional[UserBasicOut] = None
\ No newline at end of file
+    user: Optional[UserBasicOut] = None
+
+
+class EmergencyBatchItemResult(BaseModel):
+    index: int = Field(..., description="Posición del elemento en el lote")
+    ok: bool
+    emergency_id: Optional[int] = None
+    error: Optional[str] = None
+    duplicate: bool = Field(False, description="Retransmisión: emergency_id es el de la emergencia original")
+
+
+class EmergencyBatchResult(BaseModel):
+    inserted: int
+    duplicates: int = 0
+    failed: int
+    results: List[EmergencyBatchItemResult]
+
+
+class HeatmapOut(BaseModel):
+    date_from: datetime
+    date_to: datetime
+    cell_size: float = Field(..., description="Lado de cada celda en grados")
+    total: int = Field(..., description="Emergencias en el mapa")
+    bins: List[Tuple[float, float, int]] = Field(
+        ..., description="Celdas no vacías: [latitud del centro, longitud del centro, total]"
+    )
@@ -1,20 +1,59 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import select, func
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import Select, select, func, tuple_, insert, literal, union_all
+from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 
+from src.common.fieldsets import Fieldset, sparse_select
+from src.common.http_cache import version_etag
 from src.entities.EmergenciesEntity import Emergencies
+from src.entities.EmergenciesArchiveEntity import EmergenciesArchive
+from src.entities.AccidentTypesEntity import AccidentTypes
+from src.entities.EmergencyUnitEntity import EmergencyUnit
+from src.entities.UsersEntity import Users
+from src.features.emergency_units.service import invalidate_fleet_stats
 from .model import EmergencyCreate, EmergencyUpdate
+from .archive import CLOSED_STATUS
+from .dedup import collapse_batch, find_duplicates, forget, remember
+from .dispatch import choose_unit, is_active, lock_units, unit_loads
+from .events import (
+    EMERGENCY_ASSIGNED,
+    EMERGENCY_CREATED,
+    EMERGENCY_STATUS_CHANGED,
+    publish_created,
+    publish_emergency_event,
+)
 
 
-def create_emergency(db: Session, emergency_in: EmergencyCreate) -> Emergencies:
+def create_emergency(
+    db: Session, emergency_in: EmergencyCreate, auto_dispatch: bool = False
+) -> Tuple[Emergencies, bool]:
+    """Devuelve (emergencia, es_duplicado): una retransmisión devuelve la emergencia existente."""
     # Usar timestamp proporcionado o datetime.now() si es None
     timestamp = emergency_in.timestamp or datetime.now()
+
+    # Retransmisiones LoRa: se resuelven antes del despacho y del insert
+    duplicate_of = find_duplicates(
+        db, [(emergency_in.user_id, timestamp, emergency_in.latitud, emergency_in.longitud)]
+    )[0]
+    if duplicate_of is not None:
+        existing = get_emergency(db, duplicate_of)
+        # Cerrada entre find_duplicates y esta carga: el reporte es una emergencia nueva
+        if existing is not None and existing.status != CLOSED_STATUS:
+            # commit (no rollback, que expira lo cargado) para soltar el lock de dedup
+            db.commit()
+            return existing, True
+
+    # Despacho automático: se elige la unidad dentro de la misma transacción del insert
+    assigned_unit = emergency_in.assigned_unit
+    if assigned_unit is None and auto_dispatch and is_active(emergency_in.status):
+        assigned_unit = choose_unit(db, emergency_in.latitud, emergency_in.longitud)
     
     emergency = Emergencies(
         timestamp=timestamp,
         tipo_accidente=emergency_in.tipo_accidente,
-        assigned_unit=emergency_in.assigned_unit,
+        assigned_unit=assigned_unit,
         latitud=emergency_in.latitud,
         longitud=emergency_in.longitud,
         user_id=emergency_in.user_id,
@@ -22,69 +61,340 @@ def create_emergency(db: Session, emergency_in: EmergencyCreate) -> Emergencies:
     )
     db.add(emergency)
     db.commit()
-    db.refresh(emergency)
-    return emergency
+    remember(
+        emergency.emergency_id, emergency.user_id, timestamp, emergency.latitud, emergency.longitud, emergency.status
+    )
+    unit_loads.apply_change(None, None, emergency.assigned_unit, emergency.status)
+    invalidate_fleet_stats()
+    publish_emergency_event(EMERGENCY_CREATED, emergency)
+    # Recargar con relaciones para serializar sin lazy loads
+    return get_emergency(db, emergency.emergency_id), False
+
+
+def _existing_references(db: Session, items: List[EmergencyCreate]) -> dict:
+    """IDs de usuarios, tipos de accidente y unidades referenciados que existen (una sola consulta)."""
+    wanted = {
+        "user": {item.user_id for item in items if item.user_id is not None},
+        "accident_type": {item.tipo_accidente for item in items if item.tipo_accidente is not None},
+        "unit": {item.assigned_unit for item in items if item.assigned_unit is not None},
+    }
+    columns = {
+        "user": Users.user_id,
+        "accident_type": AccidentTypes.accident_type_id,
+        "unit": EmergencyUnit.emergency_unit_id,
+    }
+    selects = [
+        select(literal(kind).label("kind"), columns[kind].label("ref_id")).where(columns[kind].in_(ids))
+        for kind, ids in wanted.items()
+        if ids
+    ]
+    found = {kind: set() for kind in wanted}
+    if selects:
+        for kind, ref_id in db.execute(union_all(*selects)).all():
+            found[kind].add(ref_id)
+    return found
+
+
+def _batch_item_error(item: EmergencyCreate, found: dict) -> Optional[str]:
+    if not -90 <= item.latitud <= 90 or not -180 <= item.longitud <= 180:
+        return "Coordinates out of range"
+    if item.user_id is not None and item.user_id not in found["user"]:
+        return f"User {item.user_id} not found"
+    if item.tipo_accidente is not None and item.tipo_accidente not in found["accident_type"]:
+        return f"Accident type {item.tipo_accidente} not found"
+    if item.assigned_unit is not None and item.assigned_unit not in found["unit"]:
+        return f"Emergency unit {item.assigned_unit} not found"
+    return None
+
+
+BatchOutcome = Tuple[Optional[int], Optional[str], bool]
 
 
-def get_emergency(db: Session, emergency_id: int) -> Optional[Emergencies]:
-    stmt = select(Emergencies).where(Emergencies.emergency_id == emergency_id).options(
-        selectinload(Emergencies.accident_type),
-        selectinload(Emergencies.assigned_unit_rel),
-        selectinload(Emergencies.user)
+def create_emergencies_batch(
+    db: Session, items: List[EmergencyCreate], auto_dispatch: bool = False
+) -> List[BatchOutcome]:
+    """
+    Inserta un lote de emergencias en una sola transacción con un INSERT multi-fila
+    ... RETURNING. Las referencias se validan antes para que un elemento inválido no
+    haga fallar al resto. Las retransmisiones (de emergencias ya guardadas o de otro
+    elemento del lote) no se insertan y devuelven el ID de la original.
+    Con auto_dispatch las filas activas sin unidad se despachan como en create_emergency.
+    Devuelve (emergency_id, error, es_duplicado) por elemento, en orden.
+    """
+    found = _existing_references(db, items)
+    now = datetime.now()
+    errors = [_batch_item_error(item, found) for item in items]
+    valid = [position for position, error in enumerate(errors) if error is None]
+    pending = [
+        (items[position].user_id, items[position].timestamp or now, items[position].latitud, items[position].longitud)
+        for position in valid
+    ]
+    stored = find_duplicates(db, pending)
+    in_batch = collapse_batch(pending)
+
+    # Por elemento válido: ID de la emergencia que duplica, posición del original en el lote o fila nueva
+    duplicate_ids: Dict[int, int] = {}
+    batch_originals: Dict[int, int] = {}
+    rows = []
+    row_positions = []
+    # Carga de las unidades bloqueadas por el despacho, con las filas del lote ya asignadas
+    locked_loads: Dict[int, int] = {}
+    for index, position in enumerate(valid):
+        original = in_batch[index]
+        if stored[index] is not None:
+            duplicate_ids[position] = stored[index]
+        elif original is not None and valid[original] in duplicate_ids:
+            # Copia de un elemento que a su vez duplicaba una emergencia guardada
+            duplicate_ids[position] = duplicate_ids[valid[original]]
+        elif original is not None:
+            batch_originals[position] = valid[original]
+        else:
+            item = items[position]
+            assigned_unit = item.assigned_unit
+            if assigned_unit is None and auto_dispatch and is_active(item.status):
+                assigned_unit = choose_unit(db, item.latitud, item.longitud, locked_loads)
+                if assigned_unit is not None:
+                    locked_loads[assigned_unit] += 1
+            row_positions.append(position)
+            rows.append({
+                "timestamp": pending[index][1],
+                "tipo_accidente": item.tipo_accidente,
+                "assigned_unit": assigned_unit,
+                "latitud": item.latitud,
+                "longitud": item.longitud,
+                "user_id": item.user_id,
+                "status": item.status,
+            })
+
+    new_ids: Dict[int, int] = {}
+    insert_failed = False
+    if rows:
+        stmt = insert(Emergencies).returning(Emergencies.emergency_id, sort_by_parameter_order=True)
+        try:
+            new_ids = dict(zip(row_positions, db.execute(stmt, rows).scalars().all()))
+            db.commit()
+        except SQLAlchemyError:
+            # Solo fallan las filas del INSERT y sus copias en el lote: los errores de
+            # validación y los duplicados de emergencias ya guardadas siguen valiendo
+            db.rollback()
+            insert_failed = True
+    else:
+        db.rollback()
+
+    if not insert_failed:
+        for position, row in zip(row_positions, rows):
+            emergency_id = new_ids[position]
+            remember(emergency_id, row["user_id"], row["timestamp"], row["latitud"], row["longitud"], row["status"])
+            unit_loads.apply_change(None, None, row["assigned_unit"], row["status"])
+            publish_created({"emergency_id": emergency_id, **row})
+        if rows:
+            invalidate_fleet_stats()
+
+    outcomes: List[BatchOutcome] = []
+    for position, error in enumerate(errors):
+        if error is not None:
+            outcomes.append((None, error, False))
+        elif position in new_ids:
+            outcomes.append((new_ids[position], None, False))
+        elif position in duplicate_ids:
+            outcomes.append((duplicate_ids[position], None, True))
+        elif insert_failed:
+            outcomes.append((None, "Insert failed", False))
+        else:
+            outcomes.append((new_ids[batch_originals[position]], None, True))
+    return outcomes
+
+
+def _select_with_relations(model: Any) -> Select:
+    return select(model).options(
+        selectinload(model.accident_type),
+        selectinload(model.assigned_unit_rel),
+        selectinload(model.user)
     )
-    return db.execute(stmt).scalar_one_or_none()
 
 
-def list_emergencies(db: Session, skip: int = 0, limit: int = 100) -> List[Emergencies]:
-    stmt = select(Emergencies).options(
-        selectinload(Emergencies.accident_type),
-        selectinload(Emergencies.assigned_unit_rel),
-        selectinload(Emergencies.user)
-    ).offset(skip).limit(limit).order_by(Emergencies.timestamp.desc())
-    return list(db.execute(stmt).scalars().all())
+def _tiers(include_archived: bool, status: Optional[int] = None) -> List[Any]:
+    """Tablas a leer: la activa y, si se pide histórico y el filtro admite cerradas, el archivo."""
+    if include_archived and status in (None, CLOSED_STATUS):
+        return [Emergencies, EmergenciesArchive]
+    return [Emergencies]
+
+
+def _newest_first(rows: List[Any]) -> List[Any]:
+    return sorted(rows, key=lambda row: (row.timestamp, row.emergency_id), reverse=True)
+
+
+def get_emergency(db: Session, emergency_id: int, include_archived: bool = False) -> Optional[Any]:
+    """
+    Emergencia con sus relaciones. Con include_archived, si ya no está en la tabla
+    activa se busca en emergencies_archive (solo lectura).
+    """
+    for model in _tiers(include_archived):
+        stmt = _select_with_relations(model).where(model.emergency_id == emergency_id)
+        emergency = db.execute(stmt).scalar_one_or_none()
+        if emergency is not None:
+            return emergency
+    return None
+
+
+# El cuerpo de EmergencyOut sale de la emergencia, su unidad y su usuario; el tipo de
+# accidente es un catálogo estático, basta con su ID (que ya forma parte de la fila).
+def emergency_etag(emergency: Any) -> str:
+    """ETag de una emergencia ya cargada con get_emergency."""
+    unit, user = emergency.assigned_unit_rel, emergency.user
+    return version_etag(
+        "emergency",
+        emergency.emergency_id,
+        emergency.version,
+        emergency.tipo_accidente,
+        unit.version if unit is not None else None,
+        user.version if user is not None else None,
+    )
+
+
+def get_emergency_etag(db: Session, emergency_id: int, include_archived: bool = False) -> Optional[str]:
+    """Mismo ETag que emergency_etag con una consulta de una fila, sin cargar ni serializar."""
+    for model in _tiers(include_archived):
+        stmt = (
+            select(model.version, model.tipo_accidente, EmergencyUnit.version, Users.version)
+            .outerjoin(EmergencyUnit, EmergencyUnit.emergency_unit_id == model.assigned_unit)
+            .outerjoin(Users, Users.user_id == model.user_id)
+            .where(model.emergency_id == emergency_id)
+        )
+        row = db.execute(stmt).first()
+        if row is not None:
+            return version_etag("emergency", emergency_id, *row)
+    return None
+
+
+# Relaciones expandibles de EmergencyOut y la FK que cada una necesita cargada
+EMERGENCY_RELATION_KEYS = {
+    "accident_type": ("tipo_accidente",),
+    "assigned_unit_rel": ("assigned_unit",),
+    "user": ("user_id",),
+}
+
+
+def list_emergencies(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, int]] = None,
+    status: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    assigned_unit: Optional[int] = None,
+    fieldset: Optional[Fieldset] = None,
+    include_archived: bool = False,
+) -> List[Any]:
+    """
+    Lista emergencias de la más reciente a la más antigua, con filtros opcionales.
+    Con `after` = (timestamp, emergency_id) de la última fila vista se pagina por keyset.
+    Con `fieldset` solo se leen las columnas y relaciones pedidas; sin relaciones
+    devuelve filas Row en lugar de entidades.
+    Con `include_archived` se lee también emergencies_archive: cada tabla devuelve
+    su página ya ordenada y se mezclan aquí.
+    """
+    tiers = _tiers(include_archived, status)
+    merged = len(tiers) > 1
+    rows: List[Any] = []
+    for model in tiers:
+        entities = True
+        if fieldset is None:
+            stmt = _select_with_relations(model)
+        else:
+            stmt, entities = sparse_select(
+                model,
+                fieldset,
+                always=("emergency_id", "timestamp"),
+                relation_keys=EMERGENCY_RELATION_KEYS,
+            )
+        stmt = stmt.order_by(model.timestamp.desc(), model.emergency_id.desc())
+        if status is not None:
+            stmt = stmt.where(model.status == status)
+        if assigned_unit is not None:
+            stmt = stmt.where(model.assigned_unit == assigned_unit)
+        if date_from is not None:
+            stmt = stmt.where(model.timestamp >= date_from)
+        if date_to is not None:
+            stmt = stmt.where(model.timestamp < date_to)
+        if after is not None:
+            stmt = stmt.where(tuple_(model.timestamp, model.emergency_id) < tuple_(*after))
+            stmt = stmt.limit(limit)
+        elif merged:
+            # El offset se aplica tras mezclar: cada tabla aporta hasta skip + limit filas
+            stmt = stmt.limit(skip + limit)
+        else:
+            stmt = stmt.offset(skip).limit(limit)
+        result = db.execute(stmt)
+        rows.extend(result.scalars().all() if entities else result.all())
+    if not merged:
+        return rows
+    rows = _newest_first(rows)
+    return rows[:limit] if after is not None else rows[skip:skip + limit]
+
+
+def _reload_unit(db: Session, emergency: Emergencies, old_unit: Optional[int]) -> None:
+    # expire_on_commit=False: las relaciones cargadas por get_emergency siguen
+    # válidas tras el commit; solo assigned_unit_rel queda obsoleta si cambió la unidad
+    if emergency.assigned_unit != old_unit:
+        unit = db.get(EmergencyUnit, emergency.assigned_unit) if emergency.assigned_unit is not None else None
+        set_committed_value(emergency, "assigned_unit_rel", unit)
 
 
 def update_emergency(db: Session, emergency_id: int, emergency_in: EmergencyUpdate) -> Optional[Emergencies]:
-    emergency = db.get(Emergencies, emergency_id)
+    # Se carga una vez con relaciones en lugar de db.get + recarga tras el commit
+    emergency = get_emergency(db, emergency_id)
     if not emergency:
         return None
-    
+
+    old_unit, old_status = emergency.assigned_unit, emergency.status
+    # Mismo bloqueo que el despacho automático: la carga de la unidad anterior y de la
+    # nueva no cambia bajo un choose_unit concurrente hasta el commit
+    lock_units(db, (old_unit, emergency_in.assigned_unit))
     if emergency_in.assigned_unit is not None:
         emergency.assigned_unit = emergency_in.assigned_unit
     if emergency_in.status is not None:
         emergency.status = emergency_in.status
-    
+    # En el mismo UPDATE: dos escrituras concurrentes nunca dejan la misma versión
+    emergency.version = Emergencies.version + 1
+
     db.add(emergency)
     db.commit()
-    db.refresh(emergency)
+    unit_loads.apply_change(old_unit, old_status, emergency.assigned_unit, emergency.status)
+    invalidate_fleet_stats()
+    if emergency.assigned_unit != old_unit:
+        publish_emergency_event(EMERGENCY_ASSIGNED, emergency)
+    if emergency.status != old_status:
+        if emergency.status == CLOSED_STATUS:
+            forget(emergency.emergency_id, emergency.user_id)
+        publish_emergency_event(EMERGENCY_STATUS_CHANGED, emergency, previous_status=old_status)
+    _reload_unit(db, emergency, old_unit)
     return emergency
 
 
 def assign_unit_to_emergency(db: Session, emergency_id: int, unit_id: int) -> Optional[Emergencies]:
-    emergency = db.get(Emergencies, emergency_id)
+    emergency = get_emergency(db, emergency_id)
     if not emergency:
         return None
-    
+
+    old_unit = emergency.assigned_unit
+    lock_units(db, (old_unit, unit_id))
     emergency.assigned_unit = unit_id
+    emergency.version = Emergencies.version + 1
     db.add(emergency)
     db.commit()
-    db.refresh(emergency)
+    unit_loads.apply_change(old_unit, emergency.status, unit_id, emergency.status)
+    invalidate_fleet_stats()
+    publish_emergency_event(EMERGENCY_ASSIGNED, emergency)
+    _reload_unit(db, emergency, old_unit)
     return emergency
 
 
-def get_emergencies_by_user(db: Session, user_id: int) -> List[Emergencies]:
-    stmt = select(Emergencies).where(Emergencies.user_id == user_id).options(
-        selectinload(Emergencies.accident_type),
-        selectinload(Emergencies.assigned_unit_rel),
-        selectinload(Emergencies.user)
-    ).order_by(Emergencies.timestamp.desc())
-    return list(db.execute(stmt).scalars().all())
-
-
-def get_emergencies_by_status(db: Session, status: int) -> List[Emergencies]:
-    stmt = select(Emergencies).where(Emergencies.status == status).options(
-        selectinload(Emergencies.accident_type),
-        selectinload(Emergencies.assigned_unit_rel),
-        selectinload(Emergencies.user)
-    ).order_by(Emergencies.timestamp.desc())
-    return list(db.execute(stmt).scalars().all())
\ No newline at end of file
+def get_emergencies_by_user(db: Session, user_id: int, include_archived: bool = False) -> List[Any]:
+    tiers = _tiers(include_archived)
+    emergencies: List[Any] = []
+    for model in tiers:
+        stmt = _select_with_relations(model).where(model.user_id == user_id).order_by(model.timestamp.desc())
+        emergencies.extend(db.execute(stmt).scalars().all())
+    return _newest_first(emergencies) if len(tiers) > 1 else emergencies
\ No newline at end of file
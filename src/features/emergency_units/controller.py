@@ -1,32 +1,80 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, status, Query
-from src.database.db import DbSession
+from fastapi import APIRouter, HTTPException, Request, Response, status, Query
+from src.common.http_cache import conditional_json_response, not_modified
+from src.common.responses import dump_model, list_response, model_response
+from src.database.db import AppDbSession, run_db
 
-from .model import EmergencyUnitCreate, EmergencyUnitUpdate, EmergencyUnitOut, EmergencyUnitWithStats
+from .model import EmergencyUnitCreate, EmergencyUnitUpdate, EmergencyUnitOut, EmergencyUnitWithStats, EmergencyUnitDistanceOut
+from .spatial import unit_index
 from . import service
 
 router = APIRouter(prefix="/emergency-units", tags=["emergency-units"])
 
 
+async def _ensure_unit_index(db: AppDbSession) -> None:
+    # Solo se consulta la DB para la carga inicial o cuando vence UNIT_INDEX_TTL
+    if unit_index.is_stale():
+        await run_db(db, service.load_unit_index)
+
+
+def _with_distance(ranked) -> List[EmergencyUnitDistanceOut]:
+    return [
+        EmergencyUnitDistanceOut(
+            emergency_unit_id=unit.emergency_unit_id,
+            name=unit.name,
+            latitud=unit.latitud,
+            longitud=unit.longitud,
+            distance_km=round(distance, 4),
+        )
+        for unit, distance in ranked
+    ]
+
+
 @router.post(
     "",
     response_model=EmergencyUnitOut,
     status_code=status.HTTP_201_CREATED,
     summary="Registrar nueva unidad de emergencia"
 )
-def create_emergency_unit(unit: EmergencyUnitCreate, db: DbSession) -> EmergencyUnitOut:
+async def create_emergency_unit(unit: EmergencyUnitCreate, db: AppDbSession) -> Response:
     """Registra una nueva unidad de emergencia con su ubicación."""
     # Check if unit name already exists
-    existing_unit = service.get_emergency_unit_by_name(db, unit.name)
+    existing_unit = await run_db(db, service.get_emergency_unit_by_name, unit.name)
     if existing_unit:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Emergency unit with name '{unit.name}' already exists"
         )
 
-    new_unit = service.create_emergency_unit(db, unit)
-    return EmergencyUnitOut.model_validate(new_unit)
+    new_unit = await run_db(db, service.create_emergency_unit, unit)
+    return model_response(EmergencyUnitOut, new_unit, status_code=status.HTTP_201_CREATED)
+
+
+FLEET_STATS_SORT_FIELDS = ("emergency_unit_id", "name", "active_emergencies", "total_emergencies")
+
+
+@router.get(
+    "/stats",
+    response_model=List[EmergencyUnitWithStats],
+    summary="Estadísticas de todas las unidades de emergencia"
+)
+async def list_emergency_units_with_stats(
+    db: AppDbSession,
+    name: Optional[str] = Query(None, description="Filtrar por nombre (contiene, sin distinguir mayúsculas)"),
+    min_active: int = Query(0, ge=0, description="Mínimo de emergencias activas"),
+    sort_by: str = Query("emergency_unit_id", pattern="^(" + "|".join(FLEET_STATS_SORT_FIELDS) + ")$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+) -> Response:
+    """Obtiene todas las unidades con sus estadísticas en una sola consulta agrupada."""
+    stats = await run_db(db, service.get_fleet_stats)
+    needle = name.lower() if name else None
+    selected = [
+        s for s in stats
+        if s["active_emergencies"] >= min_active and (needle is None or needle in s["name"].lower())
+    ]
+    selected.sort(key=lambda s: s[sort_by], reverse=order == "desc")
+    return list_response(EmergencyUnitWithStats, selected)
 
 
 @router.get(
@@ -34,15 +82,27 @@ def create_emergency_unit(unit: EmergencyUnitCreate, db: DbSession) -> Emergency
     response_model=EmergencyUnitOut,
     summary="Obtener datos de una unidad de emergencia"
 )
-def get_emergency_unit(unit_id: int, db: DbSession) -> EmergencyUnitOut:
+async def get_emergency_unit(unit_id: int, request: Request, db: AppDbSession) -> Response:
     """Obtiene los datos de una unidad de emergencia específica."""
-    unit = service.get_emergency_unit(db, unit_id)
+    if request.headers.get("if-none-match"):
+        # Revalidación: se decide con la versión de la fila, sin cargar la unidad
+        etag = await run_db(db, service.get_emergency_unit_etag, unit_id)
+        if etag is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Emergency unit not found"
+            )
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+    unit = await run_db(db, service.get_emergency_unit, unit_id)
     if not unit:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Emergency unit not found"
         )
-    return EmergencyUnitOut.model_validate(unit)
+    body = dump_model(EmergencyUnitOut, unit)
+    return conditional_json_response(request, body, service.unit_etag(unit))
 
 
 @router.get(
@@ -50,20 +110,15 @@ def get_emergency_unit(unit_id: int, db: DbSession) -> EmergencyUnitOut:
     response_model=EmergencyUnitWithStats,
     summary="Obtener unidad de emergencia con estadísticas"
 )
-def get_emergency_unit_with_stats(unit_id: int, db: DbSession) -> EmergencyUnitWithStats:
+async def get_emergency_unit_with_stats(unit_id: int, db: AppDbSession) -> Response:
     """Obtiene los datos de una unidad de emergencia con estadísticas de emergencias."""
-    unit = service.get_emergency_unit(db, unit_id)
-    if not unit:
+    stats = await run_db(db, service.get_emergency_unit_stats, unit_id)
+    if not stats:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Emergency unit not found"
         )
-
-    stats = service.get_emergency_unit_stats(db, unit_id)
-    unit_data = EmergencyUnitOut.model_validate(unit).model_dump()
-    unit_data.update(stats)
-
-    return EmergencyUnitWithStats.model_validate(unit_data)
+    return model_response(EmergencyUnitWithStats, stats)
 
 
 @router.get(
@@ -71,30 +126,49 @@ def get_emergency_unit_with_stats(unit_id: int, db: DbSession) -> EmergencyUnitW
     response_model=List[EmergencyUnitOut],
     summary="Listar unidades de emergencia"
 )
-def list_emergency_units(
-    db: DbSession,
+async def list_emergency_units(
+    db: AppDbSession,
     skip: int = Query(0, ge=0, description="Número de registros a saltar"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros")
-) -> List[EmergencyUnitOut]:
+) -> Response:
     """Lista todas las unidades de emergencia con paginación."""
-    units = service.list_emergency_units(db, skip=skip, limit=limit)
-    return [EmergencyUnitOut.model_validate(unit) for unit in units]
+    units = await run_db(db, service.list_emergency_units, skip=skip, limit=limit)
+    return list_response(EmergencyUnitOut, units)
 
 
 @router.get(
     "/search/nearby",
-    response_model=List[EmergencyUnitOut],
+    response_model=List[EmergencyUnitDistanceOut],
     summary="Buscar unidades de emergencia cercanas"
 )
-def search_nearby_emergency_units(
+async def search_nearby_emergency_units(
     latitude: float = Query(..., ge=-90, le=90, description="Latitud de referencia"),
     longitude: float = Query(..., ge=-180, le=180, description="Longitud de referencia"),
     radius_km: float = Query(10.0, ge=0.1, le=100, description="Radio de búsqueda en kilómetros"),
-    db: DbSession = None
-) -> List[EmergencyUnitOut]:
-    """Busca unidades de emergencia dentro de un radio específico desde una ubicación."""
-    units = service.search_emergency_units_by_location(db, latitude, longitude, radius_km)
-    return [EmergencyUnitOut.model_validate(unit) for unit in units]
+    db: AppDbSession = None
+) -> Response:
+    """Busca unidades de emergencia dentro de un radio, de la más cercana a la más lejana."""
+    await _ensure_unit_index(db)
+    ranked = service.search_emergency_units_by_location(latitude, longitude, radius_km)
+    return list_response(EmergencyUnitDistanceOut, _with_distance(ranked))
+
+
+@router.get(
+    "/search/nearest",
+    response_model=List[EmergencyUnitDistanceOut],
+    summary="Buscar las k unidades de emergencia más cercanas"
+)
+async def search_nearest_emergency_units(
+    latitude: float = Query(..., ge=-90, le=90, description="Latitud de referencia"),
+    longitude: float = Query(..., ge=-180, le=180, description="Longitud de referencia"),
+    k: int = Query(5, ge=1, le=50, description="Número de unidades a devolver"),
+    radius_km: Optional[float] = Query(None, gt=0, description="Radio máximo en kilómetros (opcional)"),
+    db: AppDbSession = None
+) -> Response:
+    """Busca las k unidades de emergencia más cercanas a una ubicación."""
+    await _ensure_unit_index(db)
+    ranked = service.find_nearest_emergency_units(latitude, longitude, k, radius_km)
+    return list_response(EmergencyUnitDistanceOut, _with_distance(ranked))
 
 
 @router.put(
@@ -102,28 +176,28 @@ def search_nearby_emergency_units(
     response_model=EmergencyUnitOut,
     summary="Actualizar unidad de emergencia"
 )
-def update_emergency_unit(
+async def update_emergency_unit(
     unit_id: int,
     unit_update: EmergencyUnitUpdate,
-    db: DbSession
-) -> EmergencyUnitOut:
+    db: AppDbSession
+) -> Response:
     """Actualiza los datos de una unidad de emergencia."""
     # Check if new name already exists (if name is being updated)
     if unit_update.name:
-        existing_unit = service.get_emergency_unit_by_name(db, unit_update.name)
+        existing_unit = await run_db(db, service.get_emergency_unit_by_name, unit_update.name)
         if existing_unit and existing_unit.emergency_unit_id != unit_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Emergency unit with name '{unit_update.name}' already exists"
             )
 
-    unit = service.update_emergency_unit(db, unit_id, unit_update)
+    unit = await run_db(db, service.update_emergency_unit, unit_id, unit_update)
     if not unit:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Emergency unit not found"
         )
-    return EmergencyUnitOut.model_validate(unit)
+    return model_response(EmergencyUnitOut, unit)
 
 
 @router.delete(
@@ -131,9 +205,9 @@ def update_emergency_unit(
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Eliminar unidad de emergencia"
 )
-def delete_emergency_unit(unit_id: int, db: DbSession):
+async def delete_emergency_unit(unit_id: int, db: AppDbSession):
     """Elimina una unidad de emergencia."""
-    success = service.delete_emergency_unit(db, unit_id)
+    success = await run_db(db, service.delete_emergency_unit, unit_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, Field, ConfigDict
 
@@ -23,7 +24,16 @@ class EmergencyUnitOut(BaseModel):
     longitud: float
 
 
+class EmergencyUnitDistanceOut(EmergencyUnitOut):
+    """Emergency unit with its distance to a reference point"""
+    distance_km: float = Field(..., description="Distancia haversine en kilómetros")
+
+
 class EmergencyUnitWithStats(EmergencyUnitOut):
     """Emergency unit with additional statistics"""
     active_emergencies: int = Field(default=0, description="Número de emergencias activas asignadas")
-    total_emergencies: int = Field(default=0, description="Total de emergencias atendidas")
\ No newline at end of file
+    total_emergencies: int = Field(default=0, description="Total de emergencias atendidas")
+    as_of: datetime = Field(
+        ...,
+        description="Momento en que se leyeron los contadores (caché de hasta UNIT_STATS_TTL s por worker)",
+    )
\ No newline at end of file
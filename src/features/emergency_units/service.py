@@ -1,9 +1,30 @@
-from typing import List, Optional
+import os
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from sqlalchemy import select, func, case
+from src.common.http_cache import version_etag
 from src.entities.EmergencyUnitEntity import EmergencyUnit
 from src.entities.EmergenciesEntity import Emergencies
+from src.entities.EmergenciesArchiveUnitTotalsEntity import EmergenciesArchiveUnitTotals
+from src.features.catalogs.cache import catalog_cache
 from .model import EmergencyUnitCreate, EmergencyUnitUpdate
+from .spatial import UnitPoint, unit_index
+
+UNIT_STATS_TTL = float(os.getenv("UNIT_STATS_TTL", "10"))
+
+# (momento de carga en time.monotonic(), estadísticas de toda la flota)
+_fleet_stats: Optional[Tuple[float, List[dict]]] = None
+
+
+def _to_point(unit: EmergencyUnit) -> UnitPoint:
+    return UnitPoint(
+        emergency_unit_id=unit.emergency_unit_id,
+        name=unit.name,
+        latitud=float(unit.latitud),
+        longitud=float(unit.longitud),
+    )
 
 
 def create_emergency_unit(db: Session, unit_in: EmergencyUnitCreate) -> EmergencyUnit:
@@ -16,6 +37,9 @@ def create_emergency_unit(db: Session, unit_in: EmergencyUnitCreate) -> Emergenc
     db.add(unit)
     db.commit()
     db.refresh(unit)
+    catalog_cache.invalidate("emergency_units")
+    unit_index.upsert(_to_point(unit))
+    invalidate_fleet_stats()
     return unit
 
 
@@ -24,6 +48,16 @@ def get_emergency_unit(db: Session, unit_id: int) -> Optional[EmergencyUnit]:
     return db.get(EmergencyUnit, unit_id)
 
 
+def unit_etag(unit: EmergencyUnit) -> str:
+    return version_etag("unit", unit.emergency_unit_id, unit.version)
+
+
+def get_emergency_unit_etag(db: Session, unit_id: int) -> Optional[str]:
+    """ETag de la unidad leyendo solo su versión."""
+    version = db.scalar(select(EmergencyUnit.version).where(EmergencyUnit.emergency_unit_id == unit_id))
+    return version_etag("unit", unit_id, version) if version is not None else None
+
+
 def get_emergency_unit_by_name(db: Session, name: str) -> Optional[EmergencyUnit]:
     """Get an emergency unit by name."""
     stmt = select(EmergencyUnit).where(EmergencyUnit.name == name)
@@ -48,10 +82,16 @@ def update_emergency_unit(db: Session, unit_id: int, unit_in: EmergencyUnitUpdat
         unit.latitud = unit_in.latitud
     if unit_in.longitud is not None:
         unit.longitud = unit_in.longitud
+    # En el mismo UPDATE: dos escrituras concurrentes nunca dejan la misma versión
+    unit.version = EmergencyUnit.version + 1
 
     db.add(unit)
+    # Con expire_on_commit=False no hace falta refresh: solo `version` queda expirada
+    # (se calcula en la base) y EmergencyUnitOut no la incluye
     db.commit()
-    db.refresh(unit)
+    catalog_cache.invalidate("emergency_units")
+    unit_index.upsert(_to_point(unit))
+    invalidate_fleet_stats()
     return unit
 
 
@@ -63,40 +103,85 @@ def delete_emergency_unit(db: Session, unit_id: int) -> bool:
 
     db.delete(unit)
     db.commit()
+    catalog_cache.invalidate("emergency_units")
+    unit_index.remove(unit_id)
+    invalidate_fleet_stats()
     return True
 
 
-def get_emergency_unit_stats(db: Session, unit_id: int) -> dict:
-    """Get statistics for an emergency unit."""
-    # Count active emergencies (status 1 or 2)
-    active_emergencies_stmt = select(func.count(Emergencies.emergency_id)).where(
-        Emergencies.assigned_unit == unit_id,
-        Emergencies.status.in_([1, 2])
-    )
-    active_count = db.execute(active_emergencies_stmt).scalar() or 0
-
-    # Count total emergencies
-    total_emergencies_stmt = select(func.count(Emergencies.emergency_id)).where(
-        Emergencies.assigned_unit == unit_id
-    )
-    total_count = db.execute(total_emergencies_stmt).scalar() or 0
-
-    return {
-        "active_emergencies": active_count,
-        "total_emergencies": total_count
-    }
-
-
-def search_emergency_units_by_location(db: Session, latitude: float, longitude: float, radius_km: float = 10.0) -> List[EmergencyUnit]:
-    """Find emergency units within a specified radius from a location."""
-    # Simple distance calculation (this could be improved with PostGIS)
-    # For now, using a basic bounding box approach
-    lat_delta = radius_km / 111.0  # Roughly 111 km per degree of latitude
-    lon_delta = radius_km / (111.0 * abs(latitude))  # Adjust longitude for latitude
-
-    stmt = select(EmergencyUnit).where(
-        EmergencyUnit.latitud.between(latitude - lat_delta, latitude + lat_delta),
-        EmergencyUnit.longitud.between(longitude - lon_delta, longitude + lon_delta)
-    ).order_by(EmergencyUnit.name)
-
-    return list(db.execute(stmt).scalars().all())
\ No newline at end of file
+def invalidate_fleet_stats() -> None:
+    """Descarta la caché de este worker; la llaman las escrituras de unidades y de emergencias."""
+    global _fleet_stats
+    _fleet_stats = None
+
+
+def get_fleet_stats(db: Session) -> List[dict]:
+    """
+    Get every emergency unit with its active (status 1 or 2) and total emergency counts.
+    One grouped query for the whole fleet, cached for UNIT_STATS_TTL seconds.
+    Totals include archived emergencies, read from emergencies_archive_unit_totals.
+
+    The cache is per worker: writes made by this worker clear it, but writes made by
+    other workers only show up once it expires. Each row carries `as_of`, the moment
+    the counts were read, so clients can tell how old they may be.
+    """
+    global _fleet_stats
+    cached = _fleet_stats
+    if cached is not None and time.monotonic() - cached[0] < UNIT_STATS_TTL:
+        return cached[1]
+
+    active_count = func.count(case((Emergencies.status.in_([1, 2]), Emergencies.emergency_id)))
+    archived_count = func.coalesce(func.max(EmergenciesArchiveUnitTotals.total), 0)
+    total_count = func.count(Emergencies.emergency_id) + archived_count
+    stmt = select(
+        EmergencyUnit.emergency_unit_id,
+        EmergencyUnit.name,
+        EmergencyUnit.latitud,
+        EmergencyUnit.longitud,
+        active_count.label("active_emergencies"),
+        total_count.label("total_emergencies"),
+    ).outerjoin(
+        Emergencies, Emergencies.assigned_unit == EmergencyUnit.emergency_unit_id
+    ).outerjoin(
+        EmergenciesArchiveUnitTotals,
+        EmergenciesArchiveUnitTotals.emergency_unit_id == EmergencyUnit.emergency_unit_id,
+    ).group_by(
+        EmergencyUnit.emergency_unit_id,
+        EmergencyUnit.name,
+        EmergencyUnit.latitud,
+        EmergencyUnit.longitud,
+    ).order_by(EmergencyUnit.emergency_unit_id)
+
+    as_of = datetime.now()
+    stats = [{**row, "as_of": as_of} for row in db.execute(stmt).mappings().all()]
+    _fleet_stats = (time.monotonic(), stats)
+    return stats
+
+
+def get_emergency_unit_stats(db: Session, unit_id: int) -> Optional[dict]:
+    """Get an emergency unit with its statistics, from the fleet-wide stats."""
+    for stats in get_fleet_stats(db):
+        if stats["emergency_unit_id"] == unit_id:
+            return stats
+    return None
+
+
+def load_unit_index(db: Session) -> None:
+    """Load every emergency unit into the in-memory spatial index."""
+    units = db.execute(select(EmergencyUnit)).scalars().all()
+    unit_index.load(_to_point(unit) for unit in units)
+
+
+def search_emergency_units_by_location(latitude: float, longitude: float, radius_km: float = 10.0) -> List[Tuple[UnitPoint, float]]:
+    """Find emergency units within a radius from a location, nearest first, with distance in km."""
+    return unit_index.within_radius(latitude, longitude, radius_km)
+
+
+def find_nearest_emergency_units(
+    latitude: float,
+    longitude: float,
+    k: int = 5,
+    max_radius_km: Optional[float] = None,
+) -> List[Tuple[UnitPoint, float]]:
+    """Find the k emergency units nearest to a location, with distance in km."""
+    return unit_index.nearest(latitude, longitude, k, max_radius_km)
\ No newline at end of file
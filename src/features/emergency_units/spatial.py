@@ -0,0 +1,203 @@
+"""
+Índice espacial en memoria de unidades de emergencia.
+
+Las unidades se proyectan a vectores 3D sobre la esfera unitaria y se indexan en un
+KD-tree: la distancia euclídea (cuerda) crece igual que la distancia sobre la esfera,
+así que la búsqueda es exacta sin casos especiales en polos ni en el antimeridiano.
+La distancia devuelta es la haversine en km.
+
+El árbol es inmutable: cada alta/cambio/baja construye uno nuevo y lo publica de
+golpe, así las lecturas no necesitan lock. Con cientos de unidades reconstruirlo
+cuesta menos de un milisegundo. Cada worker tiene su propio índice; las escrituras
+locales se aplican al momento y UNIT_INDEX_TTL acota cuánto tarda en verse un
+cambio hecho por otro worker.
+"""
+import heapq
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+UNIT_INDEX_TTL = float(os.getenv("UNIT_INDEX_TTL", "60"))
+
+Vector = Tuple[float, float, float]
+
+
+@dataclass(frozen=True)
+class UnitPoint:
+    emergency_unit_id: int
+    name: str
+    latitud: float
+    longitud: float
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _to_vector(latitude: float, longitude: float) -> Vector:
+    phi, lam = math.radians(latitude), math.radians(longitude)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi))
+
+
+def _chord_squared(distance_km: float) -> float:
+    """Cuerda al cuadrado (esfera unitaria) equivalente a una distancia sobre la superficie."""
+    angle = min(math.pi, distance_km / EARTH_RADIUS_KM)
+    return (2 * math.sin(angle / 2)) ** 2
+
+
+# Nodo: (vector, unidad, eje, izquierdo, derecho)
+_Node = Tuple[Vector, UnitPoint, int, Optional[tuple], Optional[tuple]]
+
+
+class _KDTree:
+    def __init__(self, items: List[Tuple[Vector, UnitPoint]]) -> None:
+        self._root = self._build(items, 0)
+
+    def _build(self, items: List[Tuple[Vector, UnitPoint]], depth: int) -> Optional[_Node]:
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[0][axis])
+        mid = len(items) // 2
+        vector, unit = items[mid]
+        return (
+            vector,
+            unit,
+            axis,
+            self._build(items[:mid], depth + 1),
+            self._build(items[mid + 1:], depth + 1),
+        )
+
+    def nearest(self, target: Vector, k: int, max_chord2: float) -> List[UnitPoint]:
+        # Max-heap (por -distancia) con los k mejores candidatos
+        best: List[Tuple[float, int, UnitPoint]] = []
+
+        def visit(node: Optional[_Node]) -> None:
+            if node is None:
+                return
+            vector, unit, axis, left, right = node
+            dist2 = _dist2(vector, target)
+            if dist2 <= max_chord2:
+                entry = (-dist2, unit.emergency_unit_id, unit)
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif dist2 < -best[0][0]:
+                    heapq.heapreplace(best, entry)
+            diff = target[axis] - vector[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            bound = max_chord2 if len(best) < k else min(max_chord2, -best[0][0])
+            if diff * diff <= bound:
+                visit(far)
+
+        visit(self._root)
+        return [unit for _, _, unit in best]
+
+    def within(self, target: Vector, max_chord2: float) -> List[UnitPoint]:
+        found: List[UnitPoint] = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            vector, unit, axis, left, right = node
+            if _dist2(vector, target) <= max_chord2:
+                found.append(unit)
+            diff = target[axis] - vector[axis]
+            if diff <= 0 or diff * diff <= max_chord2:
+                stack.append(left)
+            if diff >= 0 or diff * diff <= max_chord2:
+                stack.append(right)
+        return found
+
+
+def _dist2(a: Vector, b: Vector) -> float:
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+class UnitSpatialIndex:
+    def __init__(self, ttl: float = UNIT_INDEX_TTL) -> None:
+        self.ttl = ttl
+        self._units: Dict[int, UnitPoint] = {}
+        self._tree = _KDTree([])
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def load(self, units: Iterable[UnitPoint]) -> None:
+        """Reemplaza el contenido completo del índice (carga inicial o recarga por TTL)."""
+        with self._lock:
+            self._publish({unit.emergency_unit_id: unit for unit in units})
+            self._loaded_at = time.monotonic()
+
+    def upsert(self, unit: UnitPoint) -> None:
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            units = dict(self._units)
+            units[unit.emergency_unit_id] = unit
+            self._publish(units)
+
+    def remove(self, unit_id: int) -> None:
+        with self._lock:
+            if self._loaded_at is None or unit_id not in self._units:
+                return
+            units = dict(self._units)
+            del units[unit_id]
+            self._publish(units)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def _publish(self, units: Dict[int, UnitPoint]) -> None:
+        tree = _KDTree([(_to_vector(u.latitud, u.longitud), u) for u in units.values()])
+        # Se publican juntos: las lecturas toman la referencia y no necesitan lock
+        self._units, self._tree = units, tree
+
+    def get(self, unit_id: int) -> Optional[UnitPoint]:
+        return self._units.get(unit_id)
+
+    def all(self) -> List[UnitPoint]:
+        return list(self._units.values())
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        max_radius_km: Optional[float] = None,
+    ) -> List[Tuple[UnitPoint, float]]:
+        """Las k unidades más cercanas (opcionalmente dentro de un radio), ordenadas por distancia."""
+        max_chord2 = _chord_squared(max_radius_km) if max_radius_km is not None else 4.0
+        units = self._tree.nearest(_to_vector(latitude, longitude), k, max_chord2)
+        return self._with_distance(units, latitude, longitude)
+
+    def within_radius(self, latitude: float, longitude: float, radius_km: float) -> List[Tuple[UnitPoint, float]]:
+        """Todas las unidades dentro del radio, ordenadas por distancia."""
+        units = self._tree.within(_to_vector(latitude, longitude), _chord_squared(radius_km))
+        return self._with_distance(units, latitude, longitude)
+
+    @staticmethod
+    def _with_distance(units: List[UnitPoint], latitude: float, longitude: float) -> List[Tuple[UnitPoint, float]]:
+        ranked = [(unit, haversine_km(latitude, longitude, unit.latitud, unit.longitud)) for unit in units]
+        ranked.sort(key=lambda item: (item[1], item[0].emergency_unit_id))
+        return ranked
+
+
+unit_index = UnitSpatialIndex()
@@ -1,23 +1,44 @@
-﻿from typing import List
+﻿from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, status, Depends
-from src.database.db import DbSession
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status, Depends
+from src.common.fieldsets import EXPAND_DESCRIPTION, FIELDS_DESCRIPTION, parse_fieldset, partial_model
+from src.common.http_cache import conditional_json_response, not_modified
+from src.common.pagination import decode_cursor, encode_cursor, set_next_cursor
+from src.common.responses import dump_model, list_response, model_response
+from src.database.db import AppDbSession, run_db
 from src.auth.dependencies import verify_api_key
 
 from .model import UserCreate, UserUpdate, UserOut, LoginRequest
+from .passwords import hash_password_async, needs_rehash, run_hashing
 from . import service
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
+def _phone_conflict(phone: str) -> HTTPException:
+    # 409 tanto en la comprobación previa como si la detecta el índice único
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"User with phone '{phone}' already exists"
+    )
+
+
 @router.post(
     "",
     response_model=UserOut,
     status_code=status.HTTP_201_CREATED,
 )
-def create_user(db: DbSession, payload: UserCreate) -> UserOut:
-    user = service.create_user(db, payload)
-    return UserOut.model_validate(user)
+async def create_user(db: AppDbSession, payload: UserCreate) -> Response:
+    # El teléfono es único (ix_users_phone); la comprobación previa evita hashear en vano
+    if await run_db(db, service.get_user_by_phone, payload.phone):
+        raise _phone_conflict(payload.phone)
+    password_hash = await hash_password_async(payload.password)
+    try:
+        user = await run_db(db, service.create_user, payload, password_hash)
+    except service.PhoneAlreadyRegistered:
+        # Otra petición registró el mismo teléfono entre la comprobación y el INSERT
+        raise _phone_conflict(payload.phone)
+    return model_response(UserOut, user, status_code=status.HTTP_201_CREATED)
 
 
 @router.post(
@@ -25,50 +46,94 @@ def create_user(db: DbSession, payload: UserCreate) -> UserOut:
     response_model=UserOut,
     status_code=status.HTTP_200_OK,
 )
-def login(payload: LoginRequest, db: DbSession) -> UserOut:
-    user = service.authenticate_user(db, payload.phone, payload.password)
-    if not user:
+async def login(payload: LoginRequest, db: AppDbSession) -> Response:
+    # La sesión de DB y el executor de hashing se usan por separado: el hash no corre dentro de run_db
+    user = await run_db(db, service.get_user_by_phone, payload.phone)
+    if not await run_hashing(service.verify, user, payload.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    return UserOut.model_validate(user)
+    # Hash SHA-256 antiguo (o scrypt con otro coste): se reemplaza por uno actual
+    if needs_rehash(user.password):
+        new_hash = await hash_password_async(payload.password)
+        await run_db(db, service.set_password_hash, user.user_id, new_hash)
+        user.password = new_hash
+    return model_response(UserOut, user)
 
 
 @router.get(
     "",
     response_model=List[UserOut],
 )
-def list_users(db: DbSession, skip: int = 0, limit: int = 100) -> List[UserOut]:
-    users = service.list_users(db, skip=skip, limit=limit)
-    return [UserOut.model_validate(u) for u in users]
+async def list_users(
+    db: AppDbSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+) -> Response:
+    fieldset = parse_fieldset(UserOut, service.USER_RELATIONS, fields, expand)
+    after_id = None
+    if cursor:
+        (after_id,) = decode_cursor(cursor, 1)
+        if not isinstance(after_id, int):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    # Se pide una fila extra para saber si hay página siguiente
+    users = await run_db(db, service.list_users, skip=skip, limit=limit + 1, after_id=after_id, fieldset=fieldset)
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor([users[-1].user_id])
+    out_model = UserOut if fieldset is None else partial_model(UserOut, fieldset.names)
+    response = list_response(out_model, users)
+    set_next_cursor(response, next_cursor)
+    return response
 
 
 @router.get(
     "/{user_id}",
     response_model=UserOut,
 )
-def get_user(user_id: int, db: DbSession) -> UserOut:
-    user = service.get_user(db, user_id)
+async def get_user(user_id: int, request: Request, db: AppDbSession) -> Response:
+    if request.headers.get("if-none-match"):
+        # Revalidación: se decide con la versión de la fila, sin cargar el usuario
+        etag = await run_db(db, service.get_user_etag, user_id)
+        if etag is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+    user = await run_db(db, service.get_user, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    return UserOut.model_validate(user)
+    body = dump_model(UserOut, user)
+    return conditional_json_response(request, body, service.user_etag(user))
 
 
 @router.put(
     "/{user_id}",
     response_model=UserOut,
 )
-def update_user(user_id: int, payload: UserUpdate, db: DbSession) -> UserOut:
-    user = service.update_user(db, user_id, payload)
+async def update_user(user_id: int, payload: UserUpdate, db: AppDbSession) -> Response:
+    if payload.phone is not None:
+        existing = await run_db(db, service.get_user_by_phone, payload.phone)
+        if existing and existing.user_id != user_id:
+            raise _phone_conflict(payload.phone)
+    password_hash = await hash_password_async(payload.password) if payload.password is not None else None
+    try:
+        user = await run_db(db, service.update_user, user_id, payload, password_hash)
+    except service.PhoneAlreadyRegistered:
+        raise _phone_conflict(payload.phone)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    return UserOut.model_validate(user)
+    return model_response(UserOut, user)
 
 
 @router.delete(
     "/{user_id}",
     status_code=status.HTTP_204_NO_CONTENT,
 )
-def delete_user(user_id: int, db: DbSession) -> None:
-    ok = service.delete_user(db, user_id)
+async def delete_user(user_id: int, db: AppDbSession) -> None:
+    ok = await run_db(db, service.delete_user, user_id)
     if not ok:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return None
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""
+Hash de contraseñas con scrypt (hashlib).
+
+scrypt es costoso a propósito (CPU y memoria), así que nunca se ejecuta en el event
+loop ni en el threadpool de Starlette: va a un executor propio de PASSWORD_HASH_WORKERS
+hilos (hashlib.scrypt libera el GIL). Si hay más de PASSWORD_HASH_MAX_PENDING hashes
+en espera se rechaza la petición con PasswordHashingBusy en lugar de encolar sin
+límite, así una avalancha de logins no deja sin CPU a los endpoints de emergencias.
+
+Formato almacenado: scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>.
+Los hashes SHA-256 anteriores (64 caracteres hex) se siguen aceptando y se
+actualizan a scrypt en el siguiente login correcto.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+_SALT_BYTES = 16
+_KEY_BYTES = 32
+_PREFIX = "scrypt"
+
+
+class PasswordHashingBusy(Exception):
+    """Demasiados hashes en espera; el cliente debe reintentar más tarde."""
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode("utf-8"),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=256 * n * r * p,
+        dklen=_KEY_BYTES,
+    )
+
+
+def _is_legacy(stored: str) -> bool:
+    return len(stored) == 64 and not stored.startswith(_PREFIX + "$")
+
+
+def hash_password(password: str) -> str:
+    salt = os.urandom(_SALT_BYTES)
+    key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"{_PREFIX}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(key)}"
+
+
+def verify_password(password: str, stored: str) -> bool:
+    if _is_legacy(stored):
+        legacy = hashlib.sha256(password.encode("utf-8")).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+    try:
+        prefix, n, r, p, salt, key = stored.split("$")
+        if prefix != _PREFIX:
+            return False
+        expected = base64.b64decode(key)
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored: str) -> bool:
+    """True para hashes SHA-256 antiguos o generados con otros parámetros de coste."""
+    if _is_legacy(stored):
+        return True
+    return not stored.startswith(f"{_PREFIX}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+# Hash de referencia para igualar el tiempo de respuesta cuando el usuario no existe
+DUMMY_HASH = hash_password(os.urandom(8).hex())
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+async def run_hashing(fn, *args):
+    """Ejecuta `fn` (trabajo de hash, sin DB) en el executor acotado."""
+    global _pending
+    with _pending_lock:
+        if _pending >= HASH_MAX_PENDING:
+            raise PasswordHashingBusy()
+        _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await run_hashing(hash_password, password)
+
+
+async def verify_password_async(password: str, stored: str) -> bool:
+    return await run_hashing(verify_password, password, stored)
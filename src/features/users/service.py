@@ -1,33 +1,56 @@
 ﻿from __future__ import annotations
 
-import hashlib
-from typing import List, Optional
+from typing import Any, List, Optional
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import select
+from sqlalchemy import select, update
 
+from src.common.fieldsets import Fieldset, sparse_select
+from src.common.http_cache import version_etag
 from src.entities.UsersEntity import Users
 from src.entities.EmergencyContactsEntity import EmergencyContacts
 from src.entities.UserConditionsEntity import UserConditions
 from .model import UserCreate, UserUpdate
+from .passwords import DUMMY_HASH, verify_password
 
 
-def _hash_password(password: str) -> str:
-    # Hash simple con SHA-256 (placeholder); reemplazar por un hash fuerte si se requiere.
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+class PhoneAlreadyRegistered(Exception):
+    """Otro usuario ya tiene ese teléfono (índice único ix_users_phone)."""
 
 
-def create_user(db: Session, user_in: UserCreate) -> Users:
+def _is_phone_conflict(exc: IntegrityError) -> bool:
+    # SQLite: "UNIQUE constraint failed: users.phone"; PostgreSQL: ... constraint "ix_users_phone"
+    return "phone" in str(exc.orig)
+
+
+def _flush_user(db: Session, phone: Optional[str]) -> None:
+    """
+    flush que convierte la violación de ix_users_phone en PhoneAlreadyRegistered.
+    La comprobación previa del controller no cubre dos altas simultáneas con el mismo teléfono.
+    """
+    try:
+        db.flush()
+    except IntegrityError as e:
+        db.rollback()
+        if _is_phone_conflict(e):
+            raise PhoneAlreadyRegistered(phone) from e
+        raise
+
+
+# Las contraseñas llegan ya hasheadas (passwords.hash_password_async en el controller):
+# el hash es costoso y no debe correr dentro de la sesión de DB.
+def create_user(db: Session, user_in: UserCreate, password_hash: str) -> Users:
     # Crear el usuario
     user = Users(
         name=user_in.name,
         phone=user_in.phone,
         birthday=user_in.birthday,
-        password=_hash_password(user_in.password),
+        password=password_hash,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    # flush para obtener user_id; usuario, contactos y condiciones van en una sola transacción
+    _flush_user(db, user_in.phone)
     
     # Crear contactos de emergencia si fueron proporcionados
     if user_in.emergency_contacts:
@@ -50,7 +73,8 @@ def create_user(db: Session, user_in: UserCreate) -> Users:
             db.add(user_condition)
     
     db.commit()
-    return user
+    # Recargar con relaciones para serializar sin lazy loads
+    return get_user(db, user.user_id)
 
 
 def get_user(db: Session, user_id: int) -> Optional[Users]:
@@ -60,31 +84,75 @@ def get_user(db: Session, user_id: int) -> Optional[Users]:
     )
     return db.execute(stmt).scalar_one_or_none()
 
+
+# Contactos y condiciones solo se escriben al crear el usuario: la versión de la fila basta
+def user_etag(user: Users) -> str:
+    return version_etag("user", user.user_id, user.version)
+
+
+def get_user_etag(db: Session, user_id: int) -> Optional[str]:
+    version = db.scalar(select(Users.version).where(Users.user_id == user_id))
+    return version_etag("user", user_id, version) if version is not None else None
+
 def get_user_by_phone(db: Session, phone: str) -> Optional[Users]:
-    stmt = select(Users).where(Users.phone == phone)
+    stmt = select(Users).where(Users.phone == phone).options(
+        selectinload(Users.emergency_contacts),
+        selectinload(Users.conditions)
+    )
     return db.execute(stmt).scalar_one_or_none()
 
 
-def authenticate_user(db: Session, phone: str, password: str) -> Optional[Users]:
-    user = get_user_by_phone(db, phone)
-    if not user:
-        return None
-    if user.password != _hash_password(password):
-        return None
-    return user
+def verify(user: Optional[Users], password: str) -> bool:
+    """
+    Comprueba la contraseña de `user` (de get_user_by_phone). Sin usuario se verifica
+    contra un hash de referencia: mismo coste, así no se revela qué teléfonos están
+    registrados. Es trabajo de CPU sin DB: el controller la ejecuta con passwords.run_hashing.
+    """
+    if user is None:
+        verify_password(password, DUMMY_HASH)
+        return False
+    return verify_password(password, user.password)
 
 
+def set_password_hash(db: Session, user_id: int, password_hash: str) -> None:
+    db.execute(update(Users).where(Users.user_id == user_id).values(password=password_hash))
+    db.commit()
 
-def list_users(db: Session, skip: int = 0, limit: int = 100) -> List[Users]:
-    stmt = select(Users).options(
-        selectinload(Users.emergency_contacts),
-        selectinload(Users.conditions)
-    ).offset(skip).limit(limit)
-    return list(db.execute(stmt).scalars().all())
 
 
-def update_user(db: Session, user_id: int, user_in: UserUpdate) -> Optional[Users]:
-    user = db.get(Users, user_id)
+USER_RELATIONS = ("emergency_contacts", "conditions")
+
+
+def list_users(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    fieldset: Optional[Fieldset] = None,
+) -> List[Any]:
+    # Orden estable por user_id; con after_id se pagina por keyset en lugar de OFFSET.
+    # Con fieldset solo se leen las columnas y relaciones pedidas (filas Row si no hay relaciones).
+    entities = True
+    if fieldset is None:
+        stmt = select(Users).options(
+            selectinload(Users.emergency_contacts),
+            selectinload(Users.conditions)
+        )
+    else:
+        stmt, entities = sparse_select(Users, fieldset, always=("user_id",))
+    stmt = stmt.order_by(Users.user_id)
+    if after_id is not None:
+        stmt = stmt.where(Users.user_id > after_id)
+    else:
+        stmt = stmt.offset(skip)
+    stmt = stmt.limit(limit)
+    result = db.execute(stmt)
+    return list(result.scalars().all() if entities else result.all())
+
+
+def update_user(db: Session, user_id: int, user_in: UserUpdate, password_hash: Optional[str] = None) -> Optional[Users]:
+    # Contactos y condiciones no cambian aquí: se cargan una vez y siguen válidos tras el commit
+    user = get_user(db, user_id)
     if not user:
         return None
 
@@ -94,12 +162,14 @@ def update_user(db: Session, user_id: int, user_in: UserUpdate) -> Optional[User
         user.phone = user_in.phone
     if user_in.birthday is not None:
         user.birthday = user_in.birthday
-    if user_in.password is not None:
-        user.password = _hash_password(user_in.password)
+    if password_hash is not None:
+        user.password = password_hash
+    # En el mismo UPDATE: dos escrituras concurrentes nunca dejan la misma versión
+    user.version = Users.version + 1
 
     db.add(user)
+    _flush_user(db, user_in.phone)
     db.commit()
-    db.refresh(user)
     return user
 
 
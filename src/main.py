@@ -1,24 +1,77 @@
-from typing import Union
+from contextlib import asynccontextmanager
+from typing import Optional, Union
 
 from fastapi import FastAPI, Depends, Request
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from src.features.users.controller import router as users_router
 from src.features.catalogs.controller import router as catalogs_router
 from src.features.emergencies.controller import router as emergencies_router
+from src.features.emergencies.feed import router as emergencies_feed_router
 from src.features.emergency_units.controller import router as emergency_units_router
-from src.auth.dependencies import verify_api_key
+from src.auth.api_keys import api_key_registry
+from src.auth.dependencies import is_valid_api_key, verify_api_key
+from src.auth.hybrid_limiter import HybridRateLimitMiddleware, gateway_limiter, hybrid_limiter
 from src.auth.rate_limiter import limiter, rate_limit_exceeded_handler
+from src.common.event_bus import event_bus
+from src.common.idempotency import IdempotencyMiddleware, idempotency_store
+from src.common.metrics import MetricsMiddleware, render_metrics
+from src.features.emergencies.archive import archive_job
+from src.features.users.passwords import PasswordHashingBusy
+from src.database.db import DB_ASYNC, get_pool_stats, prewarm_async_pool, prewarm_pool
 from slowapi.errors import RateLimitExceeded
 
 from scalar_fastapi import get_scalar_api_reference
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-calentar el pool de conexiones (DB_POOL_PREWARM) antes de recibir tráfico
+    if DB_ASYNC:
+        await prewarm_async_pool()
+    else:
+        await run_in_threadpool(prewarm_pool)
+    await api_key_registry.start()
+    await event_bus.start()
+    await hybrid_limiter.start()
+    if gateway_limiter is not None:
+        await gateway_limiter.start()
+    await idempotency_store.start()
+    await archive_job.start()
+    yield
+    await archive_job.stop()
+    await idempotency_store.stop()
+    if gateway_limiter is not None:
+        await gateway_limiter.stop()
+    await hybrid_limiter.stop()
+    await event_bus.stop()
+    await api_key_registry.stop()
+
+
 app = FastAPI(
     title="Loralink API",
     version="0.1.0",
     description="API de de registro de emergencias LoraLink.",
     docs_url=None,
-    redoc_url=None
+    redoc_url=None,
+    lifespan=lifespan,
 )
 
+# Idempotency-Key en los POST que crean recursos; por dentro del limitador para que
+# los reintentos también cuenten
+app.add_middleware(
+    IdempotencyMiddleware,
+    routes=[("POST", "/emergencies"), ("POST", "/emergencies/batch"), ("POST", "/users")],
+)
+
+# Límites por API key + IP en todas las rutas (los gateways LoRa con los suyos); va por
+# dentro de CORS para que los 429 lleven sus cabeceras
+app.add_middleware(HybridRateLimitMiddleware)
+
+# Latencia, códigos y SQL por ruta; por fuera del limitador para contar también los 429
+app.add_middleware(MetricsMiddleware)
+
 # Add CORS middleware - Allow everything
 app.add_middleware(
     CORSMiddleware,
@@ -26,14 +79,28 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Duplicate-Of", "Idempotent-Replayed"],
 )
 
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
 
+
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    # Avalancha de logins: se rechaza en lugar de encolar trabajo de CPU sin límite
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication service busy, retry later"},
+        headers={"Retry-After": "1"},
+    )
+
 # Registrar routers de features para exponer endpoints y documentarlos
 app.include_router(users_router, dependencies=[Depends(verify_api_key)])
 app.include_router(catalogs_router, dependencies=[Depends(verify_api_key)])
+# El feed valida la API key por su cuenta (cabecera o query param) y va antes que
+# /emergencies/{emergency_id} para que "feed" no se interprete como un ID
+app.include_router(emergencies_feed_router)
 app.include_router(emergencies_router, dependencies=[Depends(verify_api_key)])
 app.include_router(emergency_units_router, dependencies=[Depends(verify_api_key)])
 
@@ -44,4 +111,20 @@ async def scalar_html(request: Request):
     return get_scalar_api_reference(
         openapi_url=app.openapi_url,
         title=app.title,
-    )
\ No newline at end of file
+    )
+
+
+# Telemetría del pool de conexiones de este worker
+@app.get("/metrics/db-pool", include_in_schema=False, dependencies=[Depends(verify_api_key)])
+def db_pool_metrics():
+    return get_pool_stats()
+
+
+# Métricas Prometheus (todas las de src/common/metrics.py, agregadas entre workers).
+# La API key va en X-API-Key o en ?api_key= (Prometheus no siempre puede enviar cabeceras).
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request, api_key: Optional[str] = None):
+    if not is_valid_api_key(request.headers.get("x-api-key") or api_key):
+        return JSONResponse(status_code=401, content={"detail": "Invalid API Key"})
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,93 @@
+"""Registro de API keys: búsqueda por hash, recarga y revocación."""
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from conftest import API_KEY
+from src.auth import api_keys
+from src.auth.api_keys import ApiKeyRegistry, api_key_registry, generate_api_key, hash_api_key
+from src.database.db import engine
+from src.entities import ApiKeys
+
+
+def _create_key(name: str, expires_at: Optional[datetime] = None) -> tuple:
+    api_key = generate_api_key()
+    with Session(engine) as db:
+        row = ApiKeys(name=name, key_hash=hash_api_key(api_key), key_prefix=api_key[:8], expires_at=expires_at)
+        db.add(row)
+        db.commit()
+        return api_key, row.api_key_id
+
+
+def _revoke(api_key_id: int) -> None:
+    with Session(engine) as db:
+        db.get(ApiKeys, api_key_id).revoked_at = datetime.now()
+        db.commit()
+
+
+def test_lookup_by_hash(database: str) -> None:
+    api_key, api_key_id = _create_key("gateway-hash")
+    registry = ApiKeyRegistry()
+    registry.refresh()
+
+    info = registry.lookup(api_key)
+    assert (info.api_key_id, info.name, info.key_prefix) == (api_key_id, "gateway-hash", api_key[:8])
+    # En memoria solo hay hashes, nunca la clave en claro
+    assert hash_api_key(api_key) in registry._keys
+    assert api_key not in registry._keys
+    assert registry.lookup(api_key + "x") is None
+    assert registry.lookup(hash_api_key(api_key)) is None
+    assert registry.lookup(None) is None and registry.lookup("") is None
+    # La clave del entorno sigue valiendo
+    assert registry.lookup(API_KEY).name == "env"
+
+
+def test_expired_key_is_rejected(database: str) -> None:
+    expired, _ = _create_key("gateway-caducada", datetime.now() - timedelta(minutes=1))
+    valid, _ = _create_key("gateway-vigente", datetime.now() + timedelta(days=1))
+    registry = ApiKeyRegistry()
+    registry.refresh()
+    assert registry.lookup(expired) is None
+    assert registry.lookup(valid).name == "gateway-vigente"
+
+
+def test_refresh_applies_new_and_revoked_keys(client: Any) -> None:
+    api_key, api_key_id = _create_key("gateway-rotacion")
+    headers = {"X-API-Key": api_key}
+    # Hasta la siguiente recarga el worker no conoce la clave
+    assert client.get("/users", params={"limit": 1}, headers=headers).status_code == 401
+    api_key_registry.refresh()
+    assert client.get("/users", params={"limit": 1}, headers=headers).status_code == 200
+
+    _revoke(api_key_id)
+    assert client.get("/users", params={"limit": 1}, headers=headers).status_code == 200
+    api_key_registry.refresh()
+    assert client.get("/users", params={"limit": 1}, headers=headers).status_code == 401
+
+
+def test_unknown_key_is_401(client: Any) -> None:
+    response = client.get("/users", params={"limit": 1}, headers={"X-API-Key": generate_api_key()})
+    assert response.status_code == 401
+    assert client.get("/users", params={"limit": 1}).status_code == 401
+
+
+def test_failed_refresh_keeps_previous_keys(database: str, monkeypatch: Any) -> None:
+    api_key, _ = _create_key("gateway-db-caida")
+    registry = ApiKeyRegistry()
+    registry.refresh()
+
+    def broken_session() -> Any:
+        raise OperationalError("SELECT", {}, Exception("db caída"))
+
+    monkeypatch.setattr(api_keys, "SessionLocal", broken_session)
+    registry.refresh()
+    assert registry.lookup(api_key).name == "gateway-db-caida"
+
+    # Sin carga previa solo queda la clave del entorno
+    cold = ApiKeyRegistry()
+    cold.refresh()
+    assert cold.loaded
+    assert cold.lookup(api_key) is None
+    assert cold.lookup(API_KEY).name == "env"
@@ -0,0 +1,112 @@
+"""Emergencias archivadas: lectura transparente y borrado de usuarios y unidades con histórico."""
+from datetime import datetime
+from typing import Any, Dict, List
+
+import pytest
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.orm import Session
+
+from conftest import API_HEADERS, seed_database
+from src.database.db import engine as app_engine
+from src.entities import Emergencies, EmergenciesArchive, EmergenciesArchiveUnitTotals
+from src.features.emergencies import archive
+from src.features.emergency_units.service import delete_emergency_unit
+from src.features.users.service import delete_user
+
+
+def test_delete_user_and_unit_with_archived_emergencies(postgres_url: str) -> None:
+    # SQLite no aplica las claves foráneas: el fallo solo se ve en PostgreSQL
+    engine = create_engine(postgres_url)
+    try:
+        ids = seed_database(engine, 1, 1)
+        with Session(engine) as db:
+            db.execute(
+                update(Emergencies)
+                .where(Emergencies.emergency_id == ids["emergency_id"])
+                .values(status=archive.CLOSED_STATUS)
+            )
+            db.commit()
+            assert archive.archive_closed_emergencies(db, cutoff=datetime(2100, 1, 1)) >= 1
+
+            assert delete_user(db, ids["user_id"])
+            assert delete_emergency_unit(db, ids["unit_id"])
+
+            archived = db.get(EmergenciesArchive, ids["emergency_id"])
+            assert (archived.user_id, archived.assigned_unit) == (None, None)
+            totals = select(EmergenciesArchiveUnitTotals).where(
+                EmergenciesArchiveUnitTotals.emergency_unit_id == ids["unit_id"]
+            )
+            assert db.scalars(totals).first() is None
+    finally:
+        engine.dispose()
+
+
+# Ventana propia: ninguna otra prueba crea emergencias en mayo de 2018
+WINDOW = {"date_from": "2018-05-01T00:00:00", "date_to": "2018-05-02T00:00:00"}
+
+
+@pytest.fixture(scope="module")
+def archived(client: Any, seed: Any) -> Dict[str, int]:
+    """Una emergencia cerrada ya archivada y otra abierta del mismo usuario."""
+    ids = seed(1, 0)
+    created = {"user_id": ids["user_id"]}
+    for name, hour, status in (("archived", 10, archive.CLOSED_STATUS), ("open", 11, 1)):
+        report = {
+            "latitud": 14.6, "longitud": -90.5, "user_id": ids["user_id"], "tipo_accidente": 1,
+            "assigned_unit": ids["unit_id"], "status": status, "timestamp": f"2018-05-01T{hour}:00:00",
+        }
+        response = client.post("/emergencies", json=report, headers=API_HEADERS)
+        assert response.status_code == 201
+        created[name] = response.json()["emergency_id"]
+    with Session(app_engine) as db:
+        assert archive.archive_closed_emergencies(db, cutoff=datetime(2018, 6, 1)) >= 1
+        assert db.get(EmergenciesArchive, created["archived"]) is not None
+    return created
+
+
+def _ids(response: Any) -> List[int]:
+    assert response.status_code == 200, response.text
+    return [row["emergency_id"] for row in response.json()]
+
+
+def test_detail_reads_archived_emergency(client: Any, archived: Dict[str, int]) -> None:
+    path = f"/emergencies/{archived['archived']}"
+    response = client.get(path, headers=API_HEADERS)
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["status"], body["timestamp"]) == (archive.CLOSED_STATUS, "2018-05-01T10:00:00")
+    assert body["user"]["user_id"] == archived["user_id"]
+    assert body["accident_type"] is not None and body["assigned_unit_rel"] is not None
+
+    cached = client.get(path, headers={**API_HEADERS, "If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304
+    # De solo lectura: las escrituras no la encuentran
+    assert client.put(path, json={"status": 1}, headers=API_HEADERS).status_code == 404
+
+
+def test_list_includes_archived_on_request(client: Any, archived: Dict[str, int]) -> None:
+    assert _ids(client.get("/emergencies", params=WINDOW, headers=API_HEADERS)) == [archived["open"]]
+    params = {**WINDOW, "include_archived": "true"}
+    assert _ids(client.get("/emergencies", params=params, headers=API_HEADERS)) == [
+        archived["open"], archived["archived"]
+    ]
+    # Un estado activo nunca está en el archivo
+    active = {**params, "status_filter": 1}
+    assert _ids(client.get("/emergencies", params=active, headers=API_HEADERS)) == [archived["open"]]
+
+    # El cursor recorre las dos tablas mezcladas
+    first = client.get("/emergencies", params={**params, "limit": 1}, headers=API_HEADERS)
+    assert _ids(first) == [archived["open"]]
+    second = client.get(
+        "/emergencies", params={**params, "limit": 1, "cursor": first.headers["X-Next-Cursor"]}, headers=API_HEADERS
+    )
+    assert _ids(second) == [archived["archived"]]
+    assert "X-Next-Cursor" not in second.headers
+
+
+def test_by_user_includes_archived_on_request(client: Any, archived: Dict[str, int]) -> None:
+    path = f"/emergencies/user/{archived['user_id']}"
+    assert _ids(client.get(path, headers=API_HEADERS)) == [archived["open"]]
+    assert _ids(client.get(path, params={"include_archived": "true"}, headers=API_HEADERS)) == [
+        archived["open"], archived["archived"]
+    ]
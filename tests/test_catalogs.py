@@ -0,0 +1,85 @@
+"""Caché de catálogos: sin sesión en los aciertos, una carga por catálogo, invalidación por catálogo."""
+import asyncio
+from typing import Any, List
+
+from pydantic import BaseModel
+
+from conftest import API_HEADERS
+from src.features.catalogs import controller as catalogs_controller
+from src.features.catalogs.cache import CatalogCache
+
+
+class Item(BaseModel):
+    item_id: int
+    name: str
+
+
+ITEMS = [Item(item_id=1, name="uno"), Item(item_id=2, name="dos")]
+
+
+def test_cache_hit_opens_no_session(client: Any, seed: Any, monkeypatch: Any) -> None:
+    seed(1, 0)
+    warm = client.get("/catalogs/accident-types", headers=API_HEADERS)
+    assert warm.status_code == 200
+
+    def no_session(*args: Any, **kwargs: Any) -> Any:
+        raise AssertionError("un acierto de caché no debe abrir sesión")
+
+    monkeypatch.setattr(catalogs_controller, "run_in_session", no_session)
+    hit = client.get("/catalogs/accident-types", headers=API_HEADERS)
+    assert hit.status_code == 200
+    assert hit.content == warm.content
+    item = client.get("/catalogs/accident-types/1", headers=API_HEADERS)
+    assert item.status_code == 200
+
+
+def test_concurrent_misses_run_one_load() -> None:
+    cache = CatalogCache(ttl=60)
+    loads: List[int] = []
+
+    async def load() -> Any:
+        generation = cache.generation("items")
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return cache.store("items", ITEMS, "item_id", generation)
+
+    async def main() -> List[Any]:
+        return await asyncio.gather(*(cache.get_or_load("items", load) for _ in range(10)))
+
+    results = asyncio.run(main())
+    assert len(loads) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.get("items") is results[0]
+
+
+def test_failed_load_is_shared_and_not_cached() -> None:
+    cache = CatalogCache(ttl=60)
+
+    async def load() -> Any:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db caída")
+
+    async def main() -> List[Any]:
+        return await asyncio.gather(*(cache.get_or_load("items", load) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.get("items") is None
+
+
+def test_invalidation_only_discards_loads_of_that_catalog() -> None:
+    cache = CatalogCache(ttl=60)
+    items_generation = cache.generation("items")
+    cache.invalidate("other")
+    cache.store("items", ITEMS, "item_id", items_generation)
+    assert cache.get("items") is not None
+
+    stale_generation = cache.generation("items")
+    cache.invalidate("items")
+    cache.store("items", ITEMS, "item_id", stale_generation)
+    assert cache.get("items") is None
+
+    global_generation = cache.generation("items")
+    cache.invalidate()
+    cache.store("items", ITEMS, "item_id", global_generation)
+    assert cache.get("items") is None
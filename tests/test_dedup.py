@@ -0,0 +1,83 @@
+"""Retransmisiones LoRa: nunca se pliegan en una emergencia cerrada."""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from conftest import API_HEADERS
+from src.database.db import engine
+from src.entities import Emergencies
+from src.features.emergencies import archive, dedup
+
+
+def _report(ids: Dict[str, Any], timestamp: datetime, latitud: float) -> Dict[str, Any]:
+    return {"latitud": latitud, "longitud": -89.5, "user_id": ids["user_id"], "timestamp": timestamp.isoformat()}
+
+
+@pytest.mark.parametrize("from_memory", [True, False], ids=["memoria", "base de datos"])
+def test_retransmission_after_close_creates_new_emergency(
+    client: Any, seed: Any, monkeypatch: Any, from_memory: bool
+) -> None:
+    ids = seed(1, 0)
+    report = _report(ids, datetime.now().replace(microsecond=0), 12.0 + from_memory)
+    first = client.post("/emergencies", json=report, headers=API_HEADERS)
+    assert first.status_code == 201
+    duplicate = client.post("/emergencies", json=report, headers=API_HEADERS)
+    assert duplicate.headers["X-Duplicate-Of"] == str(first.json()["emergency_id"])
+
+    path = f"/emergencies/{first.json()['emergency_id']}"
+    assert client.put(path, json={"status": archive.CLOSED_STATUS}, headers=API_HEADERS).status_code == 200
+    if not from_memory:
+        # Como si la cerrara otro worker: este no sabe del cierre y consulta la tabla
+        monkeypatch.setattr(dedup, "recent_reports", dedup.RecentReports())
+
+    late = client.post("/emergencies", json=report, headers=API_HEADERS)
+    assert late.status_code == 201
+    assert "X-Duplicate-Of" not in late.headers
+    assert late.json()["emergency_id"] != first.json()["emergency_id"]
+
+
+@pytest.mark.parametrize("batch", [False, True], ids=["individual", "lote"])
+def test_stale_memory_entry_of_closed_emergency_is_a_miss(client: Any, seed: Any, batch: bool) -> None:
+    ids = seed(1, 0)
+    report = _report(ids, datetime.now().replace(microsecond=0), 10.0 + batch)
+    first = client.post("/emergencies", json=report, headers=API_HEADERS).json()["emergency_id"]
+    # La cierra otro worker: el índice en memoria de este sigue apuntando a ella
+    with Session(engine) as db:
+        db.execute(update(Emergencies).where(Emergencies.emergency_id == first).values(status=archive.CLOSED_STATUS))
+        db.commit()
+    assert dedup.recent_reports.find(ids["user_id"], dedup._epoch(datetime.fromisoformat(report["timestamp"])),
+                                     report["latitud"], report["longitud"]) == first
+
+    if batch:
+        result = client.post("/emergencies/batch", json=[report, report], headers=API_HEADERS).json()
+        assert (result["inserted"], result["duplicates"]) == (1, 1)
+        created = result["results"][0]["emergency_id"]
+        assert result["results"][1]["emergency_id"] == created
+    else:
+        late = client.post("/emergencies", json=report, headers=API_HEADERS)
+        assert late.status_code == 201
+        assert "X-Duplicate-Of" not in late.headers
+        created = late.json()["emergency_id"]
+    assert created != first
+    # La entrada obsoleta se olvida y la nueva emergencia ocupa su lugar
+    again = client.post("/emergencies", json=report, headers=API_HEADERS)
+    assert again.headers["X-Duplicate-Of"] == str(created)
+
+
+def test_created_closed_emergency_is_not_remembered(client: Any, seed: Any) -> None:
+    ids = seed(1, 0)
+    report = _report(ids, datetime.now().replace(microsecond=0), 11.0)
+    first = client.post("/emergencies", json={**report, "status": archive.CLOSED_STATUS}, headers=API_HEADERS)
+    second = client.post("/emergencies", json=report, headers=API_HEADERS)
+    assert (first.status_code, second.status_code) == (201, 201)
+
+
+def test_epoch_normalizes_aware_timestamps() -> None:
+    aware = datetime(2025, 3, 1, 10, 0, tzinfo=timezone(timedelta(hours=-6)))
+    local = aware.astimezone().replace(tzinfo=None)
+    assert dedup._local(aware) == local
+    assert dedup._local(local) is local
+    assert dedup._epoch(aware) == dedup._epoch(local) == aware.timestamp()
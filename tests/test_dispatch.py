@@ -0,0 +1,103 @@
+"""Las asignaciones manuales toman el mismo bloqueo de filas de unidad que el despacho automático."""
+from typing import Any, Dict, List
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from conftest import API_HEADERS
+from src.features.emergencies import dispatch
+from src.features.emergencies import service as emergencies_service
+
+
+@pytest.fixture()
+def locked(monkeypatch: Any) -> List[List[int]]:
+    """IDs de unidad que cada llamada a lock_units ha bloqueado."""
+    calls: List[List[int]] = []
+
+    def spy(db: Any, unit_ids: Any) -> List[int]:
+        result = dispatch.lock_units(db, unit_ids)
+        calls.append(result)
+        return result
+
+    monkeypatch.setattr(emergencies_service, "lock_units", spy)
+    return calls
+
+
+def test_lock_units_is_for_update_in_id_order() -> None:
+    statements: List[Any] = []
+
+    class Db:
+        def execute(self, stmt: Any) -> Any:
+            statements.append(stmt)
+            return self
+
+        def scalars(self) -> Any:
+            return self
+
+        def all(self) -> List[int]:
+            return []
+
+    assert dispatch.lock_units(Db(), [None]) == []
+    assert statements == []
+    dispatch.lock_units(Db(), [7, None, 3, 7])
+    sql = str(statements[0].compile(dialect=postgresql.dialect()))
+    assert sql.rstrip().endswith("FOR UPDATE")
+    assert "ORDER BY emergency_unit.emergency_unit_id" in sql
+
+
+def test_manual_assignment_locks_old_and_new_unit(
+    client: Any, seed: Any, locked: List[List[int]]
+) -> None:
+    ids: Dict[str, Any] = seed(2, 1)
+    path = f"/emergencies/{ids['emergency_id']}"
+    old_unit = client.get(path, headers=API_HEADERS).json()["assigned_unit"]
+    new_unit = ids["other_unit_id"] if old_unit != ids["other_unit_id"] else ids["unit_id"]
+
+    response = client.put(f"{path}/assign-unit", params={"unit_id": new_unit}, headers=API_HEADERS)
+    assert response.status_code == 200
+    assert locked[-1] == sorted({old_unit, new_unit})
+
+    # Un cambio de estado también mueve la carga de la unidad
+    response = client.put(path, json={"status": 3}, headers=API_HEADERS)
+    assert response.status_code == 200
+    assert locked[-1] == [new_unit]
+
+    response = client.put(path, json={"assigned_unit": old_unit}, headers=API_HEADERS)
+    assert response.status_code == 200
+    assert locked[-1] == sorted({old_unit, new_unit})
+
+
+def test_batch_auto_dispatch_counts_rows_of_the_same_batch(
+    client: Any, seed: Any, monkeypatch: Any
+) -> None:
+    ids: Dict[str, Any] = seed(1, 0)
+    # Dos unidades sin carga lejos del resto; la carga pesa más que la distancia
+    monkeypatch.setattr(dispatch, "DISPATCH_LOAD_PENALTY_KM", 1000.0)
+    units = [
+        client.post("/emergency-units", json={"name": f"Despacho lote {i}", "latitud": -33.45 + i / 100,
+                                               "longitud": -70.66}, headers=API_HEADERS).json()
+        for i in range(2)
+    ]
+    near, far = (unit["emergency_unit_id"] for unit in units)
+    report = {"latitud": -33.45, "longitud": -70.66, "user_id": ids["user_id"]}
+    items = [
+        report,
+        # Otro punto para que no sea una retransmisión del primero
+        {**report, "latitud": -33.449},
+        {**report, "latitud": -33.448, "status": 3},
+        {**report, "latitud": -33.447, "assigned_unit": far},
+    ]
+    response = client.post("/emergencies/batch", json=items, params={"auto_dispatch": "true"}, headers=API_HEADERS)
+    assert response.status_code == 200
+    created = [result["emergency_id"] for result in response.json()["results"]]
+    assigned = [
+        client.get(f"/emergencies/{emergency_id}", headers=API_HEADERS).json()["assigned_unit"]
+        for emergency_id in created
+    ]
+    # La segunda fila ve la primera ya asignada a la unidad cercana; la cerrada no se despacha
+    assert assigned == [near, far, None, far]
+
+    # Sin el parámetro manda AUTO_DISPATCH (desactivado en los tests)
+    response = client.post("/emergencies/batch", json=[{**report, "latitud": -33.446}], headers=API_HEADERS)
+    emergency_id = response.json()["results"][0]["emergency_id"]
+    assert client.get(f"/emergencies/{emergency_id}", headers=API_HEADERS).json()["assigned_unit"] is None
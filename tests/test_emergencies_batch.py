@@ -0,0 +1,58 @@
+"""POST /emergencies/batch: un INSERT fallido solo afecta a sus filas."""
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from conftest import API_HEADERS
+from src.database import db as database
+
+
+@contextmanager
+def failing_insert() -> Iterator[None]:
+    """Hace fallar el INSERT multi-fila de emergencias en el engine de la app."""
+    engines = [database.engine]
+    if database.async_engine is not None:
+        engines.append(database.async_engine.sync_engine)
+
+    def fail(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO EMERGENCIES "):
+            raise OperationalError(statement, parameters, Exception("conexión perdida"))
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", fail)
+    try:
+        yield
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", fail)
+
+
+def test_failed_insert_keeps_per_item_results(client: Any, seed: Any) -> None:
+    ids = seed(1, 1)
+    stored = client.get(f"/emergencies/{ids['emergency_id']}", headers=API_HEADERS).json()
+    new = {"latitud": 13.9, "longitud": -89.1, "user_id": ids["user_id"], "timestamp": "2025-03-01T10:00:00"}
+    items = [
+        {"latitud": 95.0, "longitud": -90.5},
+        {"latitud": 14.6, "longitud": -90.5, "user_id": 999999},
+        # Retransmisión de una emergencia ya guardada: no forma parte del INSERT
+        {key: stored[key] for key in ("latitud", "longitud", "user_id", "timestamp")},
+        new,
+        # Copia de `new` dentro del lote: depende de la fila que no se insertó
+        new,
+        {"latitud": "no es un número"},
+    ]
+
+    with failing_insert():
+        response = client.post("/emergencies/batch", json=items, headers=API_HEADERS)
+    assert response.status_code == 200
+    body = response.json()
+    results = body["results"]
+    assert results[0]["error"] == "Coordinates out of range"
+    assert results[1]["error"] == "User 999999 not found"
+    assert results[2]["ok"] and results[2]["duplicate"]
+    assert results[2]["emergency_id"] == ids["emergency_id"]
+    assert [result["error"] for result in results[3:5]] == ["Insert failed", "Insert failed"]
+    assert not results[5]["ok"] and results[5]["error"] != "Insert failed"
+    assert (body["inserted"], body["duplicates"], body["failed"]) == (0, 1, 5)
@@ -0,0 +1,101 @@
+"""ETag de los recursos de detalle: revalidación con la versión de las filas, sin cargar ni serializar."""
+from datetime import datetime
+from typing import Any, Dict
+
+import pytest
+from sqlalchemy.orm import Session
+
+from conftest import API_HEADERS
+from test_query_budgets import QueryCounter
+from src.database.db import engine
+from src.features.emergencies import archive
+from src.features.emergencies import controller as emergencies_controller
+from src.features.emergency_units import controller as units_controller
+from src.features.users import controller as users_controller
+
+
+@pytest.fixture(scope="module")
+def ids(seed: Any) -> Dict[str, Any]:
+    return seed(2, 1)
+
+
+def _etag(client: Any, path: str) -> str:
+    response = client.get(path, headers=API_HEADERS)
+    assert response.status_code == 200, response.text[:200]
+    return response.headers["ETag"]
+
+
+def _revalidate(client: Any, path: str, etag: str) -> Any:
+    return client.get(path, headers={**API_HEADERS, "If-None-Match": etag})
+
+
+@pytest.mark.parametrize("path, controller", [
+    ("/emergencies/{emergency_id}", emergencies_controller),
+    ("/users/{user_id}", users_controller),
+    ("/emergency-units/{unit_id}", units_controller),
+])
+def test_not_modified_skips_load_and_serialization(
+    client: Any, ids: Dict[str, Any], monkeypatch: Any, path: str, controller: Any
+) -> None:
+    path = path.format(**ids)
+    etag = _etag(client, path)
+
+    def no_dump(*args: Any, **kwargs: Any) -> Any:
+        raise AssertionError("un 304 no debe serializar el recurso")
+
+    monkeypatch.setattr(controller, "dump_model", no_dump)
+    response, recorded, _ = QueryCounter(client).request("GET", path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert recorded == 1
+
+
+def test_unknown_resource_with_if_none_match_is_404(client: Any, ids: Dict[str, Any]) -> None:
+    for path in ("/emergencies/999999", "/users/999999", "/emergency-units/999999"):
+        assert _revalidate(client, path, '"x"').status_code == 404
+
+
+def test_emergency_etag_follows_its_rows(client: Any, ids: Dict[str, Any]) -> None:
+    path = f"/emergencies/{ids['emergency_id']}"
+    etags = [_etag(client, path)]
+
+    client.put(path, json={"status": 2}, headers=API_HEADERS)
+    etags.append(_etag(client, path))
+    # La unidad y el usuario embebidos también forman parte del cuerpo
+    unit_id = client.get(path, headers=API_HEADERS).json()["assigned_unit"]
+    client.put(f"/emergency-units/{unit_id}", json={"latitud": 14.7}, headers=API_HEADERS)
+    etags.append(_etag(client, path))
+    client.put(f"/users/{ids['user_id']}", json={"name": "Otro nombre"}, headers=API_HEADERS)
+    etags.append(_etag(client, path))
+
+    assert len(set(etags)) == len(etags)
+    assert _revalidate(client, path, etags[-1]).status_code == 304
+    # Un ETag anterior ya no vale: se envía el cuerpo nuevo con el ETag actual
+    stale = _revalidate(client, path, etags[0])
+    assert stale.status_code == 200
+    assert stale.headers["ETag"] == etags[-1]
+    assert stale.json()["user"]["name"] == "Otro nombre"
+
+
+def test_user_and_unit_etags_change_on_update(client: Any, ids: Dict[str, Any]) -> None:
+    for path, change in (
+        (f"/users/{ids['user_id']}", {"name": "Cambio de ETag"}),
+        (f"/emergency-units/{ids['unit_id']}", {"longitud": -90.6}),
+    ):
+        before = _etag(client, path)
+        assert client.put(path, json=change, headers=API_HEADERS).status_code == 200
+        after = _etag(client, path)
+        assert after != before
+        assert _revalidate(client, path, before).status_code == 200
+        assert _revalidate(client, path, after).status_code == 304
+
+
+def test_archived_emergency_revalidates(client: Any, ids: Dict[str, Any]) -> None:
+    path = f"/emergencies/{ids['emergency_id']}"
+    client.put(path, json={"status": archive.CLOSED_STATUS}, headers=API_HEADERS)
+    active = _etag(client, path)
+    with Session(engine) as db:
+        assert archive.archive_closed_emergencies(db, cutoff=datetime(2100, 1, 1)) >= 1
+    # El archivado copia la versión: el cuerpo no cambia y el ETag tampoco
+    assert _etag(client, path) == active
+    assert _revalidate(client, path, active).status_code == 304
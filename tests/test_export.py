@@ -0,0 +1,83 @@
+"""GET /emergencies/export: NDJSON y CSV en streaming, con y sin emergencias archivadas."""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, List
+
+import pytest
+from sqlalchemy.orm import Session
+
+from conftest import API_HEADERS
+from src.database.db import engine
+from src.features.emergencies import archive
+from src.features.emergencies.export import EXPORT_COLUMNS
+
+# Ventana propia: ninguna otra prueba crea emergencias en mayo de 2019
+WINDOW = {"date_from": "2019-05-01T00:00:00", "date_to": "2019-05-02T00:00:00"}
+
+
+@pytest.fixture(scope="module")
+def exported(client: Any, seed: Any) -> Dict[str, int]:
+    """Tres emergencias en WINDOW; la primera, cerrada, pasa a emergencies_archive."""
+    ids = seed(1, 0)
+    created = {}
+    for name, minute, status in (("archived", 0, archive.CLOSED_STATUS), ("open", 5, 1), ("closed", 10, 3)):
+        report = {
+            "latitud": 14.6, "longitud": -90.5 + minute / 100, "user_id": ids["user_id"], "tipo_accidente": 1,
+            "assigned_unit": ids["unit_id"], "status": status, "timestamp": f"2019-05-01T10:{minute:02d}:00",
+        }
+        response = client.post("/emergencies", json=report, headers=API_HEADERS)
+        assert response.status_code == 201
+        created[name] = response.json()["emergency_id"]
+    with Session(engine) as db:
+        # Solo hasta el minuto 5: la segunda cerrada sigue en la tabla activa
+        assert archive.archive_closed_emergencies(db, cutoff=datetime(2019, 5, 1, 10, 5)) == 1
+    return created
+
+
+def _ndjson(client: Any, **params: Any) -> List[Dict[str, Any]]:
+    response = client.get("/emergencies/export", params={**WINDOW, **params}, headers=API_HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_ndjson_includes_archived_by_default(client: Any, exported: Dict[str, int]) -> None:
+    rows = _ndjson(client)
+    assert [row["emergency_id"] for row in rows] == [exported["archived"], exported["open"], exported["closed"]]
+    first = rows[0]
+    assert first["timestamp"] == "2019-05-01T10:00:00"
+    assert (first["latitud"], first["longitud"], first["status"]) == (14.6, -90.5, archive.CLOSED_STATUS)
+    assert tuple(first) == EXPORT_COLUMNS
+
+
+def test_ndjson_without_archived(client: Any, exported: Dict[str, int]) -> None:
+    rows = _ndjson(client, include_archived="false")
+    assert [row["emergency_id"] for row in rows] == [exported["open"], exported["closed"]]
+
+
+def test_status_filter_reads_both_tables(client: Any, exported: Dict[str, int]) -> None:
+    rows = _ndjson(client, status_filter=archive.CLOSED_STATUS)
+    assert [row["emergency_id"] for row in rows] == [exported["archived"], exported["closed"]]
+    # Un estado activo nunca está en el archivo
+    assert [row["emergency_id"] for row in _ndjson(client, status_filter=1)] == [exported["open"]]
+
+
+def test_csv_export(client: Any, exported: Dict[str, int]) -> None:
+    response = client.get("/emergencies/export", params={**WINDOW, "format": "csv"}, headers=API_HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="emergencies.csv"' in response.headers["content-disposition"]
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert tuple(rows[0]) == EXPORT_COLUMNS
+    assert [int(row[0]) for row in rows[1:]] == [exported["archived"], exported["open"], exported["closed"]]
+    assert rows[1][1] == "2019-05-01T10:00:00"
+
+
+def test_empty_export_and_invalid_format(client: Any, exported: Dict[str, int]) -> None:
+    empty = {"date_from": "2019-04-01T00:00:00", "date_to": "2019-04-02T00:00:00"}
+    assert client.get("/emergencies/export", params=empty, headers=API_HEADERS).content == b""
+    csv_empty = client.get("/emergencies/export", params={**empty, "format": "csv"}, headers=API_HEADERS)
+    assert csv_empty.text.splitlines() == [",".join(EXPORT_COLUMNS)]
+    assert client.get("/emergencies/export", params={"format": "xml"}, headers=API_HEADERS).status_code == 422
@@ -0,0 +1,87 @@
+"""Feed en tiempo real: eventos de emergencias por WebSocket y SSE."""
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from conftest import API_HEADERS, API_KEY
+from src.common.event_bus import EventBus
+from src.features.emergencies import feed
+
+
+def test_websocket_receives_emergency_events(client: Any, seed: Any) -> None:
+    ids = seed(1, 0)
+    report = {"latitud": 15.2, "longitud": -89.2, "user_id": ids["user_id"], "status": 1}
+    with client.websocket_connect(f"/emergencies/feed/ws?api_key={API_KEY}") as websocket:
+        created = client.post("/emergencies", json=report, headers=API_HEADERS).json()
+        event = websocket.receive_json()
+        assert event["type"] == "emergency.created"
+        assert event["data"]["emergency_id"] == created["emergency_id"]
+        assert (event["data"]["latitud"], event["data"]["status"]) == (15.2, 1)
+
+        path = f"/emergencies/{created['emergency_id']}"
+        client.put(path, json={"status": 2}, headers=API_HEADERS)
+        event = websocket.receive_json()
+        assert event["type"] == "emergency.status_changed"
+        assert (event["data"]["status"], event["data"]["previous_status"]) == (2, 1)
+
+        client.put(f"{path}/assign-unit", params={"unit_id": ids["unit_id"]}, headers=API_HEADERS)
+        event = websocket.receive_json()
+        assert event["type"] == "emergency.assigned"
+        assert event["data"]["assigned_unit"] == ids["unit_id"]
+
+
+def test_websocket_status_filter(client: Any, seed: Any) -> None:
+    ids = seed(1, 0)
+    report = {"latitud": 15.3, "longitud": -89.3, "user_id": ids["user_id"], "status": 1}
+    with client.websocket_connect("/emergencies/feed/ws?status_filter=3", headers=API_HEADERS) as websocket:
+        created = client.post("/emergencies", json=report, headers=API_HEADERS).json()
+        client.put(f"/emergencies/{created['emergency_id']}", json={"status": 3}, headers=API_HEADERS)
+        # El evento de creación (estado 1) no pasa el filtro: el primero que llega es el cierre
+        event = websocket.receive_json()
+        assert event["type"] == "emergency.status_changed"
+        assert event["data"]["emergency_id"] == created["emergency_id"]
+
+
+def test_websocket_rejects_invalid_key(client: Any) -> None:
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        with client.websocket_connect("/emergencies/feed/ws?api_key=incorrecta") as websocket:
+            websocket.receive_json()
+    assert excinfo.value.code == 1008
+
+
+def test_sse_requires_api_key(client: Any) -> None:
+    assert client.get("/emergencies/feed").status_code == 401
+    assert client.get("/emergencies/feed", params={"api_key": "incorrecta"}).status_code == 401
+
+
+class FakeRequest:
+    def __init__(self, headers: Dict[str, str]) -> None:
+        self.headers = headers
+
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def test_sse_streams_filtered_events(monkeypatch: Any) -> None:
+    async def main() -> List[str]:
+        bus = EventBus()
+        await bus.start()
+        monkeypatch.setattr(feed, "event_bus", bus)
+        response = await feed.emergency_feed_sse(FakeRequest({}), api_key=API_KEY, status_filter=3)
+        assert response.media_type == "text/event-stream"
+        stream = response.body_iterator
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.01)  # el generador ya está suscrito
+        bus.publish("emergency.created", {"emergency_id": 1, "status": 1})
+        bus.publish("emergency.status_changed", {"emergency_id": 1, "status": 3, "previous_status": 1})
+        chunks = [await asyncio.wait_for(first, 1)]
+        await stream.aclose()
+        await bus.stop()
+        return chunks
+
+    (chunk,) = asyncio.run(main())
+    assert chunk.startswith("event: emergency.status_changed\ndata: {")
+    assert chunk.endswith("\n\n")
+    assert '"previous_status":1' in chunk
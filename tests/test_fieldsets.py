@@ -0,0 +1,76 @@
+"""fields= y expand= en los listados de emergencias y usuarios."""
+from typing import Any, Dict, List
+
+import pytest
+
+from conftest import API_HEADERS
+
+
+def _get(client: Any, path: str, **params: Any) -> List[Dict[str, Any]]:
+    response = client.get(path, params={"limit": 5, **params}, headers=API_HEADERS)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_emergency_fields_match_full_response(client: Any, seed: Any) -> None:
+    seed(2, 3)
+    full = _get(client, "/emergencies")
+    sparse = _get(client, "/emergencies", fields="emergency_id,latitud,longitud,status")
+    assert [list(row) for row in sparse] == [["emergency_id", "latitud", "longitud", "status"]] * len(full)
+    assert sparse == [
+        {key: row[key] for key in ("emergency_id", "latitud", "longitud", "status")} for row in full
+    ]
+
+
+def test_emergency_relation_in_fields_is_expanded(client: Any, seed: Any) -> None:
+    seed(1, 2)
+    full = _get(client, "/emergencies")
+    rows = _get(client, "/emergencies", fields="emergency_id,user")
+    assert rows == [{"emergency_id": row["emergency_id"], "user": row["user"]} for row in full]
+    assert all(row["user"] is not None for row in rows)
+
+
+def test_emergency_expand_without_fields(client: Any, seed: Any) -> None:
+    seed(1, 2)
+    full = _get(client, "/emergencies")
+    rows = _get(client, "/emergencies", expand="assigned_unit_rel")
+    # Todas las columnas y solo la relación pedida
+    scalars = [key for key in full[0] if key not in ("accident_type", "assigned_unit_rel", "user")]
+    assert list(rows[0]) == scalars + ["assigned_unit_rel"]
+    assert rows == [{key: row[key] for key in scalars + ["assigned_unit_rel"]} for row in full]
+
+
+@pytest.mark.parametrize("params, unknown", [
+    ({"fields": "emergency_id,password"}, "password"),
+    ({"fields": "emergency_id", "expand": "latitud"}, "latitud"),
+    ({"expand": "user,contacts"}, "contacts"),
+])
+def test_emergency_unknown_fields_are_rejected(client: Any, params: Dict[str, str], unknown: str) -> None:
+    response = client.get("/emergencies", params=params, headers=API_HEADERS)
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Unknown field(s): {unknown}"
+
+
+def test_user_fields_and_expand(client: Any, seed: Any) -> None:
+    seed(2, 0)
+    full = _get(client, "/users")
+    assert _get(client, "/users", fields="user_id,name") == [
+        {"user_id": row["user_id"], "name": row["name"]} for row in full
+    ]
+    rows = _get(client, "/users", fields="user_id", expand="conditions")
+    assert rows == [{"user_id": row["user_id"], "conditions": row["conditions"]} for row in full]
+    # La contraseña no es un campo de UserOut
+    response = client.get("/users", params={"fields": "user_id,password"}, headers=API_HEADERS)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown field(s): password"
+
+
+def test_sparse_list_keeps_cursor(client: Any, seed: Any) -> None:
+    seed(2, 3)
+    first = client.get("/emergencies", params={"limit": 2, "fields": "emergency_id"}, headers=API_HEADERS)
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get(
+        "/emergencies", params={"limit": 2, "fields": "emergency_id", "cursor": cursor}, headers=API_HEADERS
+    )
+    full = _get(client, "/emergencies", limit=4)
+    assert [row["emergency_id"] for row in first.json() + second.json()] == [row["emergency_id"] for row in full]
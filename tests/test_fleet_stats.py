@@ -0,0 +1,55 @@
+"""Estadísticas de la flota: las escrituras de emergencias de este worker invalidan la caché."""
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy.orm import Session
+
+from conftest import API_HEADERS
+from src.database.db import engine
+from src.features.emergencies import archive
+from src.features.emergency_units.service import invalidate_fleet_stats
+
+
+def _unit_stats(client: Any, unit_id: int) -> Dict[str, Any]:
+    response = client.get(f"/emergency-units/{unit_id}/stats", headers=API_HEADERS)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_emergency_writes_refresh_fleet_stats(client: Any, seed: Any) -> None:
+    ids = seed(2, 0)
+    # La siembra escribe directamente en la base, sin pasar por los servicios
+    invalidate_fleet_stats()
+    unit_id, other_unit_id = ids["unit_id"], ids["other_unit_id"]
+    before = _unit_stats(client, unit_id)
+    assert datetime.fromisoformat(before["as_of"]) <= datetime.now()
+
+    report = {"latitud": 14.6, "longitud": -90.5, "user_id": ids["user_id"], "assigned_unit": unit_id}
+    created = client.post("/emergencies", json=report, headers=API_HEADERS).json()
+    stats = _unit_stats(client, unit_id)
+    assert (stats["active_emergencies"], stats["total_emergencies"]) == (
+        before["active_emergencies"] + 1, before["total_emergencies"] + 1
+    )
+    assert stats["as_of"] >= before["as_of"]
+
+    path = f"/emergencies/{created['emergency_id']}"
+    client.put(f"{path}/assign-unit", params={"unit_id": other_unit_id}, headers=API_HEADERS)
+    assert _unit_stats(client, unit_id)["active_emergencies"] == before["active_emergencies"]
+    assert _unit_stats(client, other_unit_id)["active_emergencies"] >= 1
+
+    other = _unit_stats(client, other_unit_id)
+    client.put(path, json={"status": archive.CLOSED_STATUS}, headers=API_HEADERS)
+    closed = _unit_stats(client, other_unit_id)
+    assert closed["active_emergencies"] == other["active_emergencies"] - 1
+
+    batch = [{**report, "latitud": 10.0 + i, "assigned_unit": other_unit_id} for i in range(2)]
+    assert client.post("/emergencies/batch", json=batch, headers=API_HEADERS).json()["inserted"] == 2
+    assert _unit_stats(client, other_unit_id)["total_emergencies"] == closed["total_emergencies"] + 2
+
+    # Archivar mueve los contadores a emergencies_archive_unit_totals: el total se mantiene
+    client.get("/emergency-units/stats", headers=API_HEADERS)
+    with Session(engine) as db:
+        assert archive.archive_closed_emergencies(db, cutoff=datetime(2100, 1, 1)) >= 1
+    archived = _unit_stats(client, other_unit_id)
+    assert archived["total_emergencies"] == closed["total_emergencies"] + 2
+    assert archived["as_of"] > closed["as_of"]
@@ -0,0 +1,20 @@
+"""Mapa de calor: los aciertos de caché no abren sesión."""
+from typing import Any
+
+from conftest import API_HEADERS
+from src.features.emergencies import controller as emergencies_controller
+
+
+def test_cache_hit_opens_no_session(client: Any, seed: Any, monkeypatch: Any) -> None:
+    seed(1, 1)
+    params = {"cell_size": 0.5, "date_from": "2024-01-01T00:00:00", "date_to": "2024-02-01T00:00:00"}
+    warm = client.get("/emergencies/heatmap", params=params, headers=API_HEADERS)
+    assert warm.status_code == 200
+
+    def no_session(*args: Any, **kwargs: Any) -> Any:
+        raise AssertionError("un acierto de caché no debe abrir sesión")
+
+    monkeypatch.setattr(emergencies_controller, "run_in_session", no_session)
+    hit = client.get("/emergencies/heatmap", params=params, headers=API_HEADERS)
+    assert hit.status_code == 200
+    assert hit.content == warm.content
@@ -0,0 +1,103 @@
+"""Idempotency-Key: fallos de Redis y límite de claves en memoria."""
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from src.common import idempotency
+from src.common.idempotency import (
+    CLAIMED,
+    DONE,
+    PENDING,
+    IdempotencyMiddleware,
+    IdempotencyStore,
+    StoredResponse,
+)
+
+RESPONSE = StoredResponse(201, [(b"content-type", b"application/json")], b"{}")
+
+
+class FakeRedis:
+    """set/get/delete de redis.asyncio; con fail_on los comandos indicados fallan."""
+
+    def __init__(self, *fail_on: str) -> None:
+        self.values: Dict[str, Any] = {}
+        self.fail_on = set(fail_on)
+
+    def _check(self, command: str) -> None:
+        if command in self.fail_on:
+            raise ConnectionError("redis caído")
+
+    async def set(self, key: str, value: Any, nx: bool = False, ex: Optional[int] = None) -> bool:
+        self._check("set_nx" if nx else "set")
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    async def get(self, key: str) -> Any:
+        self._check("get")
+        return self.values.get(key)
+
+    async def delete(self, key: str) -> None:
+        self._check("delete")
+        self.values.pop(key, None)
+
+
+def test_failed_save_releases_the_claim() -> None:
+    store = IdempotencyStore()
+    store._redis = FakeRedis("set")
+
+    async def main() -> List[str]:
+        first, _, _ = await store.claim("clave", "huella")
+        await store.save("clave", "huella", RESPONSE)
+        retry, _, _ = await store.claim("clave", "huella")
+        return [first, retry]
+
+    assert asyncio.run(main()) == [CLAIMED, CLAIMED]
+
+
+def test_redis_claim_error_fails_closed() -> None:
+    store = IdempotencyStore()
+    store._redis = FakeRedis("set_nx")
+    calls: List[str] = []
+    sent: List[Dict[str, Any]] = []
+
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        calls.append(scope["path"])
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/emergencies", "query_string": b"",
+        "headers": [(b"idempotency-key", b"reintento-1")],
+    }
+    middleware = IdempotencyMiddleware(app, routes=[("POST", "/emergencies")], store=store)
+    asyncio.run(middleware(scope, receive, send))
+    assert calls == []
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", b"1") in sent[0]["headers"]
+    assert store._entries == {}
+
+
+def test_memory_store_is_bounded(monkeypatch: Any) -> None:
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_MAX_ENTRIES", 3)
+    store = IdempotencyStore()
+
+    async def main() -> None:
+        for key in ("a", "b", "c"):
+            await store.claim(key, "huella")
+        await store.save("b", "huella", RESPONSE)
+        await store.save("c", "huella", RESPONSE)
+        await store.claim("d", "huella")
+        # Se descarta la respuesta guardada más antigua, no la petición en curso
+        assert list(store._entries) == ["a", "c", "d"]
+        assert (await store.claim("a", "huella"))[0] == PENDING
+        assert (await store.claim("c", "huella"))[0] == DONE
+        for key in ("e", "f", "g"):
+            await store.claim(key, "huella")
+        assert len(store._entries) == 3
+
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""Paginación keyset con X-Next-Cursor en los listados de emergencias y usuarios, con y sin filtros."""
+import base64
+import json
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from conftest import API_HEADERS
+
+# Ventana propia: ninguna otra prueba crea emergencias en mayo de 2017
+WINDOW = {"date_from": "2017-05-01T00:00:00", "date_to": "2017-05-02T00:00:00"}
+TIED_AT = "2017-05-01T10:00:00"
+
+
+@pytest.fixture(scope="module")
+def tied(client: Any, seed: Any) -> Dict[str, Any]:
+    """Siete emergencias con el mismo timestamp (y dos más tarde), repartidas en dos unidades."""
+    ids = seed(1, 0)
+    items = [
+        {"latitud": 14.0 + i / 10, "longitud": -90.5, "user_id": ids["user_id"], "timestamp": TIED_AT,
+         "assigned_unit": ids["unit_id"] if i % 2 else ids["other_unit_id"], "status": 1 + i % 3}
+        for i in range(7)
+    ]
+    items += [{**items[0], "latitud": 13.0 + i / 10, "timestamp": f"2017-05-01T11:0{i}:00"} for i in range(2)]
+    response = client.post("/emergencies/batch", json=items, headers=API_HEADERS)
+    assert response.json()["inserted"] == len(items)
+    created = [result["emergency_id"] for result in response.json()["results"]]
+    return {**ids, "items": items, "created": created}
+
+
+def walk(client: Any, path: str, params: Dict[str, Any], limit: int) -> List[List[Dict[str, Any]]]:
+    """Todas las páginas siguiendo X-Next-Cursor."""
+    pages = []
+    cursor: Optional[str] = None
+    while True:
+        page_params = {**params, "limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(path, params=page_params, headers=API_HEADERS)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+        assert len(pages) < 100
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 9])
+def test_walk_with_tied_timestamps_has_no_gaps_or_repeats(client: Any, tied: Dict[str, Any], limit: int) -> None:
+    pages = walk(client, "/emergencies", WINDOW, limit)
+    walked = [row["emergency_id"] for page in pages for row in page]
+    assert sorted(walked) == sorted(tied["created"])
+    assert len(walked) == len(set(walked))
+    assert all(len(page) == limit for page in pages[:-1])
+    # Mismo orden que una sola página: timestamp y emergency_id descendentes
+    single = client.get("/emergencies", params={**WINDOW, "limit": 100}, headers=API_HEADERS).json()
+    assert walked == [row["emergency_id"] for row in single]
+    assert walked[2:] == sorted(walked[2:], reverse=True)
+
+
+def test_walk_users(client: Any, seed: Any) -> None:
+    seed(5, 0)
+    full = client.get("/users", params={"limit": 1000}, headers=API_HEADERS).json()
+    pages = walk(client, "/users", {}, 7)
+    assert [row["user_id"] for page in pages for row in page] == [row["user_id"] for row in full]
+
+
+def _cursor(values: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "no-es-base64!",
+    _cursor({"timestamp": TIED_AT}),
+    _cursor([TIED_AT]),
+    _cursor([TIED_AT, 1, 2]),
+    _cursor(["ayer", 1]),
+    _cursor([TIED_AT, "uno"]),
+])
+def test_malformed_emergency_cursor_is_400(client: Any, cursor: str) -> None:
+    response = client.get("/emergencies", params={"cursor": cursor}, headers=API_HEADERS)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize("cursor", ["%%%", _cursor(["uno"]), _cursor([1, 2])])
+def test_malformed_user_cursor_is_400(client: Any, cursor: str) -> None:
+    response = client.get("/users", params={"cursor": cursor}, headers=API_HEADERS)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def _expected(tied: Dict[str, Any], **match: Any) -> List[int]:
+    """IDs de las emergencias sembradas que cumplen los filtros, de la más reciente a la más antigua."""
+    rows = [
+        (item["timestamp"], emergency_id)
+        for item, emergency_id in zip(tied["items"], tied["created"])
+        if all(item[key] == value for key, value in match.items())
+    ]
+    return [emergency_id for _, emergency_id in sorted(rows, reverse=True)]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 5])
+def test_unit_filter_with_cursor(client: Any, tied: Dict[str, Any], limit: int) -> None:
+    for unit in ("unit_id", "other_unit_id"):
+        params = {**WINDOW, "unit_id": tied[unit]}
+        pages = walk(client, "/emergencies", params, limit)
+        walked = [row["emergency_id"] for page in pages for row in page]
+        assert walked == _expected(tied, assigned_unit=tied[unit])
+        assert all(row["assigned_unit"] == tied[unit] for page in pages for row in page)
+
+
+@pytest.mark.parametrize("status_filter", [1, 2, 3])
+def test_status_filter_with_cursor(client: Any, tied: Dict[str, Any], status_filter: int) -> None:
+    params = {**WINDOW, "status_filter": status_filter, "unit_id": tied["other_unit_id"]}
+    walked = [row["emergency_id"] for page in walk(client, "/emergencies", params, 1) for row in page]
+    assert walked == _expected(tied, status=status_filter, assigned_unit=tied["other_unit_id"])
+
+
+def test_date_range_is_inclusive_from_and_exclusive_to(client: Any, tied: Dict[str, Any]) -> None:
+    params = {"date_from": TIED_AT, "date_to": "2017-05-01T11:01:00"}
+    walked = [row["emergency_id"] for page in walk(client, "/emergencies", params, 2) for row in page]
+    assert walked == _expected(tied)[1:]
+    only_tied = {"date_from": TIED_AT, "date_to": "2017-05-01T10:00:01"}
+    walked = [row["emergency_id"] for page in walk(client, "/emergencies", only_tied, 3) for row in page]
+    assert walked == _expected(tied, timestamp=TIED_AT)
+
+
+def test_unknown_unit_and_empty_range(client: Any, tied: Dict[str, Any]) -> None:
+    response = client.get("/emergencies", params={**WINDOW, "unit_id": 999999}, headers=API_HEADERS)
+    assert response.json() == []
+    assert "X-Next-Cursor" not in response.headers
+    empty = {"date_from": "2017-05-01T12:00:00", "date_to": "2017-05-01T11:00:00"}
+    assert client.get("/emergencies", params=empty, headers=API_HEADERS).json() == []
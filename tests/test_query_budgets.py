@@ -0,0 +1,217 @@
+"""
+Presupuesto de consultas SQL por endpoint y detección de N+1.
+
+Cada petición pasa por la app real (TestClient). El número de sentencias sale de
+record_sql: los eventos del engine (src/database/db.py) lo suman por petición y
+MetricsMiddleware lo vuelca en el histograma http_request_db_statements. El texto de
+las sentencias se captura con before_cursor_execute para detectar:
+
+- un endpoint que supera su presupuesto de sentencias (BUDGETS);
+- una misma sentencia repetida REPEAT_THRESHOLD veces o más en una petición, el
+  patrón típico de un lazy load por fila (N+1);
+- un listado cuyo número de sentencias crece con el número de filas.
+
+Cuando un cambio baja el número de consultas de un endpoint conviene bajar también
+su presupuesto para que la mejora no se pierda.
+"""
+import re
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+import pytest
+from sqlalchemy import event
+
+from conftest import API_HEADERS
+from src.common.metrics import DB_STATEMENTS
+from src.database import db as database
+
+REPEAT_THRESHOLD = 3
+SMALL_SEED = 3
+LARGE_SEED = 60
+
+# (nombre, método, ruta, kwargs de la petición, código esperado, máximo de sentencias)
+# "{user_id}", "{phone}", "{unit_id}", "{other_unit_id}" y "{emergency_id}" se
+# sustituyen por los datos sembrados, también dentro de json y params.
+BUDGETS: List[Tuple[str, str, str, Dict[str, Any], int, int]] = [
+    ("crear usuario", "POST", "/users",
+     {"json": {"name": "Presupuesto", "phone": "50299999999", "password": "secreta",
+               "emergency_contacts": [{"contact_phone": "50288888888", "kin": 1}],
+               "medical_condition_ids": [1]}}, 201, 7),
+    ("login", "POST", "/users/login", {"json": {"phone": "{phone}", "password": "secreta"}}, 200, 3),
+    ("listar usuarios", "GET", "/users", {}, 200, 3),
+    ("obtener usuario", "GET", "/users/{user_id}", {}, 200, 3),
+    ("actualizar usuario", "PUT", "/users/{user_id}", {"json": {"name": "Renombrado"}}, 200, 4),
+    # Incluye la consulta de duplicados (dedup.py) que ve lo insertado por otros workers
+    ("crear emergencia", "POST", "/emergencies",
+     {"json": {"latitud": 14.6, "longitud": -90.5, "user_id": "{user_id}", "tipo_accidente": 1}}, 201, 5),
+    ("listar emergencias", "GET", "/emergencies", {}, 200, 4),
+    ("listar emergencias (fields)", "GET", "/emergencies",
+     {"params": {"fields": "emergency_id,latitud,longitud,status"}}, 200, 1),
+    # Una consulta (más sus selectinload) por tabla: activa y emergencies_archive
+    ("listar emergencias con archivo", "GET", "/emergencies", {"params": {"include_archived": "true"}}, 200, 8),
+    ("obtener emergencia", "GET", "/emergencies/{emergency_id}", {}, 200, 4),
+    ("emergencias de un usuario", "GET", "/emergencies/user/{user_id}", {}, 200, 4),
+    # Incluye el FOR UPDATE de las unidades afectadas (dispatch.lock_units)
+    ("actualizar emergencia", "PUT", "/emergencies/{emergency_id}", {"json": {"status": 2}}, 200, 6),
+    ("asignar unidad", "PUT", "/emergencies/{emergency_id}/assign-unit",
+     {"params": {"unit_id": "{other_unit_id}"}}, 200, 7),
+    ("mapa de calor", "GET", "/emergencies/heatmap", {"params": {"cell_size": 0.1}}, 200, 1),
+    ("listar unidades", "GET", "/emergency-units", {}, 200, 1),
+    ("obtener unidad", "GET", "/emergency-units/{unit_id}", {}, 200, 1),
+    ("estadísticas de unidad", "GET", "/emergency-units/{unit_id}/stats", {}, 200, 1),
+    ("estadísticas de la flota", "GET", "/emergency-units/stats", {}, 200, 1),
+    ("actualizar unidad", "PUT", "/emergency-units/{unit_id}", {"json": {"latitud": 14.61}}, 200, 2),
+    ("catálogo de accidentes", "GET", "/catalogs/accident-types", {}, 200, 1),
+]
+
+# Listados cuyo número de sentencias no debe depender del número de filas
+SCALING: List[Tuple[str, str, Dict[str, Any]]] = [
+    ("listar usuarios", "/users", {}),
+    ("listar emergencias", "/emergencies", {}),
+    ("listar emergencias (expand)", "/emergencies", {"params": {"fields": "emergency_id", "expand": "user"}}),
+    ("listar emergencias con archivo", "/emergencies", {"params": {"include_archived": "true"}}),
+    ("emergencias de un usuario", "/emergencies/user/{user_id}", {}),
+    ("listar unidades", "/emergency-units", {}),
+]
+
+
+def _fill(value: Any, ids: Dict[str, Any]) -> Any:
+    if isinstance(value, dict):
+        return {key: _fill(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, ids) for item in value]
+    if isinstance(value, str):
+        placeholder = re.fullmatch(r"\{(\w+)\}", value)
+        return ids[placeholder.group(1)] if placeholder else value.format(**ids)
+    return value
+
+
+def _normalize(statement: str) -> str:
+    # Las listas IN de selectinload varían en longitud; el resto del texto identifica la sentencia
+    return re.sub(r"\(\s*(?:\?|%\(\w+\)s|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+))*\s*\)", "(...)", statement)
+
+
+def _recorded_statements() -> float:
+    """Total de sentencias que record_sql ha atribuido a peticiones HTTP."""
+    return sum(
+        sample.value
+        for metric in DB_STATEMENTS.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_sum")
+    )
+
+
+class QueryCounter:
+    """Mide una petición: sentencias según record_sql y texto de cada una."""
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+        self.statements: List[str] = []
+        self.engines = [database.engine]
+        if database.async_engine is not None:
+            self.engines.append(database.async_engine.sync_engine)
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements.append(statement)
+
+    def request(self, method: str, path: str, **kwargs: Any) -> Tuple[Any, int, List[str]]:
+        self.statements = []
+        before = _recorded_statements()
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._capture)
+        try:
+            headers = {**API_HEADERS, **kwargs.pop("headers", {})}
+            response = self.client.request(method, path, headers=headers, **kwargs)
+        finally:
+            for engine in self.engines:
+                event.remove(engine, "before_cursor_execute", self._capture)
+        return response, int(_recorded_statements() - before), list(self.statements)
+
+    @staticmethod
+    def repeated(statements: List[str]) -> List[Tuple[str, int]]:
+        counts = Counter(_normalize(statement) for statement in statements)
+        return [(statement, n) for statement, n in counts.items() if n >= REPEAT_THRESHOLD]
+
+
+@pytest.fixture(scope="module")
+def ids(seed: Any) -> Dict[str, Any]:
+    return seed(SMALL_SEED, 2)
+
+
+@pytest.fixture(scope="module")
+def counter(client: Any) -> QueryCounter:
+    return QueryCounter(client)
+
+
+def _assert_no_n_plus_one(statements: List[str]) -> None:
+    repeated = QueryCounter.repeated(statements)
+    assert not repeated, "posible N+1: " + "; ".join(
+        f"{n} veces «{' '.join(statement.split())[:80]}»" for statement, n in repeated
+    )
+
+
+@pytest.mark.parametrize(
+    "method, path, kwargs, expected, budget",
+    [budget[1:] for budget in BUDGETS],
+    ids=[budget[0] for budget in BUDGETS],
+)
+def test_endpoint_query_budget(
+    counter: QueryCounter, ids: Dict[str, Any],
+    method: str, path: str, kwargs: Dict[str, Any], expected: int, budget: int,
+) -> None:
+    response, recorded, statements = counter.request(method, _fill(path, ids), **_fill(kwargs, ids))
+    assert response.status_code == expected, response.text[:200]
+    assert recorded <= budget, f"{recorded} sentencias, presupuesto {budget}"
+    _assert_no_n_plus_one(statements)
+
+
+def test_retransmission_query_budget(counter: QueryCounter, ids: Dict[str, Any]) -> None:
+    report = {"latitud": 15.1, "longitud": -91.2, "user_id": ids["user_id"], "tipo_accidente": 1}
+    first, _, _ = counter.request("POST", "/emergencies", json=report)
+    assert first.status_code == 201
+    response, recorded, _ = counter.request("POST", "/emergencies", json=report)
+    assert response.status_code == 200
+    assert response.headers["X-Duplicate-Of"] == str(first.json()["emergency_id"])
+    assert recorded <= 4
+
+
+def test_assign_unit_reloads_only_the_unit(counter: QueryCounter, ids: Dict[str, Any]) -> None:
+    """assign-unit y PUT cargan la emergencia una vez y solo recargan la unidad si cambió."""
+    path = f"/emergencies/{ids['emergency_id']}"
+    for unit_id in (ids["unit_id"], ids["other_unit_id"]):
+        response, recorded, _ = counter.request("PUT", f"{path}/assign-unit", params={"unit_id": unit_id})
+        assert response.status_code == 200
+        assert response.json()["assigned_unit_rel"]["emergency_unit_id"] == unit_id
+        assert recorded <= 7
+
+    # Sin cambio de unidad no hay recarga: una sentencia menos que con cambio
+    same, same_recorded, _ = counter.request("PUT", path, json={"status": 1})
+    changed, changed_recorded, _ = counter.request("PUT", path, json={"assigned_unit": ids["unit_id"]})
+    assert same.status_code == changed.status_code == 200
+    assert same.json()["assigned_unit_rel"]["emergency_unit_id"] == ids["other_unit_id"]
+    assert changed.json()["assigned_unit_rel"]["emergency_unit_id"] == ids["unit_id"]
+    assert changed_recorded == same_recorded + 1
+
+
+@pytest.fixture(scope="module")
+def scaling(counter: QueryCounter, ids: Dict[str, Any], seed: Any) -> Dict[str, Tuple[int, int]]:
+    """Sentencias de cada listado con SMALL_SEED usuarios y tras sembrar hasta LARGE_SEED."""
+    def measure() -> Dict[str, int]:
+        counts = {}
+        for name, path, kwargs in SCALING:
+            response, recorded, statements = counter.request("GET", _fill(path, ids), **kwargs)
+            assert response.status_code == 200, response.text[:200]
+            _assert_no_n_plus_one(statements)
+            counts[name] = recorded
+        return counts
+
+    small = measure()
+    seed(LARGE_SEED - SMALL_SEED, 3)
+    large = measure()
+    return {name: (small[name], large[name]) for name in small}
+
+
+@pytest.mark.parametrize("name", [name for name, _, _ in SCALING])
+def test_listing_statements_do_not_grow_with_rows(scaling: Dict[str, Tuple[int, int]], name: str) -> None:
+    small, large = scaling[name]
+    assert large <= small, f"{small} -> {large} sentencias al crecer los datos (N+1)"
@@ -0,0 +1,119 @@
+"""
+Regresión de índices y planes de consulta.
+
+- Las migraciones crean todos los índices que declaran las entidades.
+- Las consultas frecuentes (las que emiten las funciones de servicio reales) usan su
+  índice: se captura el SQL y se le pasa EXPLAIN (EXPLAIN QUERY PLAN en SQLite).
+
+Cada test corre contra la base SQLite de los tests y contra PostgreSQL
+(TEST_POSTGRES_URL; se salta si no hay). En PostgreSQL se desactiva enable_seqscan
+para que tablas pequeñas no oculten si el índice es utilizable.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterator, List, Sequence, Tuple
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import Session
+
+from src.entities import Base
+from src.features.emergencies import archive, dedup
+from src.features.emergencies import service as emergencies_service
+from src.features.emergencies.dispatch import UnitLoadTracker
+from src.features.emergencies.export import build_export_query
+from src.features.emergencies.heatmap import build_heatmap_query, compute_heatmap
+from src.features.emergency_units import service as units_service
+from src.features.users import service as users_service
+
+
+def _fleet_stats(db: Session) -> Any:
+    units_service.invalidate_fleet_stats()
+    return units_service.get_fleet_stats(db)
+
+
+def _recent_reports(db: Session) -> Any:
+    now = datetime.now()
+    return dedup.recent_from_db(db, [1], now - timedelta(minutes=2), now)
+
+
+# (nombre, llamada al servicio, índices aceptados para la primera SELECT que emite)
+PLAN_CHECKS: List[Tuple[str, Callable[[Session], Any], Sequence[str]]] = [
+    ("login por teléfono", lambda db: users_service.get_user_by_phone(db, "50200000000"), ["ix_users_phone"]),
+    ("listado de emergencias", lambda db: emergencies_service.list_emergencies(db, limit=100),
+     ["ix_emergencies_timestamp_id"]),
+    ("listado por estado", lambda db: emergencies_service.list_emergencies(db, limit=100, status=1),
+     ["ix_emergencies_status_timestamp_id"]),
+    ("listado por unidad", lambda db: emergencies_service.list_emergencies(db, limit=100, assigned_unit=1),
+     ["ix_emergencies_unit_timestamp_id", "ix_emergencies_unit_status"]),
+    ("emergencias de un usuario", lambda db: emergencies_service.get_emergencies_by_user(db, 1),
+     ["ix_emergencies_user_timestamp"]),
+    ("duplicados de un usuario", _recent_reports, ["ix_emergencies_user_timestamp"]),
+    ("mapa de calor", lambda db: compute_heatmap(db, build_heatmap_query(0.05)),
+     ["ix_emergencies_timestamp_id"]),
+    ("mapa de calor por estado", lambda db: compute_heatmap(db, build_heatmap_query(0.05, status=1)),
+     ["ix_emergencies_status_timestamp_id"]),
+    ("mapa de calor (archivo)", lambda db: compute_heatmap(db, build_heatmap_query(0.05)),
+     ["ix_emergencies_archive_timestamp_id"]),
+    ("exportación con archivo", lambda db: db.execute(build_export_query(date_from=datetime(2024, 1, 1))).all(),
+     ["ix_emergencies_archive_timestamp_id"]),
+    ("lote de archivado", lambda db: db.execute(archive.select_archivable(archive.archive_cutoff())).all(),
+     ["ix_emergencies_status_timestamp_id"]),
+    ("carga activa por unidad", lambda db: UnitLoadTracker().load(db),
+     ["ix_emergencies_unit_status", "ix_emergencies_status_timestamp_id"]),
+    ("estadísticas de la flota", _fleet_stats, ["ix_emergencies_unit_status"]),
+]
+
+
+@pytest.fixture(scope="module", params=["sqlite", "postgresql"])
+def plan_engine(request: pytest.FixtureRequest, database: str) -> Iterator[Any]:
+    url = database if request.param == "sqlite" else request.getfixturevalue("postgres_url")
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
+
+
+def _explain(connection: Any, statement: str, parameters: Any) -> str:
+    if connection.dialect.name == "sqlite":
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        return "\n".join(str(row[-1]) for row in rows)
+    connection.exec_driver_sql("SET enable_seqscan = off")
+    rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+    return "\n".join(str(row[0]) for row in rows)
+
+
+def _main_select(engine: Any, call: Callable[[Session], Any]) -> Tuple[str, Any]:
+    captured: List[Tuple[str, Any]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with Session(engine) as db:
+            call(db)
+            db.rollback()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    selects = [(s, p) for s, p in captured if s.lstrip().upper().startswith("SELECT")]
+    assert selects, "no se emitió ninguna consulta"
+    # La primera SELECT es la consulta principal; las siguientes son selectinload
+    return selects[0]
+
+
+def test_migrations_create_entity_indexes(plan_engine: Any) -> None:
+    inspector = inspect(plan_engine)
+    for table in Base.metadata.sorted_tables:
+        declared = {index.name for index in table.indexes}
+        created = {index["name"] for index in inspector.get_indexes(table.name)}
+        assert declared <= created, f"{table.name}: faltan {sorted(declared - created)}"
+
+
+@pytest.mark.parametrize(
+    "call, expected", [check[1:] for check in PLAN_CHECKS], ids=[check[0] for check in PLAN_CHECKS]
+)
+def test_query_uses_index(plan_engine: Any, call: Callable[[Session], Any], expected: Sequence[str]) -> None:
+    statement, parameters = _main_select(plan_engine, call)
+    with plan_engine.connect() as connection:
+        plan = _explain(connection, statement, parameters)
+        connection.rollback()
+    assert any(index in plan for index in expected), f"se esperaba {' o '.join(expected)}:\n{plan}"
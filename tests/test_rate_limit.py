@@ -0,0 +1,106 @@
+"""Limitador híbrido: varias ventanas se comprueban antes de contar y los gateways tienen su cupo."""
+import asyncio
+import time
+from typing import Any, Dict, List, Tuple
+
+from limits import parse_many
+
+from src.auth.hybrid_limiter import HybridRateLimiter, HybridRateLimitMiddleware
+
+
+class FakeRedis:
+    """Lo mínimo de redis.asyncio que usa el limitador: pipeline con get, incrby y expireat."""
+
+    def __init__(self) -> None:
+        self.values: Dict[str, int] = {}
+
+    def pipeline(self, transaction: bool = False) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.commands: List[Tuple[str, Any]] = []
+
+    def get(self, key: str) -> None:
+        self.commands.append(("get", key))
+
+    def incrby(self, key: str, amount: int) -> None:
+        self.commands.append(("incrby", (key, amount)))
+
+    def expireat(self, key: str, when: int) -> None:
+        self.commands.append(("expireat", key))
+
+    async def execute(self) -> List[Any]:
+        results: List[Any] = []
+        for command, args in self.commands:
+            if command == "get":
+                value = self.redis.values.get(args)
+                results.append(None if value is None else str(value).encode())
+            elif command == "incrby":
+                key, amount = args
+                self.redis.values[key] = self.redis.values.get(key, 0) + amount
+                results.append(self.redis.values[key])
+            else:
+                results.append(True)
+        return results
+
+
+def test_rejected_request_is_not_counted_in_other_windows() -> None:
+    limiter = HybridRateLimiter(parse_many("5/minute;2/hour"), strict_ratio=0)
+    limiter._redis = redis = FakeRedis()
+
+    # Otros workers ya agotaron el cupo de la hora
+    hour = limiter._window("cliente", limiter.limits[1], time.time())
+    redis.values[hour.redis_key] = 2
+
+    allowed, window = asyncio.run(limiter.hit("cliente"))
+    assert not allowed
+    assert window is hour
+    # La ventana del minuto no se ha tocado ni en local ni en Redis
+    assert redis.values == {hour.redis_key: 2}
+    assert all(w.pending == 0 for w in limiter._windows.values())
+
+
+def test_allowed_request_is_counted_in_every_window() -> None:
+    limiter = HybridRateLimiter(parse_many("5/minute;3/hour"), strict_ratio=0)
+    limiter._redis = redis = FakeRedis()
+
+    async def main() -> List[bool]:
+        return [(await limiter.hit("cliente"))[0] for _ in range(4)]
+
+    assert asyncio.run(main()) == [True, True, True, False]
+    assert sorted(redis.values.values()) == [3, 3]
+
+
+def test_gateway_routes_use_their_own_limits() -> None:
+    general = HybridRateLimiter(parse_many("1/minute"))
+    gateway = HybridRateLimiter(parse_many("100/minute"), name="gateway")
+    calls: List[str] = []
+
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        calls.append(scope["path"])
+
+    statuses: List[int] = []
+
+    async def send(message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    def scope(method: str, path: str) -> Dict[str, Any]:
+        return {"type": "http", "method": method, "path": path, "headers": [], "query_string": b"",
+                "client": ("10.0.0.1", 1234)}
+
+    async def main() -> None:
+        middleware = HybridRateLimitMiddleware(app, general, gateway)
+        for _ in range(10):
+            await middleware(scope("POST", "/emergencies"), None, send)
+        await middleware(scope("GET", "/emergencies"), None, send)
+        await middleware(scope("GET", "/emergencies"), None, send)
+        exempt = HybridRateLimitMiddleware(app, general, None)
+        await exempt(scope("POST", "/emergencies/batch"), None, send)
+
+    asyncio.run(main())
+    assert calls == ["/emergencies"] * 11 + ["/emergencies/batch"]
+    assert statuses == [429]
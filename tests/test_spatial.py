@@ -0,0 +1,124 @@
+"""Índice espacial de unidades: igual que la búsqueda por fuerza bruta y al día tras las escrituras."""
+import random
+from typing import Any, List, Optional, Tuple
+
+import pytest
+from sqlalchemy.orm import Session
+
+from conftest import API_HEADERS
+from src.database.db import engine
+from src.entities import EmergencyUnit
+from src.features.emergency_units.spatial import UnitPoint, UnitSpatialIndex, haversine_km, unit_index
+
+# (latitud, longitud) de referencia: caso general, cerca de los polos y a ambos lados del antimeridiano
+TARGETS = [(14.6, -90.5), (89.9, 10.0), (-89.95, -170.0), (0.0, 179.99), (-12.0, -179.98), (65.0, 180.0)]
+
+
+def _units(rng: random.Random, count: int) -> List[UnitPoint]:
+    units = [
+        UnitPoint(i, f"U{i}", rng.uniform(-90, 90), rng.uniform(-180, 180))
+        for i in range(count)
+    ]
+    # Además, unidades concentradas junto a cada punto de referencia
+    for lat, lon in TARGETS:
+        for _ in range(20):
+            # Reflejada en el polo en lugar de recortada: nada de puntos repetidos en ±90
+            near_lat = lat + rng.uniform(-0.5, 0.5)
+            near_lat = 180 - near_lat if near_lat > 90 else -180 - near_lat if near_lat < -90 else near_lat
+            near_lon = (lon + rng.uniform(-0.5, 0.5) + 180) % 360 - 180
+            units.append(UnitPoint(len(units), f"U{len(units)}", near_lat, near_lon))
+    return units
+
+
+def _brute(units: List[UnitPoint], lat: float, lon: float, radius_km: Optional[float]) -> List[Tuple[int, float]]:
+    ranked = [(unit.emergency_unit_id, haversine_km(lat, lon, unit.latitud, unit.longitud)) for unit in units]
+    ranked = [item for item in ranked if radius_km is None or item[1] <= radius_km]
+    return sorted(ranked, key=lambda item: (item[1], item[0]))
+
+
+def _ids(found: List[Tuple[UnitPoint, float]]) -> List[Tuple[int, float]]:
+    return [(unit.emergency_unit_id, distance) for unit, distance in found]
+
+
+@pytest.fixture(scope="module")
+def index() -> Tuple[UnitSpatialIndex, List[UnitPoint]]:
+    units = _units(random.Random(7), 500)
+    spatial = UnitSpatialIndex(ttl=60)
+    spatial.load(units)
+    return spatial, units
+
+
+@pytest.mark.parametrize("target", TARGETS)
+@pytest.mark.parametrize("radius_km", [None, 25.0, 150.0, 3000.0])
+def test_nearest_matches_brute_force(index: Any, target: Tuple[float, float], radius_km: Optional[float]) -> None:
+    spatial, units = index
+    for k in (1, 5, 30):
+        assert _ids(spatial.nearest(*target, k, radius_km)) == _brute(units, *target, radius_km)[:k]
+
+
+@pytest.mark.parametrize("target", TARGETS)
+@pytest.mark.parametrize("radius_km", [0.5, 25.0, 150.0, 3000.0])
+def test_within_radius_matches_brute_force(index: Any, target: Tuple[float, float], radius_km: float) -> None:
+    spatial, units = index
+    assert _ids(spatial.within_radius(*target, radius_km)) == _brute(units, *target, radius_km)
+
+
+def test_random_targets_match_brute_force(index: Any) -> None:
+    spatial, units = index
+    rng = random.Random(11)
+    for _ in range(200):
+        lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        assert _ids(spatial.nearest(lat, lon, 3)) == _brute(units, lat, lon, None)[:3]
+        assert _ids(spatial.within_radius(lat, lon, 800)) == _brute(units, lat, lon, 800)
+
+
+def test_antimeridian_neighbours_are_close() -> None:
+    spatial = UnitSpatialIndex(ttl=60)
+    spatial.load([
+        UnitPoint(1, "este", 10.0, 179.95),
+        UnitPoint(2, "oeste", 10.0, -179.95),
+        UnitPoint(3, "lejos", 10.0, 170.0),
+    ])
+    found = spatial.within_radius(10.0, -179.99, 20)
+    assert [unit.emergency_unit_id for unit, _ in found] == [2, 1]
+    assert found[1][1] < 10
+
+
+def _nearby_ids(client: Any, lat: float, lon: float) -> List[int]:
+    response = client.get(
+        "/emergency-units/search/nearby", params={"latitude": lat, "longitude": lon, "radius_km": 5},
+        headers=API_HEADERS,
+    )
+    assert response.status_code == 200
+    return [unit["emergency_unit_id"] for unit in response.json()]
+
+
+def test_index_follows_unit_writes(client: Any, seed: Any) -> None:
+    seed(1, 0)
+    assert _nearby_ids(client, -54.8, -68.3) == []
+    created = client.post(
+        "/emergency-units", json={"name": "Índice Ushuaia", "latitud": -54.8, "longitud": -68.3}, headers=API_HEADERS
+    ).json()
+    unit_id = created["emergency_unit_id"]
+    assert _nearby_ids(client, -54.8, -68.3) == [unit_id]
+
+    client.put(f"/emergency-units/{unit_id}", json={"latitud": 64.15, "longitud": -21.94}, headers=API_HEADERS)
+    assert _nearby_ids(client, -54.8, -68.3) == []
+    assert _nearby_ids(client, 64.15, -21.94) == [unit_id]
+
+    assert client.delete(f"/emergency-units/{unit_id}", headers=API_HEADERS).status_code == 204
+    assert _nearby_ids(client, 64.15, -21.94) == []
+
+
+def test_stale_index_is_reloaded_from_the_database(client: Any, seed: Any) -> None:
+    seed(1, 0)
+    assert _nearby_ids(client, 78.22, 15.65) == []
+    # Alta hecha por otro worker: este índice no se entera hasta recargarse
+    with Session(engine) as db:
+        unit = EmergencyUnit(name="Índice Longyearbyen", latitud=78.22, longitud=15.65)
+        db.add(unit)
+        db.commit()
+        unit_id = unit.emergency_unit_id
+    assert _nearby_ids(client, 78.22, 15.65) == []
+    unit_index.invalidate()
+    assert _nearby_ids(client, 78.22, 15.65) == [unit_id]
@@ -0,0 +1,65 @@
+"""Usuarios: servicio síncrono, login con rehash y teléfono duplicado en altas simultáneas."""
+import hashlib
+import inspect
+from typing import Any
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from conftest import API_HEADERS
+from src.database.db import engine
+from src.entities import Users
+from src.features.users import service
+
+
+def test_service_is_sync() -> None:
+    functions = [value for value in vars(service).values() if inspect.isfunction(value)]
+    assert functions
+    assert not [fn.__name__ for fn in functions if inspect.iscoroutinefunction(fn)]
+
+
+def test_login_rehashes_legacy_password(client: Any, seed: Any) -> None:
+    phone = seed(1, 0)["phone"]
+    with Session(engine) as db:
+        legacy = hashlib.sha256(b"antigua").hexdigest()
+        db.execute(update(Users).where(Users.phone == phone).values(password=legacy))
+        db.commit()
+
+    login = {"phone": phone, "password": "antigua"}
+    assert client.post("/users/login", json={**login, "password": "otra"}, headers=API_HEADERS).status_code == 401
+    assert client.post("/users/login", json={**login, "phone": "000"}, headers=API_HEADERS).status_code == 401
+    assert client.post("/users/login", json=login, headers=API_HEADERS).status_code == 200
+    with Session(engine) as db:
+        stored = db.scalar(select(Users.password).where(Users.phone == phone))
+    assert stored.startswith("scrypt$")
+    assert client.post("/users/login", json=login, headers=API_HEADERS).status_code == 200
+
+
+def test_concurrent_duplicate_phone_is_409(client: Any, seed: Any, monkeypatch: Any) -> None:
+    ids = seed(2, 0)
+    # Simula que la otra alta se confirma entre la comprobación previa y el INSERT
+    monkeypatch.setattr(service, "get_user_by_phone", lambda db, phone: None)
+
+    payload = {"name": "Duplicado", "phone": ids["phone"], "password": "secreta"}
+    response = client.post("/users", json=payload, headers=API_HEADERS)
+    assert response.status_code == 409
+    assert ids["phone"] in response.json()["detail"]
+
+    other = client.get("/users", params={"limit": 1000}, headers=API_HEADERS).json()[-1]
+    response = client.put(f"/users/{other['user_id']}", json={"phone": ids["phone"]}, headers=API_HEADERS)
+    assert response.status_code == 409
+
+
+def test_duplicate_phone_is_409(client: Any, seed: Any) -> None:
+    ids = seed(2, 0)
+    payload = {"name": "Repetido", "phone": "50277777777", "password": "secreta"}
+    assert client.post("/users", json=payload, headers=API_HEADERS).status_code == 201
+    response = client.post("/users", json=payload, headers=API_HEADERS)
+    assert response.status_code == 409
+    assert payload["phone"] in response.json()["detail"]
+
+    response = client.put(f"/users/{ids['user_id']}", json={"phone": payload["phone"]}, headers=API_HEADERS)
+    assert response.status_code == 409
+    # Su propio teléfono no es un conflicto
+    response = client.put(f"/users/{ids['user_id']}", json={"phone": ids["phone"]}, headers=API_HEADERS)
+    assert response.status_code == 200